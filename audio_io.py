@@ -0,0 +1,250 @@
+import os
+import subprocess
+import tempfile
+import wave
+from collections import namedtuple
+import numpy as np
+
+class AudioBuffer(namedtuple('AudioBuffer', ['samples', 'sample_rate'])):
+    """
+    Mono float32 samples kept in memory, which ShortCreator accepts in place of an audio file path.
+    """
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sample_rate
+
+def get_ffmpeg_binary():
+    """
+    Returns the ffmpeg executable used by moviepy, so that we don't depend on a second install.
+    """
+    from moviepy.config import get_setting
+    return get_setting("FFMPEG_BINARY")
+
+def write_stream_to_file(chunks, output_path, on_chunk=None):
+    """
+    Writes an iterable of byte chunks to 'output_path' as they arrive, instead of buffering
+    the whole response in memory. 'on_chunk' is called with every chunk after it is written.
+    Returns the number of bytes written.
+    """
+    total_bytes = 0
+    with open(output_path, 'wb') as output_file:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            output_file.write(chunk)
+            total_bytes += len(chunk)
+            if on_chunk:
+                on_chunk(chunk)
+    if total_bytes == 0:
+        raise Exception('Received empty audio response')
+    return total_bytes
+
+def pcm16_to_float(pcm_bytes):
+    """
+    Converts raw 16-bit little-endian PCM bytes to float32 samples in [-1, 1].
+    """
+    return np.frombuffer(pcm_bytes, dtype='<i2').astype(np.float32) / 32768.0
+
+class PCMStreamReader:
+    """
+    Decodes a raw 16-bit PCM stream chunk by chunk.
+    Chunks may split samples in half, the leftover byte is kept for the next chunk.
+    With keep_samples=False the samples are only handed back by 'feed', not accumulated.
+    """
+    def __init__(self, sample_rate, keep_samples=True):
+        self.sample_rate = sample_rate
+        self.keep_samples = keep_samples
+        self._leftover = b''
+        self._blocks = []
+        self.nsamples = 0
+
+    def feed(self, chunk):
+        """
+        Adds a chunk of the stream and returns the float samples it completed.
+        """
+        data = self._leftover + chunk
+        usable_bytes = len(data) - len(data) % 2
+        self._leftover = data[usable_bytes:]
+        samples = pcm16_to_float(data[:usable_bytes])
+        if self.keep_samples:
+            self._blocks.append(samples)
+        self.nsamples += len(samples)
+        return samples
+
+    @property
+    def duration(self):
+        """
+        Duration (in seconds) of the audio received so far.
+        """
+        return self.nsamples / self.sample_rate
+
+    def samples(self):
+        """
+        Returns all the samples received so far as a single array.
+        """
+        if not self._blocks:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(self._blocks)
+
+def encode_audio(samples, sample_rate, output_path, bitrate='192k'):
+    """
+    Encodes mono float samples to 'output_path' (format chosen by ffmpeg from the extension).
+    """
+    samples = np.clip(np.asarray(samples, dtype=np.float32), -1.0, 1.0)
+    cmd = [
+        get_ffmpeg_binary(), '-y', '-loglevel', 'error',
+        '-f', 'f32le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0',
+        '-b:a', bitrate, output_path,
+    ]
+    subprocess.run(cmd, input=samples.tobytes(), check=True)
+    return output_path
+
+def decode_audio(path, sample_rate=None, channels=1, start=0.0, duration=None):
+    """
+    Decodes an audio file into float32 samples, mono by default, or of shape (n, channels) otherwise.
+    'start' and 'duration' (seconds) decode only part of the file.
+    Returns (samples, sample_rate). If 'sample_rate' is None the file's own rate is kept.
+    """
+    if sample_rate is None:
+        sample_rate = probe_sample_rate(path)
+    cmd = [get_ffmpeg_binary(), '-loglevel', 'error']
+    if start:
+        cmd += ['-ss', f"{start:.6f}"]
+    if duration is not None:
+        cmd += ['-t', f"{duration:.6f}"]
+    cmd += ['-i', path, '-f', 'f32le', '-ac', str(channels), '-ar', str(sample_rate), 'pipe:1']
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, check=True)
+    samples = np.frombuffer(result.stdout, dtype=np.float32)
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+    return samples, sample_rate
+
+def decode_audio_files(paths, sample_rate, channels=1, batch_size=32):
+    """
+    Decodes several audio files like decode_audio, with one ffmpeg process per 'batch_size' files
+    instead of one per file: every input is mapped to its own raw output, written to a temporary folder.
+    Returns the samples of every file, in order.
+    """
+    decoded = []
+    with tempfile.TemporaryDirectory(dir=os.environ.get('TMP_FOLDER')) as tmp_dir:
+        for batch_start in range(0, len(paths), batch_size):
+            batch = paths[batch_start:batch_start + batch_size]
+            cmd = [get_ffmpeg_binary(), '-y', '-loglevel', 'error']
+            for path in batch:
+                cmd += ['-i', path]
+            output_paths = [os.path.join(tmp_dir, f"{index}.f32") for index in range(len(batch))]
+            for index, output_path in enumerate(output_paths):
+                cmd += ['-map', f"{index}:a:0", '-f', 'f32le', '-ac', str(channels), '-ar', str(sample_rate), output_path]
+            subprocess.run(cmd, stdin=subprocess.DEVNULL, check=True)
+            for output_path in output_paths:
+                samples = np.fromfile(output_path, dtype=np.float32)
+                if channels > 1:
+                    samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+                decoded.append(samples)
+    return decoded
+
+def resample(samples, sample_rate, target_rate):
+    """
+    Resamples mono samples to 'target_rate' in the frequency domain (band-limited, the whole clip at once).
+    """
+    if sample_rate == target_rate or len(samples) == 0:
+        return np.asarray(samples, dtype=np.float32)
+    target_length = int(round(len(samples) * target_rate / sample_rate))
+    spectrum = np.fft.rfft(samples)
+    resampled = np.fft.irfft(spectrum, n=target_length) * (target_length / len(samples))
+    return resampled.astype(np.float32)
+
+def write_wav(samples, sample_rate, output_path):
+    """
+    Writes float samples (mono, or of shape (n, channels)) to a 16-bit PCM wav file, without ffmpeg.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+    with wave.open(output_path, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+    return output_path
+
+def probe_sample_rate(path, default=44100):
+    """
+    Reads the sample rate of the first audio stream of 'path' from ffmpeg's stream info.
+    """
+    result = subprocess.run([get_ffmpeg_binary(), '-hide_banner', '-i', path], stderr=subprocess.PIPE, text=True)
+    for line in result.stderr.splitlines():
+        if 'Audio:' in line and ' Hz' in line:
+            return int(line.split(' Hz')[0].split()[-1])
+    return default
+
+def find_split_points(samples, sample_rate, weights, frame_ms=10, min_silence_ms=120, silence_db=-35):
+    """
+    Finds where to cut a narration of several paragraphs back into one piece per paragraph.
+
+    The expected position of every cut is estimated from the paragraph 'weights' (e.g. character counts),
+    and then moved to the middle of the nearest silence (a run of frames 'silence_db' below the peak
+    level lasting at least 'min_silence_ms'). If there's no silence close enough the estimate is kept.
+    Returns len(weights) - 1 sample positions in increasing order.
+    """
+    total_weight = float(sum(weights))
+    if len(weights) < 2 or len(samples) == 0 or total_weight <= 0:
+        return []
+
+    frame_length = max(1, int(sample_rate * frame_ms / 1000))
+    nframes = len(samples) // frame_length
+    frames = np.asarray(samples[:nframes * frame_length], dtype=np.float32).reshape(nframes, frame_length)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1) + 1e-12)
+    level_db = 20 * np.log10(rms / max(rms.max(), 1e-6))
+    silent = level_db < silence_db
+
+    # middle of every silent run long enough to be a pause between paragraphs
+    edges = np.diff(np.concatenate([[0], silent.astype(np.int8), [0]]))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    min_frames = max(1, int(min_silence_ms / frame_ms))
+    long_runs = (run_ends - run_starts) >= min_frames
+    candidates = ((run_starts[long_runs] + run_ends[long_runs]) // 2) * frame_length
+
+    cumulative = np.cumsum(weights[:-1]) / total_weight
+    expected_points = (cumulative * len(samples)).astype(int)
+    mean_segment = len(samples) / len(weights)
+
+    split_points = []
+    previous = 0
+    for expected in expected_points:
+        usable = candidates[candidates > previous]
+        point = expected
+        if len(usable):
+            nearest = usable[np.argmin(np.abs(usable - expected))]
+            if abs(nearest - expected) <= 0.5 * mean_segment:
+                point = nearest
+        point = int(min(max(point, previous + 1), len(samples) - 1))
+        split_points.append(point)
+        previous = point
+    return split_points
+
+def split_audio_file(path, weights, output_paths):
+    """
+    Cuts the audio file 'path' into len(weights) segments at the pauses between paragraphs,
+    and encodes each segment to the corresponding entry of 'output_paths'.
+    """
+    samples, sample_rate = decode_audio(path)
+    split_points = find_split_points(samples, sample_rate, weights)
+    for segment, output_path in zip(np.split(samples, split_points), output_paths):
+        encode_audio(segment, sample_rate, output_path)
+    return output_paths
+
+def probe_duration(path):
+    """
+    Returns the duration (in seconds) of an audio or video file, read from ffmpeg's stream info.
+    """
+    result = subprocess.run([get_ffmpeg_binary(), '-hide_banner', '-i', path], stderr=subprocess.PIPE, text=True)
+    for line in result.stderr.splitlines():
+        line = line.strip()
+        if line.startswith('Duration:'):
+            hours, minutes, seconds = line.split(',')[0].split()[1].split(':')
+            return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    raise Exception(f'Could not read the duration of {path}')
@@ -0,0 +1,176 @@
+import traceback
+import numpy as np
+from audio_io import AudioBuffer, decode_audio, decode_audio_files, resample, write_wav
+
+def _db_to_gain(db):
+    return 10 ** (db / 20)
+
+def _frame_levels(samples, frame_length):
+    """
+    RMS level (dBFS) of consecutive frames of 'frame_length' samples of a mono signal.
+    """
+    nframes = max(1, -(-len(samples) // frame_length))
+    padded = np.zeros(nframes * frame_length, dtype=np.float32)
+    padded[:len(samples)] = samples
+    rms = np.sqrt(np.mean(padded.reshape(nframes, frame_length) ** 2, axis=1) + 1e-12)
+    return 20 * np.log10(rms)
+
+def gated_loudness(samples, sample_rate, block_ms=400, absolute_gate_db=-70, relative_gate_db=-10):
+    """
+    Loudness (dB) of a mono signal, measured like ITU-R BS.1770 (400 ms blocks, absolute gate, then a gate
+    'relative_gate_db' below the mean of the remaining blocks) but without the K-weighting filter.
+    Returns None for silence.
+    """
+    levels = _frame_levels(samples, max(1, int(sample_rate * block_ms / 1000)))
+    levels = levels[levels > absolute_gate_db]
+    if len(levels) == 0:
+        return None
+    mean_db = 10 * np.log10(np.mean(10 ** (levels / 10)))
+    levels = levels[levels > mean_db + relative_gate_db]
+    return float(10 * np.log10(np.mean(10 ** (levels / 10))))
+
+class AudioMixer:
+    """
+    Mixes the narrations of a short and its background music into one stereo track, with NumPy.
+
+    Every narration is decoded (or resampled, for an AudioBuffer) once and added into a timeline buffer,
+    so there is no per-chunk evaluation while encoding. 'decode_many' decodes the files of a whole short
+    with a single ffmpeg process.
+    The music is decoded only for the window it plays in, scaled by 'music_volume', and ducked by 'duck_db'
+    while someone speaks: the ducking starts 'attack_ms' before the narration level rises above
+    'duck_threshold_db' and ends 'release_ms' after it falls back, with ramps of 'attack_ms'.
+    The mix is then normalized to 'target_loudness_db' (see gated_loudness, None disables it) and scaled
+    down if needed so that its peak stays below 'peak_db'.
+    """
+    def __init__(
+        self,
+        sample_rate=44100,
+        music_volume=0.3,
+        duck_db=-6.0,
+        duck_threshold_db=-45.0,
+        attack_ms=80,
+        release_ms=400,
+        target_loudness_db=-16.0,
+        peak_db=-1.0,
+    ):
+        self.sample_rate = sample_rate
+        self.music_volume = music_volume
+        self.duck_db = duck_db
+        self.duck_threshold_db = duck_threshold_db
+        self.attack_ms = attack_ms
+        self.release_ms = release_ms
+        self.target_loudness_db = target_loudness_db
+        self.peak_db = peak_db
+        self._clips = []  # (samples, start sample)
+
+    def decode(self, audio):
+        """
+        Returns the mono samples of a narration (file path, AudioBuffer, or samples already at the mixer's
+        sample rate, see 'decode_many') at the mixer's sample rate.
+        """
+        if isinstance(audio, np.ndarray):
+            return audio
+        if isinstance(audio, AudioBuffer):
+            return resample(audio.samples, audio.sample_rate, self.sample_rate)
+        return decode_audio(audio, self.sample_rate)[0]
+
+    def decode_many(self, audios):
+        """
+        Decodes several narrations like 'decode', the files all together (see decode_audio_files).
+        If that fails, the files are decoded one by one. Narrations that can't be decoded are None.
+        """
+        paths = [audio for audio in audios if not isinstance(audio, (AudioBuffer, np.ndarray))]
+        try:
+            decoded_files = iter(decode_audio_files(paths, self.sample_rate))
+        except Exception as e:
+            print(f"Could not decode the narrations together, decoding them one by one: {e}")
+            decoded_files = iter(paths)
+        decoded = []
+        for audio in audios:
+            if not isinstance(audio, (AudioBuffer, np.ndarray)):
+                audio = next(decoded_files)
+            try:
+                decoded.append(self.decode(audio))
+            except Exception as e:
+                print(f"Error processing audio {audio}: {e}")
+                traceback.print_exc()
+                decoded.append(None)
+        return decoded
+
+    def add(self, audio, start):
+        """
+        Places a narration (anything 'decode' accepts) on the timeline at 'start' seconds, and returns its duration.
+        """
+        samples = self.decode(audio)
+        self._clips.append((samples, int(round(start * self.sample_rate))))
+        return len(samples) / self.sample_rate
+
+    @property
+    def duration(self):
+        return max((start + len(samples) for samples, start in self._clips), default=0) / self.sample_rate
+
+    def narration_track(self, nsamples):
+        """
+        Returns the narrations summed into a mono buffer of 'nsamples' samples.
+        """
+        track = np.zeros(nsamples, dtype=np.float32)
+        for samples, start in self._clips:
+            end = min(start + len(samples), nsamples)
+            if end > start:
+                track[start:end] += samples[:end - start]
+        return track
+
+    def ducking_gain(self, narration):
+        """
+        Returns the gain (per sample) applied to the music under 'narration'.
+        """
+        frame_length = max(1, int(self.sample_rate / 100))  # 10 ms
+        speaking = _frame_levels(narration, frame_length) > self.duck_threshold_db
+        attack_frames = max(1, int(self.attack_ms / 10))
+        release_frames = max(1, int(self.release_ms / 10))
+        # ducked from 'attack_frames' before speech until 'release_frames' after it
+        window = np.ones(attack_frames + release_frames + 1)
+        ducked = np.convolve(speaking.astype(np.float32), window)[attack_frames:attack_frames + len(speaking)] > 0
+        frame_gain = np.where(ducked, _db_to_gain(self.duck_db), 1.0)
+        # linear ramps between the two levels
+        ramp = np.ones(attack_frames) / attack_frames
+        padded = np.concatenate([np.full(attack_frames, frame_gain[0]), frame_gain, np.full(attack_frames, frame_gain[-1])])
+        frame_gain = np.convolve(padded, ramp, mode='same')[attack_frames:attack_frames + len(frame_gain)]
+        frame_centers = (np.arange(len(frame_gain)) + 0.5) * frame_length
+        return np.interp(np.arange(len(narration)), frame_centers, frame_gain).astype(np.float32)
+
+    def mix(self, duration=None, music=None):
+        """
+        Returns the finished (nsamples, 2) float32 track.
+
+        :param duration: Length of the track in seconds, defaults to the end of the last narration.
+        :param music: (path, start) of the background music, decoded from 'start' seconds for the track's duration.
+        """
+        if duration is None:
+            duration = self.duration
+        nsamples = int(round(duration * self.sample_rate))
+        narration = self.narration_track(nsamples)
+        track = np.repeat(narration[:, None], 2, axis=1)
+        if music:
+            path, start = music
+            music_samples = decode_audio(path, self.sample_rate, channels=2, start=start, duration=duration)[0][:nsamples]
+            gain = self.music_volume
+            if self.duck_db:
+                gain = gain * self.ducking_gain(narration)[:len(music_samples), None]
+            track[:len(music_samples)] += music_samples * gain
+
+        if self.target_loudness_db is not None:
+            loudness = gated_loudness(track.mean(axis=1), self.sample_rate)
+            if loudness is not None:
+                track *= _db_to_gain(self.target_loudness_db - loudness)
+        peak = np.abs(track).max() if nsamples else 0.0
+        ceiling = _db_to_gain(self.peak_db)
+        if peak > ceiling:
+            track *= ceiling / peak
+        return track
+
+    def write(self, output_path, duration=None, music=None):
+        """
+        Mixes the track (see 'mix') into a 16-bit wav file, ready to be muxed.
+        """
+        return write_wav(self.mix(duration, music), self.sample_rate, output_path)
@@ -0,0 +1,171 @@
+import functools
+import hashlib
+import json
+import os
+import re
+import subprocess
+import tempfile
+from collections import namedtuple
+import numpy as np
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from audio_io import get_ffmpeg_binary
+
+BACKGROUND_CACHE_FOLDER = os.environ.get('BACKGROUND_CACHE_FOLDER') or 'bg_cache'
+# bump when the transcoding parameters change, so that older transcodes are redone
+INGEST_VERSION = 1
+
+class BackgroundIndex(namedtuple('BackgroundIndex', ['path', 'source', 'size', 'fps', 'duration', 'keyframes'])):
+    """
+    A transcoded background video and the times (in seconds) of its keyframes.
+    """
+    __slots__ = ()
+
+    def pick_window(self, duration, rng=np.random):
+        """
+        Returns a random start time for a 'duration' seconds window of the video, on a keyframe
+        so that decoding can start there right away. Windows that would run past the end of
+        the video are avoided when possible, otherwise the window starts at the first keyframe.
+        """
+        keyframes = np.asarray(self.keyframes)
+        candidates = keyframes[keyframes + duration <= self.duration]
+        if len(candidates) == 0:
+            return float(keyframes[0]) if len(keyframes) else 0.0
+        return float(candidates[rng.randint(len(candidates))])
+
+def center_crop(width, height, target_size):
+    """
+    Returns the (x1, y1, x2, y2) centered region of a 'width'x'height' video with the aspect ratio of 'target_size'.
+    """
+    target_width, target_height = target_size
+    if width / height > target_width / target_height:
+        # wider than the target -> crop the width
+        new_width, new_height = int(height * target_width / target_height), height
+    else:
+        # taller than the target -> crop the height
+        new_width, new_height = width, int(width * target_height / target_width)
+    x1 = (width - new_width) // 2
+    y1 = (height - new_height) // 2
+    return x1, y1, x1 + new_width, y1 + new_height
+
+def read_keyframes(path):
+    """
+    Returns the presentation times (in seconds) of the keyframes of the video 'path',
+    decoding only the keyframes.
+    """
+    cmd = [
+        get_ffmpeg_binary(), '-hide_banner', '-nostats', '-skip_frame', 'nokey', '-i', path,
+        '-an', '-vf', 'showinfo', '-f', 'null', '-',
+    ]
+    result = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
+    if result.returncode:
+        raise Exception(f'Could not index the keyframes of {path}: {result.stderr[-500:]}')
+    return [float(time) for time in re.findall(r'pts_time:\s*([0-9.]+)', result.stderr)]
+
+class BackgroundLibrary:
+    """
+    Background videos transcoded once to the size of the shorts, so that rendering only has to decode them.
+
+    Sources are center-cropped to the aspect ratio of 'size', scaled, resampled to 'fps' and encoded
+    without audio with a keyframe every 'keyframe_interval' seconds, so that any window starting on a
+    keyframe decodes immediately. The transcode and its index (duration and keyframe times, as JSON)
+    are stored as '<sha256 of the source and parameters>.mp4/.json' inside 'cache_dir', and reused
+    as long as the source file isn't modified.
+    """
+    def __init__(self, cache_dir=BACKGROUND_CACHE_FOLDER, size=(576, 1024), fps=30, keyframe_interval=1.0, crf=20, preset='veryfast'):
+        self.cache_dir = cache_dir
+        self.size = size
+        self.fps = fps
+        self.keyframe_interval = keyframe_interval
+        self.crf = crf
+        self.preset = preset
+        self._indexes = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, source_path):
+        """
+        Hashes the source file (path, size and modification time) and the transcoding parameters into a cache key.
+        """
+        stat = os.stat(source_path)
+        payload = json.dumps({
+            'source': os.path.abspath(source_path), 'bytes': stat.st_size, 'mtime': stat.st_mtime,
+            'size': list(self.size), 'fps': self.fps, 'keyframe_interval': self.keyframe_interval,
+            'crf': self.crf, 'preset': self.preset, 'version': INGEST_VERSION,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _load_index(self, key):
+        try:
+            with open(os.path.join(self.cache_dir, key + '.json')) as index_file:
+                index = BackgroundIndex(**json.load(index_file))
+        except (FileNotFoundError, ValueError, TypeError):
+            return None
+        index = index._replace(size=tuple(index.size))
+        return index if os.path.exists(index.path) else None
+
+    def _transcode(self, source_path, output_path):
+        infos = ffmpeg_parse_infos(source_path)
+        x1, y1, x2, y2 = center_crop(*infos['video_size'], self.size)
+        width, height = self.size
+        gop = max(1, int(round(self.keyframe_interval * self.fps)))
+        cmd = [
+            get_ffmpeg_binary(), '-y', '-loglevel', 'error', '-i', source_path, '-an',
+            '-vf', f"crop={x2 - x1}:{y2 - y1}:{x1}:{y1},scale={width}:{height},fps={self.fps}",
+            '-c:v', 'libx264', '-preset', self.preset, '-crf', str(self.crf), '-pix_fmt', 'yuv420p',
+            # fixed-length GOPs: no extra keyframes at scene cuts, none missing either
+            '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+            '-movflags', '+faststart', '-f', 'mp4', output_path,
+        ]
+        result = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
+        if result.returncode:
+            raise Exception(f'Could not transcode {source_path}: {result.stderr[-500:]}')
+
+    def ingest(self, source_path):
+        """
+        Transcodes and indexes 'source_path' unless it already was, and returns its BackgroundIndex.
+        """
+        key = self.make_key(source_path)
+        index = self._indexes.get(key) or self._load_index(key)
+        if index is None:
+            video_path = os.path.join(self.cache_dir, key + '.mp4')
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            os.close(fd)
+            try:
+                self._transcode(source_path, tmp_path)
+                os.replace(tmp_path, video_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            index = BackgroundIndex(
+                path=video_path,
+                source=source_path,
+                size=tuple(self.size),
+                fps=self.fps,
+                duration=ffmpeg_parse_infos(video_path)['duration'],
+                keyframes=read_keyframes(video_path),
+            )
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as index_file:
+                json.dump(index._asdict(), index_file)
+            os.replace(tmp_path, os.path.join(self.cache_dir, key + '.json'))
+        self._indexes[key] = index
+        return index
+
+    def ingest_many(self, source_paths):
+        return [self.ingest(source_path) for source_path in source_paths]
+
+@functools.lru_cache(maxsize=None)
+def get_default_background_library():
+    """
+    Returns the background library shared by every ShortCreator of the process,
+    created on first use in BACKGROUND_CACHE_FOLDER.
+    """
+    return BackgroundLibrary()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Transcode and index background videos ahead of rendering.")
+    parser.add_argument("videos", nargs="+", help="Background video files (e.g. bg_videos/*.mp4).")
+    args = parser.parse_args()
+    for index in get_default_background_library().ingest_many(args.videos):
+        print(f"{index.source} -> {index.path} ({index.duration:.1f} s, {len(index.keyframes)} keyframes)")
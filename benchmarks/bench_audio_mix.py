@@ -0,0 +1,71 @@
+"""
+Compares mixing the audio track of a short with nested MoviePy CompositeAudioClips (one ffmpeg reader
+kept open per narration, mixed chunk by chunk while writing) with the NumPy AudioMixer.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_audio_mix [--narrations 40] [--seconds-per-narration 2.5]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from moviepy.audio.AudioClip import CompositeAudioClip
+from moviepy.audio.io.AudioFileClip import AudioFileClip
+import moviepy.audio.fx.all as afx
+
+from audio_io import encode_audio
+from audio_mixer import AudioMixer
+from benchmarks.bench_time_stretch import speech_like_signal
+
+def legacy_mix(narration_paths, music_path, output_path, music_volume=0.3):
+    # what ShortCreator.create_video used to do
+    audio_clips = []
+    current_time = 0
+    for path in narration_paths:
+        clip = AudioFileClip(path).set_start(current_time)
+        audio_clips.append(clip)
+        current_time += clip.duration
+    combined_audio = CompositeAudioClip(audio_clips)
+    music = AudioFileClip(music_path).fx(afx.volumex, music_volume).subclip(0, current_time)
+    final_audio = CompositeAudioClip([combined_audio, music]).set_duration(current_time)
+    final_audio.write_audiofile(output_path, fps=44100, nbytes=2, codec="pcm_s16le", logger=None)
+    open_readers = len(audio_clips) + 1
+    for clip in audio_clips:
+        clip.close()
+    music.close()
+    return open_readers
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NumPy audio mixer against CompositeAudioClip.")
+    parser.add_argument("--narrations", type=int, default=40)
+    parser.add_argument("--seconds-per-narration", type=float, default=2.5)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    narration_paths = []
+    for i in range(args.narrations):
+        path = os.path.join(tmp_dir, f'narration_{i}.mp3')
+        encode_audio(speech_like_signal(args.seconds_per_narration, seed=i), 24000, path)
+        narration_paths.append(path)
+    music_path = os.path.join(tmp_dir, 'music.mp3')
+    encode_audio(0.5 * speech_like_signal(args.narrations * args.seconds_per_narration + 10, seed=1000), 24000, music_path)
+
+    start = time.perf_counter()
+    open_readers = legacy_mix(narration_paths, music_path, os.path.join(tmp_dir, 'legacy.wav'))
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mixer = AudioMixer()
+    current_time = 0
+    for path in narration_paths:
+        current_time += mixer.add(path, current_time)
+    mixer.write(os.path.join(tmp_dir, 'mixer.wav'), current_time, music=(music_path, 0.0))
+    mixer_time = time.perf_counter() - start
+
+    print(f"{args.narrations} narrations, {current_time:.0f} s track")
+    print(f"  CompositeAudioClip: {legacy_time:6.2f} s, {open_readers} ffmpeg readers open at once")
+    print(f"  AudioMixer:         {mixer_time:6.2f} s, 1 ffmpeg decoder at a time ({legacy_time / mixer_time:.1f}x)")
+
+if __name__ == "__main__":
+    main()
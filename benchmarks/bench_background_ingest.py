@@ -0,0 +1,102 @@
+"""
+Compares reading random background windows from the source video (seeking anywhere, cropping and
+scaling every frame) with reading keyframe-aligned windows of its BackgroundLibrary transcode.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_background_ingest [--source-seconds 180] [--window-seconds 10] [--windows 8]
+
+The source is a 1280x720 test pattern encoded with 10 s GOPs, like a long gameplay recording.
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+from moviepy.editor import VideoFileClip  # the editor module adds the crop and resize methods
+
+from audio_io import get_ffmpeg_binary
+from background_library import BackgroundLibrary, center_crop
+from compositor import BackgroundReader
+
+size = (576, 1024)
+fps = 30
+
+def make_source(path, seconds):
+    subprocess.run([
+        get_ffmpeg_binary(), '-y', '-loglevel', 'error', '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate={fps}:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(10 * fps), '-pix_fmt', 'yuv420p', path,
+    ], check=True)
+
+def read_window(reader, nframes):
+    # returns (time to first frame, total time)
+    start = time.perf_counter()
+    reader.read()
+    first_frame = time.perf_counter() - start
+    for _ in range(nframes - 1):
+        reader.read()
+    total = time.perf_counter() - start
+    reader.close()
+    return first_frame, total
+
+def read_moviepy_window(clip, window_start, nframes):
+    start = time.perf_counter()
+    subclip = clip.subclip(window_start, window_start + nframes / fps)
+    frames = subclip.iter_frames(fps=fps)
+    next(frames)
+    first_frame = time.perf_counter() - start
+    for _ in frames:
+        pass
+    return first_frame, time.perf_counter() - start
+
+def report(name, timings):
+    timings = np.array(timings)
+    print(f"  {name:38s} first frame {1000 * timings[:, 0].mean():7.1f} ms, window {timings[:, 1].mean():6.2f} s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark keyframe-aligned windows of ingested backgrounds.")
+    parser.add_argument("--source-seconds", type=float, default=180)
+    parser.add_argument("--window-seconds", type=float, default=10)
+    parser.add_argument("--windows", type=int, default=8)
+    parser.add_argument("--skip-moviepy", action="store_true")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    source_path = os.path.join(tmp_dir, 'source.mp4')
+    make_source(source_path, args.source_seconds)
+
+    library = BackgroundLibrary(cache_dir=os.path.join(tmp_dir, 'bg_cache'), size=size, fps=fps)
+    start = time.perf_counter()
+    index = library.ingest(source_path)
+    print(f"ingest (once per video): {time.perf_counter() - start:.1f} s for {index.duration:.0f} s of video, {len(index.keyframes)} keyframes")
+    start = time.perf_counter()
+    library.ingest(source_path)
+    print(f"ingest again: {1000 * (time.perf_counter() - start):.1f} ms")
+
+    nframes = int(args.window_seconds * fps)
+    rng = np.random.RandomState(0)
+    crop = center_crop(1280, 720, size)
+    source_starts = rng.uniform(0, args.source_seconds - args.window_seconds, args.windows)
+    keyframe_starts = [index.pick_window(args.window_seconds, rng) for _ in range(args.windows)]
+
+    print(f"{args.windows} random windows of {nframes} frames")
+    report("source (seek, crop, scale)", [
+        read_window(BackgroundReader(source_path, size, fps, start=t, crop=crop), nframes) for t in source_starts
+    ])
+    report("ingested (keyframe window)", [
+        read_window(BackgroundReader(index.path, size, fps, start=t, resample=False), nframes) for t in keyframe_starts
+    ])
+
+    if not args.skip_moviepy:
+        clip = VideoFileClip(source_path, audio=False)
+        x1, y1, x2, y2 = crop
+        clip = clip.crop(x1=x1, y1=y1, x2=x2, y2=y2).resize(size)
+        report("moviepy source (crop, resize)", [read_moviepy_window(clip, t, nframes) for t in source_starts])
+        clip.close()
+        clip = VideoFileClip(index.path, audio=False)
+        report("moviepy ingested", [read_moviepy_window(clip, t, nframes) for t in keyframe_starts])
+        clip.close()
+
+if __name__ == "__main__":
+    main()
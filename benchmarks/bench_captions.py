@@ -0,0 +1,70 @@
+"""
+Compares the per-frame cost of the glyph-atlas caption overlay with drawing the captions with PIL on every frame.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_captions [--seconds 30] [--fps 30]
+"""
+import argparse
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from benchmarks.bench_text_layout import comment_thread
+from captions import CaptionRenderer
+
+VIDEO_SIZE = (576, 1024)
+
+def pil_caption_frame(frame, renderer, track, t):
+    # what drawing the captions inside MoviePy with PIL would cost: a draw.text call per frame
+    page = track.page_at(t)
+    if page is None:
+        return frame
+    image = Image.fromarray(frame)
+    draw = ImageDraw.Draw(image)
+    x, y = page.position
+    color, highlight_color, stroke_color = renderer.colors
+    current = page.words[page.word_index(t)]
+    for word in page.words:
+        draw.text(
+            (x + word.x0 + renderer.atlas.stroke_width, y + renderer.atlas.stroke_width), word.text,
+            font=renderer.atlas.font, fill=highlight_color if word is current else color,
+            stroke_width=renderer.atlas.stroke_width, stroke_fill=stroke_color,
+        )
+    return np.asarray(image)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the caption overlay.")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--fps", type=int, default=30)
+    args = parser.parse_args()
+
+    texts = comment_thread(8)
+    segment_duration = args.seconds / len(texts)
+    segments = [(text, i * segment_duration, segment_duration) for i, text in enumerate(texts)]
+    frame = np.random.default_rng(0).integers(0, 255, (VIDEO_SIZE[1], VIDEO_SIZE[0], 3), dtype=np.uint8)
+    frame.flags.writeable = False  # like the frames MoviePy hands over
+    times = np.arange(0, args.seconds, 1 / args.fps)
+
+    start = time.perf_counter()
+    renderer = CaptionRenderer()
+    track = renderer.build_track(segments, VIDEO_SIZE)
+    setup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for t in times:
+        track.apply(lambda _: frame, t)
+    atlas_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for t in times:
+        pil_caption_frame(frame, renderer, track, t)
+    pil_time = time.perf_counter() - start
+
+    print(f"{len(track)} caption lines, {len(times)} frames")
+    print(f"  atlas + layout (once):  {setup_time * 1000:7.1f} ms")
+    print(f"  atlas overlay:          {atlas_time / len(times) * 1000:7.3f} ms/frame")
+    print(f"  PIL draw.text:          {pil_time / len(times) * 1000:7.3f} ms/frame")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Renders the same synthetic short with the NumPy compositor, the ffmpeg filtergraph and MoviePy's
+CompositeVideoClip, and compares the rendering speed and the output frames.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_compositor [--seconds 20] [--pairs 6] [--presets medium ultrafast]
+                                          [--backends numpy ffmpeg moviepy] [--no-captions]
+
+With a slow x264 preset every backend mostly waits for the encoder, the 'ultrafast' run shows the
+difference in compositing.
+
+The background video (1280x720 test pattern) and the narrations (speech-like tones) are generated with ffmpeg.
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from audio_io import encode_audio, get_ffmpeg_binary
+from benchmarks.bench_text_layout import comment_thread
+from benchmarks.bench_time_stretch import speech_like_signal
+from image_creator import RedditImageCreator
+
+def make_background(path, seconds):
+    subprocess.run([
+        get_ffmpeg_binary(), '-y', '-loglevel', 'error', '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', path,
+    ], check=True)
+
+def read_frames(path, times):
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+    clip = VideoFileClip(path, audio=False)
+    frames = [clip.get_frame(t).astype(np.float32) for t in times]
+    clip.close()
+    return frames
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NumPy compositor against MoviePy.")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--pairs", type=int, default=6)
+    parser.add_argument("--presets", nargs='+', default=["medium", "ultrafast"])
+    parser.add_argument("--backends", nargs='+', default=["numpy", "ffmpeg", "moviepy"])
+    parser.add_argument("--no-captions", action="store_true")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['TMP_FOLDER'] = tmp_dir
+    from short_creator import ShortCreator
+
+    background_path = os.path.join(tmp_dir, 'background.mp4')
+    make_background(background_path, args.seconds * 2)
+
+    texts = comment_thread(args.pairs)
+    creator = RedditImageCreator(cache=False)
+    title_card = creator.create_reddit_post_frames(texts[0])
+    images = [title_card] + [image for image, _ in creator.create_text_images(texts[1:])]
+    narrations = []
+    for i in range(args.pairs):
+        path = os.path.join(tmp_dir, f'narration_{i}.mp3')
+        encode_audio(speech_like_signal(args.seconds / args.pairs, seed=i), 24000, path)
+        narrations.append(path)
+
+    nframes = int(args.seconds * 30)
+    print(f"{args.seconds:.0f} s short, {nframes} frames, {args.pairs} image-audio pairs")
+    for preset in args.presets:
+        results = {}
+        for backend in args.backends:
+            short_creator = ShortCreator(captions=False if args.no_captions else None, backend=backend, preset=preset, background_library=False)
+            for image, narration, text in zip(images, narrations, texts):
+                short_creator.add_image_audio_pair(image, narration, caption=text)
+            short_creator.add_background_video(background_path)
+            output_path = os.path.join(tmp_dir, f'short_{backend}_{preset}.mp4')
+            np.random.seed(0)  # same background window for every backend
+            start = time.perf_counter()
+            short_creator.create_video(output_path)
+            results[backend] = (time.perf_counter() - start, output_path)
+
+        print(f"x264 preset '{preset}'")
+        reference = results.get('moviepy', (None,))[0]
+        for backend, (elapsed, _) in results.items():
+            speedup = f", {reference / elapsed:.1f}x moviepy" if reference else ""
+            print(f"  {backend:8s} {elapsed:7.2f} s ({nframes / elapsed:6.1f} frames/s{speedup})")
+
+    # the background scalers differ (ffmpeg's vs MoviePy's), expect small differences on sharp edges,
+    # and libass draws the captions of the ffmpeg backend
+    times = np.linspace(0.5, args.seconds - 0.5, 8)
+    frames = {backend: read_frames(output_path, times) for backend, (_, output_path) in results.items()}
+    backends = list(frames)
+    for i, first in enumerate(backends):
+        for second in backends[i + 1:]:
+            differences = ', '.join(f"{np.abs(a - b).mean():.1f}" for a, b in zip(frames[first], frames[second]))
+            print(f"  mean absolute difference {first}/{second}: {differences}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Measures how the rendering of a Reddit thread's paragraph images scales with the number of worker processes.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_image_rendering [--comments 5] [--paragraphs 4] [--processes 1 2 4]
+
+Also checks that every process count renders the same images in the same order.
+"""
+import argparse
+import os
+import time
+
+from PIL import ImageChops
+
+from benchmarks.bench_text_layout import comment_thread
+from image_creator import RedditImageCreator
+
+def render_thread(creator, post_paragraphs, comments_authors, comments_paragraphs):
+    post_images = [image for image, _ in creator.create_text_images(post_paragraphs)]
+    comments_images = creator.create_comments_images(comments_authors, comments_paragraphs)
+    return post_images + [image for images in comments_images for image in images]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel rendering of paragraph images.")
+    parser.add_argument("--comments", type=int, default=5)
+    parser.add_argument("--paragraphs", type=int, default=4, help="Paragraphs per comment (and in the post).")
+    parser.add_argument("--processes", type=int, nargs='+', default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    post_paragraphs = comment_thread(args.paragraphs, seed=0)
+    comments_authors = [f"commenter_{i}" for i in range(args.comments)]
+    comments_paragraphs = [comment_thread(args.paragraphs, seed=i + 1) for i in range(args.comments)]
+    print(f"{os.cpu_count()} cores, {args.paragraphs * (args.comments + 1)} paragraph images")
+
+    reference, reference_time = None, None
+    for processes in args.processes:
+        creator = RedditImageCreator(processes=processes, cache=False)
+        # the first batch starts the workers (and loads their fonts), like the first thread of a run
+        start = time.perf_counter()
+        render_thread(creator, post_paragraphs, comments_authors, comments_paragraphs)
+        cold_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        images = render_thread(creator, post_paragraphs, comments_authors, comments_paragraphs)
+        warm_time = time.perf_counter() - start
+        creator.close()
+
+        if reference is None:
+            reference, reference_time = images, warm_time
+        identical = len(images) == len(reference) and all(
+            a.size == b.size and ImageChops.difference(a, b).getbbox() is None for a, b in zip(images, reference)
+        )
+        print(
+            f"{processes:2d} processes: {cold_time:6.3f} s cold, {warm_time:6.3f} s warm "
+            f"({reference_time / warm_time:4.1f}x), identical output: {identical}"
+        )
+
+if __name__ == "__main__":
+    main()
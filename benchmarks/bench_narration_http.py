@@ -0,0 +1,80 @@
+"""
+Measures the per-request client overhead of the narration providers against a local stand-in server.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_narration_http [--requests 50] [--synthesis-time 0.0]
+
+Note: the stand-in server speaks plain HTTP, so the numbers only include the TCP handshake.
+Against the real providers every new connection also pays for a TLS handshake.
+"""
+import argparse
+import os
+import tempfile
+import time
+import wave
+
+import requests
+
+from benchmarks.stand_in_server import StandInTTSServer
+
+def bench_bare_requests(server, nrequests):
+    url = f"{server.base_url}/text-to-speech/voice"
+    start = time.perf_counter()
+    for _ in range(nrequests):
+        requests.post(url, json={"text": "Hello there."}).content
+    return time.perf_counter() - start
+
+def bench_narrator(narrator, nrequests):
+    start = time.perf_counter()
+    for i in range(nrequests):
+        narrator.create_audio_file(f"Hello there number {i}.")
+    return time.perf_counter() - start
+
+def bench_voice_clone_payload(nrequests, seconds=10, sample_rate=44100):
+    from narration import get_wav_as_base64, get_voice_clone_payload
+
+    wav_path = os.path.join(tempfile.mkdtemp(), 'voice_sample.wav')
+    with wave.open(wav_path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(os.urandom(seconds * sample_rate * 2))
+
+    start = time.perf_counter()
+    for _ in range(nrequests):
+        get_wav_as_base64(wav_path)
+    uncached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(nrequests):
+        get_voice_clone_payload(wav_path)
+    memoized = time.perf_counter() - start
+    return uncached, memoized
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark narration HTTP overhead against a local stand-in server.")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--synthesis-time", type=float, default=0.0, help="Simulated server synthesis time (s).")
+    args = parser.parse_args()
+
+    os.environ.setdefault('TMP_FOLDER', tempfile.mkdtemp())
+    os.environ.setdefault('ELEVENLABS_KEY', 'stand-in')
+
+    with StandInTTSServer(synthesis_time=args.synthesis_time) as server:
+        elapsed = bench_bare_requests(server, args.requests)
+        print(f"bare requests.post:        {1000 * elapsed / args.requests:7.2f} ms/request, {server.connections} connections")
+
+        server.connections = 0
+        os.environ['ELEVENLABS_BASE_URL'] = server.base_url
+        from narration import NarratorElevenLabs, TokenBucket
+        narrator = NarratorElevenLabs(cache=False)
+        narrator.rate_limiter = TokenBucket(1e9)  # measure the client, not our own rate limit
+        elapsed = bench_narrator(narrator, args.requests)
+        print(f"NarratorElevenLabs pooled: {1000 * elapsed / args.requests:7.2f} ms/request, {server.connections} connections")
+
+    uncached, memoized = bench_voice_clone_payload(args.requests)
+    print(f"voice clone payload: {1000 * uncached / args.requests:7.2f} ms/request read+encoded, "
+          f"{1000 * memoized / args.requests:7.4f} ms/request memoized")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares buffered vs streamed TTS downloads against a local chunked-transfer stand-in server.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_narration_streaming [--audio-mb 8] [--chunk-delay 0.002]
+
+Reports wall-clock time and peak Python heap usage (tracemalloc) per narration.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.stand_in_server import StandInTTSServer
+
+def measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+def buffered_download(session, url, output_path):
+    # what NarratorElevenLabs used to do: keep the whole body in memory, then write it
+    response = session.post(url, json={"text": "Hello there."})
+    with open(output_path, 'wb') as output_file:
+        output_file.write(response.content)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streamed TTS downloads against a chunked stand-in server.")
+    parser.add_argument("--audio-mb", type=float, default=8)
+    parser.add_argument("--chunk-size", type=int, default=16 * 1024)
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Delay between chunks (s).")
+    args = parser.parse_args()
+
+    os.environ.setdefault('TMP_FOLDER', tempfile.mkdtemp())
+    os.environ.setdefault('ELEVENLABS_KEY', 'stand-in')
+    os.environ.setdefault('OPENAI_KEY', 'stand-in')
+
+    audio_bytes = os.urandom(int(args.audio_mb * 1024 * 1024))
+    with StandInTTSServer(audio_bytes=audio_bytes, chunk_size=args.chunk_size, chunk_delay=args.chunk_delay) as server:
+        os.environ['ELEVENLABS_BASE_URL'] = server.base_url
+        os.environ['OPENAI_BASE_URL'] = server.base_url
+        from narration import NarratorElevenLabs, NarratorOpenAI, TokenBucket
+
+        elevenlabs = NarratorElevenLabs(cache=False)
+        elevenlabs.rate_limiter = TokenBucket(1e9)
+        output_path = os.path.join(os.environ['TMP_FOLDER'], 'buffered.mp3')
+        url = f"{server.base_url}/text-to-speech/{elevenlabs.voice_id}"
+
+        elapsed, peak = measure(lambda: buffered_download(elevenlabs.session, url, output_path))
+        print(f"buffered download:           {elapsed:6.3f} s, peak heap {peak / 2**20:7.2f} MB")
+
+        elapsed, peak = measure(lambda: elevenlabs.create_audio_file("Hello there."))
+        print(f"NarratorElevenLabs streamed: {elapsed:6.3f} s, peak heap {peak / 2**20:7.2f} MB")
+
+        openai = NarratorOpenAI('ash', cache=False)
+        openai.rate_limiter = TokenBucket(1e9)
+        elapsed, peak = measure(lambda: openai.create_audio_file("Hello there."))
+        print(f"NarratorOpenAI streamed:     {elapsed:6.3f} s, peak heap {peak / 2**20:7.2f} MB")
+
+if __name__ == "__main__":
+    main()
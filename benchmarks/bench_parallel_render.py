@@ -0,0 +1,75 @@
+"""
+Renders the same synthetic short with ShortCreator split into 1, 2, 4... segments rendered in parallel,
+and reports the wall-clock time of each, next to the number of CPU cores of the machine.
+The segments are encoded separately, so the outputs differ only by compression noise.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_parallel_render [--seconds 30] [--pairs 8] [--processes 1 2 4] [--preset medium]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from audio_io import encode_audio
+from background_library import BackgroundLibrary
+from benchmarks.bench_compositor import make_background, read_frames
+from benchmarks.bench_text_layout import comment_thread
+from benchmarks.bench_time_stretch import speech_like_signal
+from image_creator import RedditImageCreator
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark segment-parallel rendering.")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--pairs", type=int, default=8)
+    parser.add_argument("--processes", type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument("--preset", default="medium")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['TMP_FOLDER'] = tmp_dir
+    from short_creator import ShortCreator
+
+    background_path = os.path.join(tmp_dir, 'background.mp4')
+    make_background(background_path, args.seconds * 2)
+    library = BackgroundLibrary(cache_dir=os.path.join(tmp_dir, 'bg_cache'))
+    library.ingest(background_path)
+
+    texts = comment_thread(args.pairs)
+    creator = RedditImageCreator(cache=False)
+    images = [image for image, _ in creator.create_text_images(texts)]
+    narrations = []
+    for i in range(args.pairs):
+        path = os.path.join(tmp_dir, f'narration_{i}.mp3')
+        # uneven lengths, so that segments can't be split exactly evenly
+        encode_audio(speech_like_signal(args.seconds / args.pairs * (0.6 + 0.8 * (i % 3) / 2), seed=i), 24000, path)
+        narrations.append(path)
+
+    print(f"{args.pairs} image-audio pairs, x264 preset '{args.preset}', {os.cpu_count()} CPU cores")
+    results = {}
+    for processes in args.processes:
+        short_creator = ShortCreator(preset=args.preset, background_library=library, render_processes=processes)
+        for image, narration, text in zip(images, narrations, texts):
+            short_creator.add_image_audio_pair(image, narration, caption=text)
+        short_creator.add_background_video(background_path)
+        output_path = os.path.join(tmp_dir, f'short_{processes}.mp4')
+        np.random.seed(0)  # same background window for every run
+        start = time.perf_counter()
+        short_creator.create_video(output_path)
+        results[processes] = (time.perf_counter() - start, output_path)
+
+    baseline = results[args.processes[0]][0]
+    for processes, (elapsed, _) in results.items():
+        print(f"  {processes:2d} processes: {elapsed:7.2f} s ({baseline / elapsed:.2f}x)")
+
+    times = np.linspace(0.5, args.seconds * 0.9, 8)
+    reference = read_frames(results[args.processes[0]][1], times)
+    for processes, (_, output_path) in list(results.items())[1:]:
+        frames = read_frames(output_path, times)
+        difference = max(np.abs(a - b).mean() for a, b in zip(reference, frames))
+        print(f"  max mean absolute difference with {processes} processes: {difference:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Renders the same ShortTimeline as a preview, as a contact sheet and as the final short, and reports the time
+of each next to the final render, and how far the preview frames are from the downscaled final frames.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_preview [--seconds 30] [--pairs 8] [--preset medium] [--scale 0.5] [--preview-fps 15]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from audio_io import encode_audio
+from background_library import BackgroundLibrary
+from benchmarks.bench_compositor import make_background, read_frames
+from benchmarks.bench_text_layout import comment_thread
+from benchmarks.bench_time_stretch import speech_like_signal
+from image_creator import RedditImageCreator
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preview renders against the final render.")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--pairs", type=int, default=8)
+    parser.add_argument("--preset", default="medium")
+    parser.add_argument("--scale", type=float, default=0.5)
+    parser.add_argument("--preview-fps", type=int, default=15)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['TMP_FOLDER'] = tmp_dir
+    from short_creator import ShortCreator
+
+    background_path = os.path.join(tmp_dir, 'background.mp4')
+    make_background(background_path, args.seconds * 2)
+    library = BackgroundLibrary(cache_dir=os.path.join(tmp_dir, 'bg_cache'))
+
+    texts = comment_thread(args.pairs)
+    creator = RedditImageCreator(cache=False)
+    title_card = creator.create_reddit_post_frames(texts[0])
+    images = [title_card] + [image for image, _ in creator.create_text_images(texts[1:])]
+    short_creator = ShortCreator(preset=args.preset, background_library=library)
+    for i, (image, text) in enumerate(zip(images, texts)):
+        path = os.path.join(tmp_dir, f'narration_{i}.mp3')
+        encode_audio(speech_like_signal(args.seconds / args.pairs, seed=i), 24000, path)
+        short_creator.add_image_audio_pair(image, path, caption=text)
+    short_creator.add_background_video(background_path)
+
+    timings = {}
+    start = time.perf_counter()
+    timeline = short_creator.build_timeline()
+    timings['timeline'] = time.perf_counter() - start
+    outputs = {
+        'preview': lambda: short_creator.create_preview(
+            os.path.join(tmp_dir, 'preview.mp4'), timeline, scale=args.scale, preview_fps=args.preview_fps,
+        ),
+        'contact sheet': lambda: short_creator.create_contact_sheet(os.path.join(tmp_dir, 'contact_sheet.png'), timeline),
+        'final': lambda: short_creator.create_video(os.path.join(tmp_dir, 'final.mp4'), timeline),
+    }
+    for name, render in outputs.items():
+        start = time.perf_counter()
+        render()
+        timings[name] = time.perf_counter() - start
+
+    print(f"{timeline.duration:.1f} s short, {len(timeline.items)} pairs, final preset '{args.preset}'")
+    print(f"  timeline (decoding the narrations): {timings['timeline']:6.2f} s")
+    for name in outputs:
+        print(f"  {name:>13}: {timings[name]:6.2f} s ({timings[name] / timings['final']:.0%} of the final render)")
+
+    times = [round(t * args.preview_fps) / args.preview_fps for t in np.linspace(0.5, timeline.duration * 0.9, 8)]
+    previews = read_frames(os.path.join(tmp_dir, 'preview.mp4'), times)
+    finals = read_frames(os.path.join(tmp_dir, 'final.mp4'), times)
+    difference = max(
+        np.abs(preview - cv2.resize(final, preview.shape[1::-1], interpolation=cv2.INTER_AREA)).mean()
+        for preview, final in zip(previews, finals)
+    )
+    print(f"  max mean absolute difference with the downscaled final frames: {difference:.2f}")
+
+if __name__ == "__main__":
+    main()
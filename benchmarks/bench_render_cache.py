@@ -0,0 +1,56 @@
+"""
+Measures re-rendering a Reddit thread's text cards with a cold, disk-only and in-memory render cache.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_render_cache [--comments 5] [--paragraphs 4]
+
+The cache is created in a temporary folder, the real RENDER_CACHE_FOLDER is not touched.
+"""
+import argparse
+import tempfile
+import time
+
+from PIL import ImageChops
+
+from benchmarks.bench_image_rendering import render_thread
+from benchmarks.bench_text_layout import comment_thread
+from image_creator import RedditImageCreator, RenderCache
+
+def timed_render(creator, thread):
+    start = time.perf_counter()
+    images = render_thread(creator, *thread)
+    return images, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the text card render cache.")
+    parser.add_argument("--comments", type=int, default=5)
+    parser.add_argument("--paragraphs", type=int, default=4, help="Paragraphs per comment (and in the post).")
+    args = parser.parse_args()
+
+    thread = (
+        comment_thread(args.paragraphs, seed=0),
+        [f"commenter_{i}" for i in range(args.comments)],
+        [comment_thread(args.paragraphs, seed=i + 1) for i in range(args.comments)],
+    )
+    cache_dir = tempfile.mkdtemp()
+
+    reference, uncached_time = timed_render(RedditImageCreator(cache=False), thread)
+    creator = RedditImageCreator(cache=RenderCache(cache_dir))
+    _, cold_time = timed_render(creator, thread)
+    memory_images, memory_time = timed_render(creator, thread)
+    # a new process: same disk store, empty memory level
+    disk_images, disk_time = timed_render(RedditImageCreator(cache=RenderCache(cache_dir)), thread)
+
+    identical = all(
+        a.size == b.size == c.size and ImageChops.difference(a, b).getbbox() is None and ImageChops.difference(a, c).getbbox() is None
+        for a, b, c in zip(reference, memory_images, disk_images)
+    )
+    print(f"{len(reference)} text cards, identical output: {identical}")
+    print(f"  no cache:         {uncached_time:6.3f} s")
+    print(f"  cold cache:       {cold_time:6.3f} s (render + store)")
+    print(f"  disk hits:        {disk_time:6.3f} s ({uncached_time / disk_time:5.1f}x)")
+    print(f"  memory hits:      {memory_time:6.3f} s ({uncached_time / memory_time:5.1f}x)")
+    print(f"  stats: {creator.cache.stats()}")
+
+if __name__ == "__main__":
+    main()
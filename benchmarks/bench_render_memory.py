@@ -0,0 +1,93 @@
+"""
+Renders shorts with a growing number of image-audio pairs with the NumPy compositor, opening every overlay
+up front (as before) or lazily through a ReaderPool, and reports the peak resident memory of each render.
+Each render runs in a fresh process, so that memory kept by earlier renders doesn't hide the peak.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_render_memory [--pairs 5 20 40] [--seconds-per-pair 1.5] [--max-open 2]
+
+The images are 1080x1350 RGBA PNG files (the size of a screenshot), the background a 1280x720 test pattern.
+Audio isn't mixed: only the video timeline is measured.
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.bench_compositor import make_background
+
+def make_images(directory, count, size=(1080, 1350)):
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width]
+    paths = []
+    for i in range(count):
+        rng = np.random.default_rng(i)
+        rgba = np.stack([
+            (x * 255 // width + 40 * i) % 256,
+            y * 255 // height,
+            rng.integers(0, 256, (height, width)),
+            np.full((height, width), 220),
+        ], axis=2).astype(np.uint8)
+        path = os.path.join(directory, f'image_{i}.png')
+        Image.fromarray(rgba).save(path, compress_level=1)
+        paths.append(path)
+    return paths
+
+def render(mode, background_path, image_paths, seconds_per_pair, max_open, output_path):
+    from compositor import BackgroundReader, Compositor
+    from short_creator import _open_overlay, _prepare_overlay, fps, target_height, target_width
+    from util import PeakMemoryMonitor, ReaderPool
+
+    size = (target_width, target_height)
+    timeline = [(path, i * seconds_per_pair, (i + 1) * seconds_per_pair) for i, path in enumerate(image_paths)]
+    duration = len(image_paths) * seconds_per_pair
+    pool = ReaderPool(max_open=max_open)
+    baseline = PeakMemoryMonitor.resident_mb()
+    start = time.perf_counter()
+    with PeakMemoryMonitor() as memory:
+        background = BackgroundReader(background_path, size, fps, crop=(280, 0, 685, 720))
+        try:
+            compositor = Compositor(size=size, fps=fps, preset='ultrafast')
+            if mode == 'eager':
+                overlays = [(_prepare_overlay(path), start, end) for path, start, end in timeline]
+                compositor.render(output_path, duration, background, overlays)
+            else:
+                compositor.render(output_path, duration, background, timeline, open_overlay=_open_overlay, pool=pool)
+        finally:
+            background.close()
+    return memory.peak_mb - baseline, pool.peak_open, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the peak memory of eager and lazy overlay opening.")
+    parser.add_argument("--pairs", type=int, nargs='+', default=[5, 20, 40])
+    parser.add_argument("--seconds-per-pair", type=float, default=1.5)
+    parser.add_argument("--max-open", type=int, default=2)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    background_path = os.path.join(tmp_dir, 'background.mp4')
+    make_background(background_path, max(args.pairs) * args.seconds_per_pair + 1)
+    image_paths = make_images(tmp_dir, max(args.pairs))
+
+    print(f"{args.seconds_per_pair} s per pair, peak memory above the process baseline")
+    for pairs in args.pairs:
+        results = []
+        for mode in ('eager', 'lazy'):
+            output_path = os.path.join(tmp_dir, f'short_{mode}_{pairs}.mp4')
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                results.append(executor.submit(
+                    render, mode, background_path, image_paths[:pairs], args.seconds_per_pair, args.max_open, output_path,
+                ).result())
+        (eager_mb, _, eager_time), (lazy_mb, lazy_open, lazy_time) = results
+        print(
+            f"  {pairs:3d} pairs: eager {eager_mb:7.1f} MB ({eager_time:5.1f} s), "
+            f"lazy {lazy_mb:7.1f} MB ({lazy_time:5.1f} s, at most {lazy_open} open)"
+        )
+
+if __name__ == "__main__":
+    main()
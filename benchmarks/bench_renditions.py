@@ -0,0 +1,75 @@
+"""
+Renders a 1080x1920 / 720x1280 / 576x1024 ladder of the same short in a single pass (frames composed once,
+at 1080x1920, and encoded three times by one ffmpeg process), and once per rendition, and compares the times.
+Encoding dominates both, the difference is the decoding and compositing saved by the single pass.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_renditions [--seconds 15] [--pairs 5] [--preset veryfast]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from audio_io import encode_audio
+from benchmarks.bench_compositor import make_background
+from benchmarks.bench_text_layout import comment_thread
+from benchmarks.bench_time_stretch import speech_like_signal
+from compositor import Rendition
+from image_creator import RedditImageCreator
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single-pass rendition ladders.")
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--pairs", type=int, default=5)
+    parser.add_argument("--preset", default="veryfast")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['TMP_FOLDER'] = tmp_dir
+    from short_creator import ShortCreator
+
+    background_path = os.path.join(tmp_dir, 'background.mp4')
+    make_background(background_path, args.seconds * 2)
+
+    texts = comment_thread(args.pairs)
+    creator = RedditImageCreator(cache=False)
+    images = [image for image, _ in creator.create_text_images(texts)]
+    short_creator = ShortCreator(background_library=False)
+    for i, (image, text) in enumerate(zip(images, texts)):
+        path = os.path.join(tmp_dir, f'narration_{i}.mp3')
+        encode_audio(speech_like_signal(args.seconds / args.pairs, seed=i), 24000, path)
+        short_creator.add_image_audio_pair(image, path, caption=text)
+    short_creator.add_background_video(background_path)
+
+    ladder = [
+        Rendition(os.path.join(tmp_dir, 'short_1080.mp4'), (1080, 1920), preset=args.preset, video_bitrate="8M"),
+        Rendition(os.path.join(tmp_dir, 'short_720.mp4'), (720, 1280), preset=args.preset, video_bitrate="4M"),
+        Rendition(os.path.join(tmp_dir, 'short_576.mp4'), (576, 1024), preset=args.preset, crf=23, audio_bitrate="128k"),
+    ]
+    np.random.seed(0)
+    timeline = short_creator.build_timeline()
+
+    start = time.perf_counter()
+    short_creator.create_renditions(ladder, timeline)
+    single_pass = time.perf_counter() - start
+
+    per_rendition = {}
+    for rendition in ladder:
+        start = time.perf_counter()
+        short_creator.create_renditions([rendition._replace(path=rendition.path.replace('.mp4', '_alone.mp4'))], timeline)
+        per_rendition[rendition.size] = time.perf_counter() - start
+    separate = sum(per_rendition.values())
+
+    print(f"{timeline.duration:.0f} s short, x264 preset '{args.preset}'")
+    for (width, height), elapsed in per_rendition.items():
+        print(f"  {f'{width}x{height} alone:':23} {elapsed:6.2f} s")
+    print(f"  one pass per rendition: {separate:6.2f} s")
+    print(f"  single pass:            {single_pass:6.2f} s ({separate / single_pass:.2f}x)")
+    for rendition in ladder:
+        print(f"  {os.path.basename(rendition.path)}: {os.path.getsize(rendition.path) / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    main()
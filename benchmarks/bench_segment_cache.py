@@ -0,0 +1,93 @@
+"""
+Re-renders a short after editing it, with the segment cache: unchanged, with one comment image swapped,
+with one narration regenerated (same length) and with one narration made longer, which moves the pairs after it.
+Reports the time of each render next to a full render without the cache.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_segment_cache [--seconds 30] [--pairs 8] [--preset medium]
+
+The caches are created in a temporary folder, the real SEGMENT_CACHE_FOLDER is not touched.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from audio_io import encode_audio
+from background_library import BackgroundLibrary
+from benchmarks.bench_compositor import make_background
+from benchmarks.bench_text_layout import comment_thread
+from benchmarks.bench_time_stretch import speech_like_signal
+from image_creator import RedditImageCreator
+from segment_cache import SegmentCache
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark incremental re-renders with the segment cache.")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--pairs", type=int, default=8)
+    parser.add_argument("--preset", default="medium")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['TMP_FOLDER'] = tmp_dir
+    from short_creator import ShortCreator
+
+    background_path = os.path.join(tmp_dir, 'background.mp4')
+    make_background(background_path, args.seconds * 2)
+    library = BackgroundLibrary(cache_dir=os.path.join(tmp_dir, 'bg_cache'))
+    segment_cache = SegmentCache(cache_dir=os.path.join(tmp_dir, 'segment_cache'))
+
+    texts = comment_thread(args.pairs)
+    creator = RedditImageCreator(cache=False)
+    images = [image for image, _ in creator.create_text_images(texts)]
+    pair_seconds = args.seconds / args.pairs
+
+    def narration(name, seconds, seed):
+        path = os.path.join(tmp_dir, f'{name}.mp3')
+        encode_audio(speech_like_signal(seconds, seed=seed), 24000, path)
+        return path
+
+    narrations = [narration(f'narration_{i}', pair_seconds, i) for i in range(args.pairs)]
+    middle = args.pairs // 2
+    edits = {
+        'unchanged': (images, narrations),
+        'comment image swapped': (
+            images[:middle] + [creator.create_text_images([texts[middle][::-1]])[0][0]] + images[middle + 1:], narrations,
+        ),
+        'narration regenerated': (
+            images, narrations[:middle] + [narration('regenerated', pair_seconds, 100)] + narrations[middle + 1:],
+        ),
+        'narration made longer': (
+            images, narrations[:middle] + [narration('longer', pair_seconds * 1.5, 100)] + narrations[middle + 1:],
+        ),
+    }
+
+    def render(name, pairs, cache, previous=None):
+        short_creator = ShortCreator(preset=args.preset, background_library=library, segment_cache=cache)
+        for image, audio, text in zip(*pairs, texts):
+            short_creator.add_image_audio_pair(image, audio, caption=text)
+        short_creator.add_background_video(background_path)
+        start = time.perf_counter()
+        timeline = short_creator.build_timeline(previous)
+        short_creator.create_video(os.path.join(tmp_dir, f'{name}.mp4'), timeline)
+        return timeline, time.perf_counter() - start
+
+    np.random.seed(0)
+    timeline, uncached_time = render('uncached', edits['unchanged'], False)
+    _, cold_time = render('cold', edits['unchanged'], segment_cache, timeline)
+    results = {}
+    for name, pairs in edits.items():
+        hits = segment_cache.hits
+        _, elapsed = render(name.replace(' ', '_'), pairs, segment_cache, timeline)
+        results[name] = (elapsed, segment_cache.hits - hits)
+
+    print(f"{args.seconds:.0f} s short, {args.pairs} pairs (one segment each), x264 preset '{args.preset}'")
+    print(f"  full render, no cache:    {uncached_time:6.2f} s")
+    print(f"  full render, cold cache:  {cold_time:6.2f} s")
+    for name, (elapsed, reused) in results.items():
+        print(f"  {name + ':':25} {elapsed:6.2f} s ({reused}/{args.pairs} segments reused, {uncached_time / elapsed:4.1f}x)")
+
+if __name__ == "__main__":
+    main()
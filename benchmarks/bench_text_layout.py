@@ -0,0 +1,105 @@
+"""
+Compares the cached incremental word-wrap of RedditImageCreator with the old prefix-measuring
+one on a long synthetic comment thread, and checks that both render identical images.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_text_layout [--paragraphs 500] [--layout-only]
+"""
+import argparse
+import random
+import time
+
+from PIL import Image, ImageChops, ImageDraw
+
+from image_creator import RedditImageCreator
+
+WORDS = (
+    "I honestly think that you are not the asshole here, your sister knew about the wedding for months "
+    "and still decided to book the trip. People keep saying family comes first but that goes both ways! "
+    "Edit: thanks for the award, kind stranger. Also (for everyone asking) yes we talked about it already... "
+    "Supercalifragilisticexpialidocious-level-drama www.reddit.com/r/AmItheAsshole 100% NTA."
+).split()
+
+def legacy_layout(creator, text, side_margin=10):
+    # the prefix-measuring implementation this benchmark compares against
+    temp_draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    lines = []
+    current_line = ""
+    max_line_width = creator.image_width - 2 * side_margin
+    for word in text.split():
+        test_line = word if not current_line else f"{current_line} {word}"
+        left, top, right, bottom = temp_draw.textbbox((0, 0), test_line, font=creator.font)
+        if right - left <= max_line_width:
+            current_line = test_line
+        else:
+            lines.append(current_line)
+            current_line = word
+    if current_line:
+        lines.append(current_line)
+
+    line_heights = []
+    for line in lines:
+        left, top, right, bottom = temp_draw.textbbox((0, 0), line, font=creator.font)
+        line_heights.append(bottom - top)
+    return lines, line_heights
+
+def legacy_create_text_image(creator, text, line_spacing=2, side_margin=10, top_bottom_margin=8):
+    lines, line_heights = legacy_layout(creator, text, side_margin)
+    total_text_height = sum(line_heights) + line_spacing * (len(lines) - 1)
+
+    img = Image.new("RGB", (creator.image_width, total_text_height + top_bottom_margin), color=creator.bg_color)
+    draw = ImageDraw.Draw(img)
+    y_offset = 0
+    for line_height, line_text in zip(line_heights, lines):
+        left, top, right, bottom = draw.textbbox((0, 0), line_text, font=creator.font)
+        draw.text(((creator.image_width - (right - left)) // 2, y_offset), line_text, font=creator.font, fill=creator.font_color)
+        y_offset += line_height + line_spacing
+    return img
+
+def comment_thread(nparagraphs, seed=0):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 120))) for _ in range(nparagraphs)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the text layout engine against prefix measuring.")
+    parser.add_argument("--paragraphs", type=int, default=500)
+    parser.add_argument("--layout-only", action="store_true", help="Skip the drawing and the pixel comparison.")
+    args = parser.parse_args()
+
+    paragraphs = comment_thread(args.paragraphs)
+    creator = RedditImageCreator(cache=False)
+
+    if not args.layout_only:
+        start = time.perf_counter()
+        legacy_images = [legacy_create_text_image(creator, paragraph) for paragraph in paragraphs]
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        images = [image for image, _ in creator.create_text_images(paragraphs)]
+        new_time = time.perf_counter() - start
+
+        mismatches = sum(
+            old.size != new.size or ImageChops.difference(old, new).getbbox() is not None
+            for old, new in zip(legacy_images, images)
+        )
+        print(f"{len(paragraphs)} paragraphs, {mismatches} images differ")
+        print("full render (layout + drawing)")
+        print(f"  prefix measuring:  {legacy_time:6.3f} s")
+        print(f"  layout engine:     {new_time:6.3f} s ({legacy_time / new_time:.1f}x)")
+
+    # layout alone, on a fresh engine so the word cache starts empty
+    start = time.perf_counter()
+    for paragraph in paragraphs:
+        legacy_layout(creator, paragraph)
+    legacy_time = time.perf_counter() - start
+
+    creator = RedditImageCreator(cache=False)
+    start = time.perf_counter()
+    creator.text_layout_engine().layout_many(paragraphs)
+    new_time = time.perf_counter() - start
+    print("layout only (wrap + line metrics)")
+    print(f"  prefix measuring:  {legacy_time:6.3f} s")
+    print(f"  layout_many:       {new_time:6.3f} s ({legacy_time / new_time:.1f}x)")
+
+if __name__ == "__main__":
+    main()
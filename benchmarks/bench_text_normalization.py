@@ -0,0 +1,83 @@
+"""
+Micro-benchmark of the acronym normalization over a large synthetic comment dump.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_text_normalization [--comments 20000] [--dictionary-size 100]
+"""
+import argparse
+import random
+import string
+import time
+
+from util import TextNormalizer, DEFAULT_REPLACEMENTS
+
+WORDS = (
+    "the my she he was told that and but so I we they friend family wedding dinner money "
+    "NAHUM FRESH INFORMATION really honestly"
+).split()
+ACRONYMS = "AITAH AITA NTA YTA ESH NAH INFO TLDR WIBTA TIFU".split()
+
+def legacy_replace_acronyms(title):
+    # the sequential str.replace implementation this benchmark compares against
+    title = title.replace('AITAH', 'Am I The Asshole')
+    title = title.replace('AITA', 'Am I The Asshole')
+    title = title.replace('WIBTA', 'Would I be the asshole')
+    title = title.replace('TIFU', 'Today I Fucked Up')
+    title = title.replace('TLDR', 'Too Long Didn\'t Read')
+    title = title.replace('YTA', 'You\'re The Asshole')
+    title = title.replace('NTA', 'Not The Asshole')
+    title = title.replace('ESH', 'Everyone Sucks Here')
+    title = title.replace('NAH', 'No Assholes Here')
+    title = title.replace('INFO', 'Information')
+    return title
+
+def sequential_replace(text, replacements):
+    for key, value in replacements.items():
+        text = text.replace(key, value)
+    return text
+
+def comment_dump(ncomments, acronym_rate=0.03, seed=0):
+    rng = random.Random(seed)
+    return [
+        ' '.join(rng.choice(ACRONYMS) if rng.random() < acronym_rate else rng.choice(WORDS) for _ in range(rng.randint(20, 200))) + '.'
+        for _ in range(ncomments)
+    ]
+
+def extended_dictionary(size, seed=0):
+    # a dictionary the size of a few per-subreddit ones together
+    rng = random.Random(seed)
+    replacements = dict(DEFAULT_REPLACEMENTS)
+    while len(replacements) < size:
+        replacements[''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(2, 5)))] = 'expanded'
+    return replacements
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark acronym normalization.")
+    parser.add_argument("--comments", type=int, default=20000)
+    parser.add_argument("--dictionary-size", type=int, default=100)
+    args = parser.parse_args()
+
+    comments = comment_dump(args.comments)
+    megabytes = sum(len(comment) for comment in comments) / 2**20
+    print(f"{args.comments} comments, {megabytes:.1f} MB")
+
+    legacy_time = timed(lambda: [legacy_replace_acronyms(comment) for comment in comments])
+    normalizer_time = timed(TextNormalizer().normalize_many, comments)
+    print(f"default dictionary ({len(DEFAULT_REPLACEMENTS)} entries)")
+    print(f"  sequential str.replace: {legacy_time:6.3f} s ({megabytes / legacy_time:6.1f} MB/s)")
+    print(f"  TextNormalizer:         {normalizer_time:6.3f} s ({megabytes / normalizer_time:6.1f} MB/s)")
+
+    replacements = extended_dictionary(args.dictionary_size)
+    legacy_time = timed(lambda: [sequential_replace(comment, replacements) for comment in comments])
+    normalizer_time = timed(TextNormalizer(replacements).normalize_many, comments)
+    print(f"extended dictionary ({len(replacements)} entries)")
+    print(f"  sequential str.replace: {legacy_time:6.3f} s ({megabytes / legacy_time:6.1f} MB/s)")
+    print(f"  TextNormalizer:         {normalizer_time:6.3f} s ({megabytes / normalizer_time:6.1f} MB/s)")
+
+if __name__ == "__main__":
+    main()
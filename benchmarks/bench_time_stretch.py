@@ -0,0 +1,77 @@
+"""
+Compares the in-memory WSOLA time-stretch with the old psola file-to-file speed change.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_time_stretch [--speed 1.25] [--durations 5 15 30 60]
+
+The psola baseline (mp3 decode, stretch, mp3 encode) only runs if psola is installed
+(pip install psola==0.0.1), it is no longer a dependency of the project.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from audio_io import encode_audio, decode_audio
+from time_stretch import time_stretch, time_stretch_many
+
+SAMPLE_RATE = 24000
+
+def speech_like_signal(seconds, sample_rate=SAMPLE_RATE, seed=0):
+    """
+    Harmonic signal with a wandering pitch and syllable-like amplitude envelope.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 120 + 30 * np.sin(2 * np.pi * 0.7 * t) + 10 * np.sin(2 * np.pi * 3.1 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    signal = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    noise = 0.02 * rng.standard_normal(len(t))
+    return (0.3 * signal * envelope + noise).astype(np.float32)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark WSOLA time-stretch against psola.")
+    parser.add_argument("--speed", type=float, default=1.25)
+    parser.add_argument("--durations", type=float, nargs='+', default=[5, 15, 30, 60])
+    args = parser.parse_args()
+
+    try:
+        from psola import from_file_to_file
+    except ImportError:
+        from_file_to_file = None
+        print("psola not installed, skipping the baseline")
+
+    tmp_dir = tempfile.mkdtemp()
+    clips = [speech_like_signal(seconds, seed=i) for i, seconds in enumerate(args.durations)]
+
+    print(f"{'clip':>6} | {'psola file->file':>16} | {'decode+wsola+encode':>19} | {'wsola in-memory':>15}")
+    for seconds, clip in zip(args.durations, clips):
+        input_path = os.path.join(tmp_dir, f'clip_{seconds}.mp3')
+        encode_audio(clip, SAMPLE_RATE, input_path)
+
+        psola_time = float('nan')
+        if from_file_to_file is not None:
+            start = time.perf_counter()
+            from_file_to_file(input_path, os.path.join(tmp_dir, f'psola_{seconds}.mp3'), constant_stretch=args.speed)
+            psola_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        samples, sample_rate = decode_audio(input_path)
+        encode_audio(time_stretch(samples, args.speed, sample_rate), sample_rate, os.path.join(tmp_dir, f'wsola_{seconds}.mp3'))
+        file_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        time_stretch(clip, args.speed, SAMPLE_RATE)
+        memory_time = time.perf_counter() - start
+
+        print(f"{seconds:5.0f}s | {psola_time:15.3f}s | {file_time:18.3f}s | {memory_time:14.3f}s")
+
+    start = time.perf_counter()
+    time_stretch_many(clips, args.speed, SAMPLE_RATE)
+    print(f"batch of {len(clips)} clips in one call: {time.perf_counter() - start:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Simulates NarratorRouter against fake providers with configurable latency and failure profiles.
+
+Usage (from the repository root):
+    python -m benchmarks.simulate_narrator_router [--requests 200] [--no-hedge]
+
+The default profiles model a fast provider with a heavy latency tail, a slower but steady one,
+and one that starts failing half way through the run.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+os.environ.setdefault('TMP_FOLDER', tempfile.mkdtemp())
+from narration import Narrator, NarratorRouter
+
+class FakeNarrator(Narrator):
+    """
+    Narrator that sleeps instead of calling a provider.
+
+    :param latency: Median latency (s). Latencies follow a log-normal distribution.
+    :param tail_probability: Probability of a request taking 'tail_factor' times longer.
+    :param failure_rate: Probability of a request raising an exception.
+    """
+    def __init__(self, name, latency, tail_probability=0.0, tail_factor=10, failure_rate=0.0, seed=0):
+        self.provider = name
+        super().__init__(cache=False, max_in_flight=16, requests_per_second=1e9)
+        self.latency = latency
+        self.tail_probability = tail_probability
+        self.tail_factor = tail_factor
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def random_voiceactor(self, seed=None):
+        choice = random.Random(seed) if seed is not None else self.random
+        return f'{self.provider}-voice-{choice.randint(0, 9)}'
+
+    def cache_params(self, voice):
+        return {'voice': voice}
+
+    def _synthesize(self, text, voice, output_path):
+        with self.lock:
+            self.calls += 1
+            latency = self.latency * self.random.lognormvariate(0, 0.25)
+            if self.random.random() < self.tail_probability:
+                latency *= self.tail_factor
+            fails = self.random.random() < self.failure_rate
+        time.sleep(latency)
+        if fails:
+            raise Exception(f'{self.provider} API request failed')
+        with open(output_path, 'w') as output_file:
+            output_file.write(f'{self.provider}:{voice}:{text}')
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate NarratorRouter with fake providers.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--no-hedge", action='store_true')
+    args = parser.parse_args()
+
+    fast = FakeNarrator('fast-tail', latency=0.05, tail_probability=0.04, seed=1)
+    steady = FakeNarrator('steady', latency=0.12, seed=2)
+    flaky = FakeNarrator('flaky', latency=0.03, seed=3)
+    # tried in this order until they're measured: the flaky provider first, so that failing over shows
+    router = NarratorRouter([flaky, fast, steady], hedge=not args.no_hedge, max_error_rate=0.3)
+
+    latencies = []
+    for i in range(args.requests):
+        if i == args.requests // 2:
+            flaky.failure_rate = 0.8
+        if i % 4 == 0:
+            voice = router.random_voiceactor()  # a new comment of 4 paragraphs
+        start = time.perf_counter()
+        router.create_audio_file(f'Paragraph number {i}.', voice)
+        latencies.append(time.perf_counter() - start)
+    router.close()
+
+    print(f"end-to-end p50 {1000 * np.percentile(latencies, 50):.1f} ms, p95 {1000 * np.percentile(latencies, 95):.1f} ms, "
+          f"p99 {1000 * np.percentile(latencies, 99):.1f} ms")
+    for provider, stats in router.provider_stats().items():
+        print(provider, {key: round(value, 3) if isinstance(value, float) else value for key, value in stats.items()})
+
+if __name__ == "__main__":
+    main()
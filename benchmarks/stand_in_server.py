@@ -0,0 +1,93 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StandInTTSServer:
+    """
+    Local HTTP server that mimics the TTS endpoints of OpenAI ('/v1/audio/speech')
+    and ElevenLabs ('/v1/text-to-speech/<voice_id>[/stream]'), used to measure the
+    client side of the narration pipeline without paying for real requests.
+
+    :param audio_bytes: Body returned for every request.
+    :param synthesis_time: Seconds the server "thinks" before answering.
+    :param chunk_size: If set, the body is sent with chunked transfer encoding in chunks of this size.
+    :param chunk_delay: Seconds to wait between chunks, to simulate audio being generated on the fly.
+    """
+    def __init__(self, audio_bytes=b'\xff\xfb\x90\x00' * 4096, synthesis_time=0.0, chunk_size=None, chunk_delay=0.0):
+        self.audio_bytes = audio_bytes
+        self.synthesis_time = synthesis_time
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep connections alive between requests
+            disable_nagle_algorithm = True  # headers and body are separate writes
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self._send_body(b'{"voices": []}', 'application/json')
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with server._lock:
+                    server.requests += 1
+                if server.synthesis_time:
+                    time.sleep(server.synthesis_time)
+                self._send_body(server.audio_bytes, 'audio/mpeg')
+
+            def _send_body(self, body, content_type):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                if not server.chunk_size:
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for start in range(0, len(body), server.chunk_size):
+                    chunk = body[start:start + server.chunk_size]
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                    self.wfile.flush()
+                    if server.chunk_delay:
+                        time.sleep(server.chunk_delay)
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,323 @@
+import bisect
+import functools
+import os
+from collections import namedtuple
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+Glyph = namedtuple('Glyph', ['advance', 'offset', 'fill', 'outline'])
+CaptionWord = namedtuple('CaptionWord', ['text', 'start', 'end', 'x0', 'x1'])
+
+class GlyphAtlas:
+    """
+    Alpha masks of every glyph of a font, rasterized once and reused for every caption.
+
+    Each glyph keeps a fill mask and an outline mask (the glyph drawn with 'stroke_width'),
+    both uint8 and placed at 'offset' from the pen position. Colors are applied when the
+    caption is composited, so one atlas serves every caption color.
+    Printable ASCII is rasterized up front, other characters the first time they're used.
+    """
+    def __init__(self, font_path, font_size, stroke_width=3):
+        self.font = ImageFont.truetype(font_path, font_size) if font_path else ImageFont.load_default(font_size)
+        self.stroke_width = stroke_width
+        ascent, descent = self.font.getmetrics()
+        self.line_height = ascent + descent + 2 * stroke_width
+        self.glyphs = {}
+        for code in range(32, 127):
+            self.glyph(chr(code))
+
+    def glyph(self, char):
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            glyph = self._rasterize(char)
+            self.glyphs[char] = glyph
+        return glyph
+
+    def _rasterize(self, char):
+        advance = self.font.getlength(char)
+        left, top, right, bottom = self.font.getbbox(char, stroke_width=self.stroke_width)
+        size = (max(1, right - left), max(1, bottom - top))
+        fill_image = Image.new('L', size, 0)
+        ImageDraw.Draw(fill_image).text((-left, -top), char, font=self.font, fill=255)
+        outline_image = Image.new('L', size, 0)
+        ImageDraw.Draw(outline_image).text(
+            (-left, -top), char, font=self.font, fill=255, stroke_width=self.stroke_width, stroke_fill=255
+        )
+        return Glyph(advance, (left, top), np.asarray(fill_image), np.asarray(outline_image))
+
+    def text_width(self, text):
+        return sum(self.glyph(char).advance for char in text)
+
+    def render_line(self, text):
+        """
+        Lays out 'text' on a single line and returns its (fill, outline) float32 alpha masks in [0, 1],
+        with the pen starting at x = stroke_width. Glyphs are blitted with array slices, one per glyph.
+        """
+        width = int(np.ceil(self.text_width(text))) + 2 * self.stroke_width
+        fill = np.zeros((self.line_height, width), dtype=np.uint8)
+        outline = np.zeros((self.line_height, width), dtype=np.uint8)
+        pen = float(self.stroke_width)
+        for char in text:
+            glyph = self.glyph(char)
+            x = int(round(pen)) + glyph.offset[0]
+            y = self.stroke_width + glyph.offset[1]
+            height, glyph_width = glyph.fill.shape
+            # clip glyphs that stick out of the line box (e.g. a negative left bearing at the start)
+            x0, y0 = max(x, 0), max(y, 0)
+            x1, y1 = min(x + glyph_width, width), min(y + height, self.line_height)
+            if x1 > x0 and y1 > y0:
+                source = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+                np.maximum(fill[y0:y1, x0:x1], glyph.fill[source], out=fill[y0:y1, x0:x1])
+                np.maximum(outline[y0:y1, x0:x1], glyph.outline[source], out=outline[y0:y1, x0:x1])
+            pen += glyph.advance
+        return fill.astype(np.float32) / 255, outline.astype(np.float32) / 255
+
+@functools.lru_cache(maxsize=None)
+def get_glyph_atlas(font_path, font_size, stroke_width=3):
+    """
+    Returns the glyph atlas of a font, rasterized once per (font_path, font_size, stroke_width).
+    """
+    return GlyphAtlas(font_path, font_size, stroke_width)
+
+def word_timings(text, start, duration):
+    """
+    Spreads the narration of 'text' (starting at 'start' and lasting 'duration' seconds) over its words,
+    proportionally to their length, with a little extra time for the pauses after punctuation.
+    Returns a list of (word, start, end).
+    """
+    words = text.split()
+    if not words:
+        return []
+    weights = np.array([len(word) + 1 + (3 if word[-1] in '.!?' else 1.5 if word[-1] in ',;:' else 0) for word in words], dtype=float)
+    ends = start + duration * np.cumsum(weights) / weights.sum()
+    starts = np.concatenate([[start], ends[:-1]])
+    return list(zip(words, starts.tolist(), ends.tolist()))
+
+def _ass_color(rgb):
+    red, green, blue = rgb
+    return f"&H00{blue:02X}{green:02X}{red:02X}"
+
+def _ass_time(seconds):
+    centiseconds = int(round(seconds * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    return f"{hours}:{minutes:02d}:{centiseconds // 100:02d}.{centiseconds % 100:02d}"
+
+def _ass_text(text):
+    """
+    Escapes text for the Text field of an ASS event: braces would open override blocks and a backslash
+    could start an escape like \\N, so braces are escaped and backslashes followed by a word joiner.
+    """
+    text = text.replace('\\', '\\\u2060').replace('{', '\\{').replace('}', '\\}')
+    return ' '.join(text.splitlines())
+
+class CaptionPage:
+    """
+    One caption line shown on screen, with the word being narrated highlighted.
+    The overlays (premultiplied color and alpha) are computed once per highlighted word,
+    so drawing the page on a frame is a single blend of the line box.
+    """
+    def __init__(self, words, fill, outline, position, colors):
+        self.words = words
+        self.start = words[0].start
+        self.end = words[-1].end
+        self.fill = fill[..., None]
+        self.outline = outline[..., None]
+        self.position = position
+        self.color, self.highlight_color, self.stroke_color = (np.array(c, dtype=np.float32) for c in colors)
+        self._overlays = {}
+
+    def scaled(self, scale):
+        """
+        Returns the page laid out the same way, downscaled by 'scale' (e.g. for a preview).
+        """
+        height, width = self.fill.shape[:2]
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        fill, outline = (cv2.resize(mask[..., 0], size, interpolation=cv2.INTER_AREA) for mask in (self.fill, self.outline))
+        words = [word._replace(x0=int(word.x0 * scale), x1=int(round(word.x1 * scale))) for word in self.words]
+        position = tuple(int(round(coordinate * scale)) for coordinate in self.position)
+        return CaptionPage(words, fill, outline, position, (self.color, self.highlight_color, self.stroke_color))
+
+    def word_index(self, t):
+        starts = [word.start for word in self.words]
+        return max(0, bisect.bisect_right(starts, t) - 1)
+
+    def _overlay(self, word_index):
+        overlay = self._overlays.get(word_index)
+        if overlay is None:
+            word = self.words[word_index]
+            color = np.broadcast_to(self.color, self.fill.shape[:2] + (3,)).copy()
+            color[:, word.x0:word.x1] = self.highlight_color
+            # text over its outline
+            alpha = self.fill + self.outline * (1 - self.fill)
+            premultiplied = color * self.fill + self.stroke_color * self.outline * (1 - self.fill)
+            overlay = (premultiplied, alpha)
+            self._overlays[word_index] = overlay
+        return overlay
+
+    def draw(self, frame, t):
+        """
+        Blends the page (as it looks at time 't') onto 'frame' in place.
+        """
+        premultiplied, alpha = self._overlay(self.word_index(t))
+        x, y = self.position
+        height, width = alpha.shape[:2]
+        # the part of the line box inside the frame
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, frame.shape[1]), min(y + height, frame.shape[0])
+        if x1 <= x0 or y1 <= y0:
+            return frame
+        source = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+        region = frame[y0:y1, x0:x1, :3]
+        region[:] = region * (1 - alpha[source]) + premultiplied[source]
+        return frame
+
+class CaptionTrack:
+    """
+    Timeline of caption pages, drawn on the frames of a clip with 'apply' (for VideoClip.fl).
+    """
+    def __init__(self, pages):
+        self.pages = sorted(pages, key=lambda page: page.start)
+        self._starts = [page.start for page in self.pages]
+
+    def __len__(self):
+        return len(self.pages)
+
+    def scaled(self, scale):
+        return CaptionTrack([page.scaled(scale) for page in self.pages])
+
+    def page_at(self, t):
+        index = bisect.bisect_right(self._starts, t) - 1
+        if index >= 0 and t < self.pages[index].end:
+            return self.pages[index]
+        return None
+
+    def draw(self, frame, t):
+        """
+        Draws the captions shown at time 't' on a writable 'frame', in place.
+        """
+        page = self.page_at(t)
+        if page is not None:
+            page.draw(frame, t)
+        return frame
+
+    def apply(self, get_frame, t):
+        frame = get_frame(t)
+        if self.page_at(t) is None:
+            return frame
+        if not frame.flags.writeable:
+            frame = frame.copy()
+        return self.draw(frame, t)
+
+class CaptionRenderer:
+    """
+    Turns narrated texts into a CaptionTrack of word-by-word highlighted captions.
+
+    Lines hold up to 'max_words' words and fit in 'max_width' pixels, and are centered
+    horizontally with their top at 'y_position' (fraction of the video height).
+    """
+    def __init__(
+        self,
+        font_path="static/fonts/Roboto-Bold.ttf",
+        font_size=44,
+        color=(255, 255, 255),
+        highlight_color=(255, 214, 0),
+        stroke_color=(0, 0, 0),
+        stroke_width=3,
+        max_words=4,
+        max_width=520,
+        y_position=0.72,
+    ):
+        self.atlas = get_glyph_atlas(font_path, font_size, stroke_width)
+        self.colors = (color, highlight_color, stroke_color)
+        self.max_words = max_words
+        self.max_width = max_width
+        self.y_position = y_position
+
+    def _lines(self, timed_words):
+        line = []
+        for timed_word in timed_words:
+            candidate = ' '.join(word for word, _, _ in line + [timed_word])
+            if line and (len(line) >= self.max_words or self.atlas.text_width(candidate) > self.max_width):
+                yield line
+                line = []
+            line.append(timed_word)
+        if line:
+            yield line
+
+    def _scaled_atlas(self, scale):
+        font = self.atlas.font
+        font_path = font.path if isinstance(getattr(font, 'path', None), str) else None
+        return get_glyph_atlas(font_path, max(1, int(round(font.size * scale))), max(1, int(round(self.atlas.stroke_width * scale))))
+
+    def _page(self, line, video_size, atlas):
+        text = ' '.join(word for word, _, _ in line)
+        fill, outline = atlas.render_line(text)
+        words = []
+        pen = float(atlas.stroke_width)
+        for word, start, end in line:
+            x0 = int(round(pen))
+            pen += atlas.text_width(word)
+            words.append(CaptionWord(word, start, end, max(0, x0 - atlas.stroke_width), int(round(pen)) + atlas.stroke_width))
+            pen += atlas.text_width(' ')
+        video_width, video_height = video_size
+        position = ((video_width - fill.shape[1]) // 2, int(self.y_position * video_height))
+        return CaptionPage(words, fill, outline, position, self.colors)
+
+    def write_ass(self, track, output_path, video_size):
+        """
+        Writes 'track' as an ASS subtitles file (for ffmpeg's ass filter): one event per narrated word,
+        showing its line in the same place and colors, with that word highlighted.
+        Glyphs are rasterized by libass, so they can differ slightly from the atlas.
+        Returns the directory of the font, to pass as the filter's 'fontsdir'.
+        """
+        video_width, video_height = video_size
+        family, style = self.atlas.font.getname()
+        ascent, descent = self.atlas.font.getmetrics()
+        color, highlight_color, stroke_color = (_ass_color(c) for c in self.colors)
+        lines = [
+            "[Script Info]",
+            "ScriptType: v4.00+",
+            f"PlayResX: {video_width}",
+            f"PlayResY: {video_height}",
+            "ScaledBorderAndShadow: yes",
+            "",
+            "[V4+ Styles]",
+            "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, "
+            "Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding",
+            # libass sizes fonts by their line height, PIL by their em size
+            f"Style: Caption,{family},{ascent + descent},{color},{color},{stroke_color},&H00000000,{-1 if 'Bold' in style else 0},0,"
+            f"0,0,100,100,0,0,1,{self.atlas.stroke_width},0,8,0,0,0,1",
+            "",
+            "[Events]",
+            "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+        ]
+        for page in track.pages:
+            x, y = page.position
+            anchor = (x + page.fill.shape[1] // 2, y)
+            for index, word in enumerate(page.words):
+                text = ' '.join(
+                    f"{{\\1c{highlight_color}}}{_ass_text(other.text)}{{\\1c{color}}}" if other_index == index else _ass_text(other.text)
+                    for other_index, other in enumerate(page.words)
+                )
+                lines.append(
+                    f"Dialogue: 0,{_ass_time(word.start)},{_ass_time(word.end)},Caption,,0,0,0,,{{\\pos({anchor[0]},{anchor[1]})}}{text}"
+                )
+        with open(output_path, 'w', encoding='utf-8') as ass_file:
+            ass_file.write('\n'.join(lines) + '\n')
+        return os.path.dirname(os.path.abspath(self.atlas.font.path)) if getattr(self.atlas.font, 'path', None) else None
+
+    def build_track(self, segments, video_size, scale=1.0):
+        """
+        :param segments: (text, start, duration) of every narrated clip, in seconds.
+        :param video_size: (width, height) of the video the captions are drawn on.
+        :param scale: Draws the captions 'scale' times larger (e.g. for a video larger than the one the style
+                      was designed for), with the font rasterized at that size and the same line breaks.
+        """
+        atlas = self.atlas if scale == 1 else self._scaled_atlas(scale)
+        pages = []
+        for text, start, duration in segments:
+            for line in self._lines(word_timings(text, start, duration)):
+                pages.append(self._page(line, video_size, atlas))
+        return CaptionTrack(pages)
@@ -0,0 +1,314 @@
+import functools
+import os
+import subprocess
+import tempfile
+from collections import namedtuple
+import cv2
+import numpy as np
+from PIL import Image, ImageSequence
+from audio_io import get_ffmpeg_binary
+from util import ReaderPool
+
+class StaticOverlay:
+    """
+    Still image resized once to its on-screen size. RGB images are copied over the frame,
+    images with transparency are blended with their premultiplied color and inverse alpha,
+    computed once, into preallocated buffers.
+
+    :param image: RGB or RGBA uint8 array.
+    """
+    def __init__(self, image, size):
+        width, height = size
+        image = _resize(np.asarray(image), width, height)
+        self.size = size
+        self.duration = None
+        self.rgb = np.ascontiguousarray(image[..., :3])
+        self.premultiplied = None
+        if image.shape[2] == 4:
+            alpha = image[..., 3:].astype(np.float32) / 255
+            self.premultiplied = self.rgb * alpha
+            self.inverse_alpha = 1 - alpha
+            self._buffer = np.empty((height, width, 3), dtype=np.float32)
+
+    def blend(self, region, t, window):
+        if self.premultiplied is None:
+            region[:] = self.rgb[window]
+            return
+        buffer = self._buffer[:region.shape[0], :region.shape[1]]
+        np.multiply(region, self.inverse_alpha[window], out=buffer)
+        np.add(buffer, self.premultiplied[window], out=buffer)
+        region[:] = buffer
+
+class AnimatedOverlay:
+    """
+    Animation (e.g. AnimatedFrames) whose frames are resized the first time they're shown.
+    Like a GIF in MoviePy, it's played once and disappears when it ends.
+
+    :param animation: Object with a 'duration', a 'frame_index(t)' and a 'get_frame(t)' returning RGB uint8 arrays.
+    """
+    def __init__(self, animation, size):
+        self.animation = animation
+        self.size = size
+        self.duration = animation.duration
+        self._frames = {}
+
+    def blend(self, region, t, window):
+        index = self.animation.frame_index(t)
+        resized = self._frames.get(index)
+        if resized is None:
+            resized = _resize(self.animation.get_frame(t), *self.size)
+            self._frames[index] = resized
+        region[:] = resized[window]
+
+def _resize(image, width, height):
+    if image.shape[1] == width and image.shape[0] == height:
+        return image
+    # area interpolation when shrinking, like MoviePy's resize with OpenCV
+    interpolation = cv2.INTER_AREA if width < image.shape[1] else cv2.INTER_LINEAR
+    return cv2.resize(image, (width, height), interpolation=interpolation)
+
+class GifAnimation:
+    """
+    GIF file decoded into memory, for AnimatedOverlay.
+    """
+    def __init__(self, path):
+        frames, ends = [], []
+        with Image.open(path) as gif:
+            elapsed = 0.0
+            for frame in ImageSequence.Iterator(gif):
+                frames.append(np.asarray(frame.convert("RGB")))
+                elapsed += frame.info.get('duration', 100) / 1000
+                ends.append(elapsed)
+        self.frames = frames
+        self._frame_ends = np.array(ends)
+        self.duration = elapsed
+
+    def frame_index(self, t):
+        return min(int(np.searchsorted(self._frame_ends, t, side='right')), len(self.frames) - 1)
+
+    def get_frame(self, t):
+        return self.frames[self.frame_index(t)]
+
+class BackgroundReader:
+    """
+    Reads the background video with ffmpeg, which seeks, crops and scales it to the output size in C,
+    and hands over consecutive raw RGB frames read into two reused buffers.
+    When the video runs out the last frame is repeated.
+
+    :param crop: (x1, y1, x2, y2) region of the source video to keep.
+    :param resample: False if the video already has the output size and frame rate
+                     (e.g. a BackgroundLibrary transcode), so frames are only converted to RGB.
+    :param source_fps: Frame rate of the video, if it's higher than 'fps' (e.g. for a preview).
+    :param keyframe: True if 'start' is the time of a keyframe of the video (e.g. picked by BackgroundIndex.pick_window).
+    """
+    def __init__(self, path, size, fps, start=0.0, crop=None, resample=True, source_fps=None, keyframe=False):
+        width, height = size
+        filters = []
+        if resample:
+            filters.append(f"fps={fps}")
+            if crop:
+                x1, y1, x2, y2 = crop
+                filters.append(f"crop={x2 - x1}:{y2 - y1}:{x1}:{y1}")
+            filters.append(f"scale={width}:{height}")
+        # ffmpeg starts at the first frame at or after the seek time, half a frame earlier starts at the nearest one,
+        # but a keyframe is seeked to exactly: earlier, ffmpeg would decode from the previous keyframe
+        seek = start if keyframe else max(0.0, start - 0.5 / (source_fps or fps))
+        cmd = [get_ffmpeg_binary(), '-loglevel', 'error', '-ss', f"{seek:.6f}", '-i', path, '-an']
+        if filters:
+            cmd += ['-vf', ','.join(filters)]
+        cmd += ['-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1']
+        self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=0)
+        # the frame being read never overwrites the last complete one
+        self._buffers = [bytearray(width * height * 3) for _ in range(2)]
+        self._frames = [np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 3) for buffer in self._buffers]
+        self._current = 1
+        self._frames[self._current][:] = 0  # black if the video has no frame at all
+        self._exhausted = False
+
+    def read(self):
+        """
+        Returns the next frame, a view of one of the reader's buffers that is only valid until the next read.
+        """
+        if not self._exhausted:
+            incoming = 1 - self._current
+            view = memoryview(self._buffers[incoming])
+            position = 0
+            while position < len(view):
+                count = self.process.stdout.readinto(view[position:])
+                if not count:
+                    break
+                position += count
+            if position == len(view):
+                self._current = incoming
+            else:
+                self._exhausted = True
+        return self._frames[self._current]
+
+    def close(self):
+        # killed before its pipe is closed, so ffmpeg doesn't report the broken pipe
+        self.process.kill()
+        self.process.wait()
+        self.process.stdout.close()
+
+class Rendition(namedtuple(
+    'Rendition', ['path', 'size', 'codec', 'preset', 'crf', 'video_bitrate', 'audio_codec', 'audio_bitrate'],
+    defaults=(None, "libx264", "medium", None, None, "aac", "192k"),
+)):
+    """
+    One encoded output of a render: the frames scaled to 'size' (None keeps the size they're composed at)
+    and encoded with 'codec' at constant quality 'crf' or at 'video_bitrate' (e.g. "8M"), or with the codec's
+    defaults if neither is given. 'preset' is passed to the encoder if set.
+    """
+    __slots__ = ()
+
+class Compositor:
+    """
+    Renders a short made of one background video and at most one centered overlay at a time,
+    piping raw frames straight into an ffmpeg encoder.
+
+    Each frame is: the next background frame (already cropped and scaled by ffmpeg),
+    the active overlay copied or blended over its bounding box only, then 'frame_filter'
+    (e.g. the captions) which may modify the frame in place.
+    """
+    def __init__(self, size=(576, 1024), fps=30, codec="libx264", preset="medium", audio_codec="aac", audio_bitrate="192k", threads=None):
+        """
+        :param threads: Number of encoder threads, None lets ffmpeg use every core.
+        """
+        self.size = size
+        self.fps = fps
+        self.codec = codec
+        self.preset = preset
+        self.threads = threads
+        self.audio_codec = audio_codec
+        self.audio_bitrate = audio_bitrate
+
+    def _renditions(self, output):
+        if isinstance(output, str):
+            return [Rendition(output, None, self.codec, self.preset, None, None, self.audio_codec, self.audio_bitrate)]
+        return list(output)
+
+    def _encoder(self, output, duration, audio_path):
+        """
+        Starts a single ffmpeg process reading the raw frames once and encoding every rendition of 'output'.
+        """
+        width, height = self.size
+        cmd = [
+            get_ffmpeg_binary(), '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f"{width}x{height}", '-r', str(self.fps), '-i', 'pipe:0',
+        ]
+        if audio_path:
+            cmd += ['-i', audio_path]
+        for rendition in self._renditions(output):
+            cmd += ['-map', '0:v']
+            if audio_path:
+                cmd += ['-map', '1:a', '-c:a', rendition.audio_codec, '-b:a', rendition.audio_bitrate]
+            if rendition.size and tuple(rendition.size) != tuple(self.size):
+                rendition_width, rendition_height = rendition.size
+                cmd += ['-vf', f"scale={rendition_width}:{rendition_height}:flags=lanczos"]
+            cmd += ['-c:v', rendition.codec]
+            if rendition.preset:
+                cmd += ['-preset', rendition.preset]
+            if rendition.crf is not None:
+                cmd += ['-crf', str(rendition.crf)]
+            if rendition.video_bitrate:
+                cmd += ['-b:v', str(rendition.video_bitrate)]
+            cmd += ['-pix_fmt', 'yuv420p', '-t', f"{duration:.3f}"]
+            if self.threads:
+                cmd += ['-threads', str(self.threads)]
+            cmd.append(rendition.path)
+        return subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def _overlay_region(self, frame, overlay_size):
+        """
+        Returns the region of 'frame' covered by a centered overlay of 'overlay_size',
+        and the window of the overlay that is visible in it (overlays larger than the frame are cropped).
+        """
+        width, height = self.size
+        overlay_width, overlay_height = overlay_size
+        x, y = (width - overlay_width) // 2, (height - overlay_height) // 2
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + overlay_width, width), min(y + overlay_height, height)
+        return frame[y0:y1, x0:x1], (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+
+    def compose(self, frame, t, overlay=None, start=0.0, frame_filter=None):
+        """
+        Draws over a background 'frame', in place, what is shown at time 't': 'overlay' (shown
+        since 'start', until its duration if it has one) and then 'frame_filter'.
+        """
+        if overlay is not None and (overlay.duration is None or t - start < overlay.duration):
+            region, window = self._overlay_region(frame, overlay.size)
+            overlay.blend(region, t - start, window)
+        if frame_filter:
+            frame_filter(frame, t)
+        return frame
+
+    def render(self, output_path, duration, background, overlays, audio_path=None, frame_filter=None, start=0.0, open_overlay=None, pool=None):
+        """
+        :param output_path: File to encode the frames to, or list of Rendition all encoded in the same pass,
+                            from frames composed once.
+        :param background: BackgroundReader positioned at 'start'.
+        :param overlays: (overlay, start, end) tuples, not overlapping, each overlay being a
+                         StaticOverlay or an AnimatedOverlay.
+        :param open_overlay: If given, the overlays are media turned into overlays by open_overlay(media)
+                             just before they're first shown, and released once they end.
+                             Media for which it returns None are skipped.
+        :param pool: ReaderPool holding the opened overlays, by default one keeping a single overlay open.
+        :param audio_path: Audio track muxed into the output, if any.
+        :param frame_filter: Called as frame_filter(frame, t) on every frame after the overlays.
+        :param start: Time (in seconds) of the first frame, to render a segment of a longer timeline.
+                      Overlay and filter times stay those of the whole timeline.
+        Returns the number of frames written.
+        """
+        width, height = self.size
+        overlays = sorted(overlays, key=lambda item: item[1])
+        nframes = int(round(duration * self.fps))
+        first_frame = int(round(start * self.fps))
+        if pool is None:
+            pool = ReaderPool(max_open=1)
+        encoder = self._encoder(output_path, duration, audio_path)
+        # frames are composed here, the background reader's buffers stay untouched
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        index = 0
+        try:
+            for frame_number in range(first_frame, first_frame + nframes):
+                t = frame_number / self.fps
+                np.copyto(frame, background.read())
+                while index < len(overlays) and t >= overlays[index][2]:
+                    pool.release(index)
+                    index += 1
+                overlay = overlay_start = None
+                if index < len(overlays) and t >= overlays[index][1]:
+                    overlay, overlay_start, _ = overlays[index]
+                    if open_overlay:
+                        overlay = pool.get(index, functools.partial(open_overlay, overlay))
+                self.compose(frame, t, overlay, overlay_start, frame_filter)
+                encoder.stdin.write(frame.data)
+        finally:
+            pool.close()
+            encoder.stdin.close()
+            encoder.wait()
+        if encoder.returncode:
+            outputs = ', '.join(rendition.path for rendition in self._renditions(output_path))
+            raise Exception(f"ffmpeg exited with code {encoder.returncode} while encoding {outputs}")
+        return nframes
+
+    def concat(self, segment_paths, output_path, duration, audio_path=None):
+        """
+        Joins segments rendered with the same settings (each one starts on a keyframe) with
+        ffmpeg's concat demuxer, copying the video stream, and muxes the audio track once.
+        """
+        fd, list_path = tempfile.mkstemp(suffix='.txt', dir=os.path.dirname(os.path.abspath(output_path)))
+        try:
+            with os.fdopen(fd, 'w') as list_file:
+                for segment_path in segment_paths:
+                    escaped_path = os.path.abspath(segment_path).replace("'", "'\\''")
+                    list_file.write(f"file '{escaped_path}'\n")
+            cmd = [get_ffmpeg_binary(), '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path]
+            if audio_path:
+                cmd += ['-i', audio_path, '-map', '0:v', '-map', '1:a', '-c:a', self.audio_codec, '-b:a', self.audio_bitrate]
+            cmd += ['-c:v', 'copy', '-t', f"{duration:.3f}", output_path]
+            result = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
+        finally:
+            os.remove(list_path)
+        if result.returncode:
+            raise Exception(f"ffmpeg could not join the segments of {output_path}: {result.stderr[-500:]}")
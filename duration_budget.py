@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+
+_CALIBRATION_FILE = 'narration_calibration.json'
+
+class DurationEstimator:
+    """
+    Estimates how long a text takes to narrate, from a characters-per-second rate per voice profile
+    (provider, voice and speed). The rates are calibrated with the durations of past narrations and
+    persisted in a JSON file, so the estimates get better with every short.
+    """
+    DEFAULT_CHARS_PER_SECOND = 15.0  # ~150 words per minute at speed 1.0
+    SECONDS_PER_SEGMENT = 0.3  # leading/trailing silence of every narration
+
+    def __init__(self, calibration_file=_CALIBRATION_FILE, smoothing=0.2):
+        self.calibration_file = calibration_file
+        self.smoothing = smoothing
+        self.rates = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.calibration_file):
+            with open(self.calibration_file, 'r') as f:
+                self.rates = json.load(f)
+
+    def save(self):
+        with self.lock:
+            with open(self.calibration_file, 'w') as f:
+                json.dump(self.rates, f, indent=2)
+
+    @staticmethod
+    def profile(narrator, voice=None):
+        """
+        Returns the profile key of a narrator (and optionally one of its voices). For a NarratorRouter,
+        the key of the provider narrator (and voice) that served the requests made with 'voice'.
+        """
+        narrator, voice = narrator.serving_narrator(voice)
+        speed = getattr(narrator, 'speed', 1.0)
+        return f'{narrator.provider}|{voice if voice is not None else "*"}|{speed}'
+
+    def chars_per_second(self, profile):
+        """
+        Calibrated rate of the profile, falling back to the provider-wide rate for the same speed,
+        and then to the default rate scaled by the speed.
+        """
+        provider, _, speed = profile.split('|')
+        with self.lock:
+            if profile in self.rates:
+                return self.rates[profile]
+            provider_profile = f'{provider}|*|{speed}'
+            if provider_profile in self.rates:
+                return self.rates[provider_profile]
+        try:
+            return self.DEFAULT_CHARS_PER_SECOND * float(speed)
+        except ValueError:
+            return self.DEFAULT_CHARS_PER_SECOND
+
+    def estimate(self, text, profile):
+        """
+        Estimated narration duration (in seconds) of 'text'.
+        """
+        return len(text) / self.chars_per_second(profile) + self.SECONDS_PER_SEGMENT
+
+    def observe(self, text, duration, profile):
+        """
+        Updates the rate of the profile (and of its provider) with the real duration of a narration.
+        """
+        speech_duration = duration - self.SECONDS_PER_SEGMENT
+        if not text or speech_duration <= 0:
+            return
+        observed_rate = len(text) / speech_duration
+        provider, _, speed = profile.split('|')
+        with self.lock:
+            for key in {profile, f'{provider}|*|{speed}'}:
+                if key in self.rates:
+                    self.rates[key] += self.smoothing * (observed_rate - self.rates[key])
+                else:
+                    self.rates[key] = observed_rate
+
+def plan_timeline(title, post_paragraphs, comments_paragraphs, target_duration, estimate):
+    """
+    Decides which paragraphs make it into a short of at most 'target_duration' seconds,
+    before anything is narrated or rendered.
+
+    The title is always kept. Post paragraphs are kept in order until the budget runs out, then every
+    comment is trimmed to the longest run of its first paragraphs that still fits (comments that
+    don't fit at all are dropped, later and shorter ones may still fit).
+
+    :param estimate: Function returning the estimated duration of a paragraph.
+    :return: (post_paragraphs, comments_paragraphs, estimated_duration). Dropped comments are
+             returned as empty lists, so the result stays aligned with the input comments.
+    """
+    remaining = target_duration - estimate(title)
+
+    kept_post_paragraphs = []
+    for paragraph in post_paragraphs:
+        duration = estimate(paragraph)
+        if duration > remaining:
+            break
+        kept_post_paragraphs.append(paragraph)
+        remaining -= duration
+
+    kept_comments_paragraphs = []
+    for paragraphs in comments_paragraphs:
+        kept_paragraphs = []
+        for paragraph in paragraphs:
+            duration = estimate(paragraph)
+            if duration > remaining:
+                break
+            kept_paragraphs.append(paragraph)
+            remaining -= duration
+        kept_comments_paragraphs.append(kept_paragraphs)
+
+    return kept_post_paragraphs, kept_comments_paragraphs, target_duration - remaining
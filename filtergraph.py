@@ -0,0 +1,118 @@
+import math
+import subprocess
+from collections import namedtuple
+from audio_io import get_ffmpeg_binary
+
+class OverlayInput(namedtuple('OverlayInput', ['path', 'start', 'end', 'size', 'animated'])):
+    """
+    Image file (or animation, played once) shown centered at 'size' from 'start' to 'end' seconds.
+    """
+    __slots__ = ()
+
+def _escape(value, special_chars):
+    return ''.join('\\' + char if char in special_chars else char for char in value)
+
+def escape_filter_value(value):
+    """
+    Escapes a value (e.g. a file path) used as a filter option inside a filtergraph:
+    once for the option parser, then once more for the filtergraph parser.
+    """
+    return _escape(_escape(str(value), "\\':"), "\\'[],;")
+
+class FiltergraphRenderer:
+    """
+    Renders a short with a single ffmpeg command: the background window, the centered overlays
+    (each one enabled between its start and end) and the subtitles are all described in a filter_complex,
+    so ffmpeg composes and encodes every frame natively. The audio track is muxed as it is.
+
+    Inputs are files: in-memory images and the mixed audio have to be written out first (see ShortCreator).
+    """
+    def __init__(self, size=(576, 1024), fps=30, codec="libx264", preset="medium", audio_codec="aac", audio_bitrate="192k", threads=None):
+        self.size = size
+        self.fps = fps
+        self.codec = codec
+        self.preset = preset
+        self.audio_codec = audio_codec
+        self.audio_bitrate = audio_bitrate
+        self.threads = threads
+
+    def command(self, output_path, duration, background, overlays, audio_path=None, subtitles=None):
+        """
+        Returns the ffmpeg command rendering the short.
+
+        :param background: (path, start, crop, resample, keyframe) of the background video, like BackgroundReader.
+        :param overlays: OverlayInput of every image-audio pair.
+        :param audio_path: Finished audio track of the short (e.g. mixed by AudioMixer), if any.
+        :param subtitles: (ass_path, fonts_dir) burnt over the video, if any.
+        """
+        width, height = self.size
+        inputs, filters = [], []
+
+        def add_input(*args):
+            inputs.extend(args)
+            return inputs.count('-i') - 1
+
+        # background window, repeating its last frame if it's too short
+        path, start, crop, resample, keyframe = background
+        seek = start if keyframe else max(0.0, start - 0.5 / self.fps)  # nearest frame, like BackgroundReader
+        index = add_input('-ss', f"{seek:.6f}", '-t', f"{duration + 1:.6f}", '-i', path)
+        chain = ["setpts=PTS-STARTPTS", f"fps={self.fps}"]
+        if resample and crop:
+            x1, y1, x2, y2 = crop
+            chain.append(f"crop={x2 - x1}:{y2 - y1}:{x1}:{y1}")
+        if resample:
+            chain.append(f"scale={width}:{height}")
+        # square pixels, like the frames of the other backends
+        chain += ["setsar=1", f"tpad=stop_mode=clone:stop_duration={duration:.6f}", "format=yuv444p"]
+        filters.append(f"[{index}:v]{','.join(chain)}[bg]")
+
+        video = "bg"
+        for number, overlay in enumerate(overlays):
+            overlay_duration = overlay.end - overlay.start
+            if overlay.animated:
+                index = add_input('-i', overlay.path)
+            else:
+                index = add_input('-loop', '1', '-framerate', str(self.fps), '-t', f"{overlay_duration:.6f}", '-i', overlay.path)
+            overlay_width, overlay_height = overlay.size
+            # shown on the frames whose time is in [start, end), counted in frames to avoid rounding timestamps
+            first_frame, end_frame = (math.ceil(t * self.fps - 1e-6) for t in (overlay.start, overlay.end))
+            filters.append(
+                f"[{index}:v]fps={self.fps},trim=duration={overlay_duration:.6f},scale={overlay_width}:{overlay_height}:flags=area,"
+                f"setpts=PTS-STARTPTS+{first_frame}/{self.fps}/TB[o{number}]"
+            )
+            filters.append(
+                f"[{video}][o{number}]overlay=x=floor((W-w)/2):y=floor((H-h)/2):format=yuv444:eof_action=pass:"
+                f"enable='between(n,{first_frame},{end_frame - 1})'[v{number}]"
+            )
+            video = f"v{number}"
+
+        if subtitles:
+            ass_path, fonts_dir = subtitles
+            options = f"filename={escape_filter_value(ass_path)}"
+            if fonts_dir:
+                options += f":fontsdir={escape_filter_value(fonts_dir)}"
+            filters.append(f"[{video}]ass={options}[vsub]")
+            video = "vsub"
+        filters.append(f"[{video}]format=yuv420p[vout]")
+
+        if audio_path:
+            audio_index = add_input('-i', audio_path)
+
+        cmd = [get_ffmpeg_binary(), '-y', '-loglevel', 'error'] + inputs
+        cmd += ['-filter_complex', ';'.join(filters), '-map', '[vout]']
+        if audio_path:
+            cmd += ['-map', f"{audio_index}:a", '-c:a', self.audio_codec, '-b:a', self.audio_bitrate]
+        cmd += ['-c:v', self.codec, '-preset', self.preset, '-r', str(self.fps), '-t', f"{duration:.6f}"]
+        if self.threads:
+            cmd += ['-threads', str(self.threads)]
+        cmd.append(output_path)
+        return cmd
+
+    def render(self, output_path, duration, background, overlays, audio_path=None, subtitles=None):
+        """
+        Runs the command built by 'command' (same parameters).
+        """
+        cmd = self.command(output_path, duration, background, overlays, audio_path, subtitles)
+        result = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
+        if result.returncode:
+            raise Exception(f"ffmpeg exited with code {result.returncode} while rendering {output_path}: {result.stderr[-500:]}")
@@ -1,19 +1,301 @@
-from PIL import Image, ImageDraw, ImageFont, ImageSequence, ImageColor
+from PIL import Image, ImageDraw, ImageFont, ImageSequence, ImageColor, GifImagePlugin
+import functools
+import io
+import itertools
+import numpy as np
 import os
+import struct
+import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from praw.models import Comment
-from util import split_paragraphs_from_text, replace_acronyms
+from util import split_paragraphs_from_text, replace_acronyms, FileCache
+from text_layout import TextLayoutEngine
 
 TMP_FOLDER = os.environ.get('TMP_FOLDER')
+RENDER_CACHE_FOLDER = os.environ.get('RENDER_CACHE_FOLDER') or 'render_cache'
+RENDER_CACHE_MAX_MB = float(os.environ.get('RENDER_CACHE_MAX_MB') or 200)
+# bump when the drawing code changes, so that images rendered by older versions aren't reused
+RENDER_VERSION = 1
+
+class RenderCache(FileCache):
+    """
+    Two-level cache of rendered text cards: an in-process LRU of PIL images bounded by 'memory_max_bytes'
+    (of decoded pixels), in front of an on-disk FileCache of lossless PNGs bounded by 'disk_max_bytes',
+    stored as '<sha256 of the render parameters>.png'.
+    Images are copied in and out, so callers can modify what they get.
+    """
+    version = RENDER_VERSION
+
+    def __init__(self, cache_dir=RENDER_CACHE_FOLDER, disk_max_bytes=int(RENDER_CACHE_MAX_MB * 1024 * 1024), memory_max_bytes=64 * 1024 * 1024):
+        super().__init__(cache_dir, disk_max_bytes, '.png')
+        self.memory_max_bytes = memory_max_bytes
+        self.memory_hits = 0
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+
+    @staticmethod
+    def _image_bytes(image):
+        return image.width * image.height * len(image.getbands())
+
+    def _remember(self, key, image):
+        # caller holds the lock
+        if key in self._memory:
+            self._memory_bytes -= self._image_bytes(self._memory.pop(key))
+        self._memory[key] = image
+        self._memory_bytes += self._image_bytes(image)
+        while self._memory_bytes > self.memory_max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= self._image_bytes(evicted)
+
+    @staticmethod
+    def _load(cached_path):
+        with Image.open(cached_path) as cached_image:
+            return cached_image.copy()  # decodes the file
+
+    def get(self, key):
+        """
+        Returns a copy of the cached image for 'key', or None on a miss.
+        """
+        with self.lock:
+            image = self._memory.get(key)
+            if image is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return image.copy()
+
+        image = self.read(key, self._load)
+        if image is None:
+            return None
+        with self.lock:
+            self._remember(key, image)
+        return image.copy()
+
+    def put(self, key, image):
+        """
+        Stores a copy of 'image' in memory and (atomically) on disk, then evicts old entries if needed.
+        """
+        image = image.copy()
+        with self.lock:
+            self._remember(key, image)
+        self.write(key, lambda tmp_file: image.save(tmp_file, format='PNG'))
+
+    def stats(self):
+        """
+        Returns the hit/miss counters of this cache.
+        """
+        hits = self.memory_hits + self.hits
+        lookups = hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'memory_mb': self._memory_bytes / (1024 * 1024),
+        }
+
+@functools.lru_cache(maxsize=None)
+def get_default_render_cache():
+    """
+    Returns the render cache shared by every RedditImageCreator of the process,
+    so that a retried or re-rendered thread also hits the in-memory level.
+    """
+    return RenderCache()
+
+class AnimatedFrames:
+    """
+    In-memory animation made of changing frames stacked on top of a static part,
+    e.g. the animated post header above the post text and footer.
+    Full frames are only composed when requested, the changing frames are shared.
+
+    :param frames: RGB arrays (height, width, 3) of the animated top part, all of the same size.
+    :param frame_durations: How long each frame is shown (seconds).
+    :param static_part: RGB array stacked below every frame, of the same width.
+    """
+    def __init__(self, frames, frame_durations, static_part):
+        self.frames = frames
+        self.frame_durations = frame_durations
+        self.static_part = static_part
+        self._frame_ends = np.cumsum(frame_durations)
+
+    @property
+    def duration(self):
+        return float(self._frame_ends[-1])
+
+    @property
+    def size(self):
+        height, width = self.frames[0].shape[:2]
+        return width, height + self.static_part.shape[0]
+
+    def __len__(self):
+        return len(self.frames)
+
+    def frame_index(self, t):
+        """
+        Returns the index of the frame shown at time 't' (seconds).
+        """
+        return min(int(np.searchsorted(self._frame_ends, t, side='right')), len(self.frames) - 1)
+
+    def get_frame(self, t):
+        """
+        Returns the full frame shown at time 't' (seconds).
+        """
+        return np.vstack([self.frames[self.frame_index(t)], self.static_part])
+
+    def __iter__(self):
+        for frame in self.frames:
+            yield np.vstack([frame, self.static_part])
+
+    def _changed_parts(self):
+        """
+        Yields the first full frame, then only the animated top part of the next ones:
+        the static part never changes, so the writers below draw it once instead of holding every full frame.
+        """
+        yield np.vstack([self.frames[0], self.static_part])
+        yield from self.frames[1:]
+
+    def save_gif(self, output_path, loop=0):
+        with open(output_path, 'wb') as fp:
+            for index, (part, duration) in enumerate(zip(self._changed_parts(), self.frame_durations)):
+                image = Image.fromarray(part).convert('P', palette=Image.Palette.ADAPTIVE)
+                if index == 0:
+                    header, _ = GifImagePlugin.getheader(image, info={'loop': loop})
+                    fp.write(b''.join(header))
+                for data in GifImagePlugin.getdata(image, duration=int(round(duration * 1000)), include_color_table=True):
+                    fp.write(data)
+            fp.write(b';')
+        return output_path
+
+    def save_apng(self, output_path):
+        """
+        Saves the animation as a lossless animated PNG, played once.
+        Frames are encoded and written one at a time, the frames after the first one as updates of the top part.
+        """
+        width, height = self.size
+        sequence = itertools.count()
+        with open(output_path, 'wb') as fp:
+            fp.write(_PNG_SIGNATURE)
+            fp.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+            fp.write(_png_chunk(b'acTL', struct.pack('>II', len(self.frames), 1)))
+            for index, (part, duration) in enumerate(zip(self._changed_parts(), self.frame_durations)):
+                part_height, part_width = part.shape[:2]
+                delay = int(round(duration * 1000))
+                # region at (0, 0), delay in ms, no disposal, replaces the region
+                fp.write(_png_chunk(b'fcTL', struct.pack(
+                    '>IIIIIHHBB', next(sequence), part_width, part_height, 0, 0, delay, 1000, 0, 0
+                )))
+                for data in _png_image_data(part):
+                    if index == 0:
+                        fp.write(_png_chunk(b'IDAT', data))
+                    else:
+                        fp.write(_png_chunk(b'fdAT', struct.pack('>I', next(sequence)) + data))
+            fp.write(_png_chunk(b'IEND', b''))
+        return output_path
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+def _png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+def _png_image_data(pixels):
+    """
+    Returns the compressed image data (the IDAT payloads) of an RGB array encoded as a PNG.
+    """
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG')
+    png = buffer.getvalue()
+    data, position = [], len(_PNG_SIGNATURE)
+    while position < len(png):
+        length, chunk_type = struct.unpack('>I4s', png[position:position + 8])
+        if chunk_type == b'IDAT':
+            data.append(png[position + 8:position + 8 + length])
+        position += length + 12
+    return data
+
+def _flatten(image, bg_color):
+    """
+    Composites an RGBA image over 'bg_color' and returns it as an RGB array.
+    """
+    background = Image.new("RGBA", image.size, bg_color + (255,))
+    return np.asarray(Image.alpha_composite(background, image.convert("RGBA")).convert("RGB"))
+
+def _resize_to_width(image, width):
+    if image.width == width:
+        return image
+    return image.resize((width, int(image.height * width / image.width)), Image.LANCZOS)
+
+@functools.lru_cache(maxsize=None)
+def load_post_header_frames(dark_mode, width, bg_color):
+    """
+    Decodes the animated post header once per (dark_mode, width, bg_color).
+    Returns (frames, frame_durations) with frames as read-only RGB arrays and durations in seconds.
+    """
+    header_gif_path = "static/animated_header_dark.gif" if dark_mode else "static/animated_header_white.gif"
+    frames, frame_durations = [], []
+    with Image.open(header_gif_path) as anim_gif:
+        default_duration = anim_gif.info.get('duration', 100)  # default 100ms if missing
+        for frame in ImageSequence.Iterator(anim_gif):
+            frame_array = _flatten(_resize_to_width(frame.convert("RGBA"), width), bg_color)
+            frame_array.flags.writeable = False
+            frames.append(frame_array)
+            frame_durations.append(frame.info.get('duration', default_duration) / 1000)
+    return tuple(frames), tuple(frame_durations)
+
+@functools.lru_cache(maxsize=None)
+def load_post_footer(dark_mode, width, bg_color):
+    """
+    Loads the post footer once per (dark_mode, width, bg_color), as a read-only RGB array.
+    """
+    footer_path = "static/footer_dark.png" if dark_mode else "static/footer_white.png"
+    with Image.open(footer_path) as footer_image:
+        footer = _flatten(_resize_to_width(footer_image, width), bg_color)
+    footer.flags.writeable = False
+    return footer
+
+# RedditImageCreator of a rendering worker process, created once by _init_render_worker
+_worker_creator = None
+
+def _init_render_worker(creator_kwargs):
+    global _worker_creator
+    _worker_creator = RedditImageCreator(**creator_kwargs)
+
+def _render_text_image(job):
+    text, style = job
+    return _worker_creator._render_text_images([text], style)[0]
 
 class RedditImageCreator:
-    def __init__(self, font_path="static/fonts/Roboto-Bold.ttf", font_size=30, dark_mode=True):
-        self.image_num = 0
+    """
+    Renders the images of Reddit posts and comments.
+
+    :param save_images: Also save the rendered images to TMP_FOLDER (debugging).
+    :param processes: Number of worker processes rendering paragraph images in parallel.
+                      Each worker loads the fonts once, 1 renders in the calling process.
+    :param cache: RenderCache of the text cards and comment headers. None uses the process-wide
+                  default one, False disables caching.
+    """
+    def __init__(self, font_path="static/fonts/Roboto-Bold.ttf", font_size=30, dark_mode=True, save_images=False, processes=1, cache=None):
+        # unique per creator so that several creators (or runs) can share TMP_FOLDER
+        self._image_prefix = uuid.uuid4().hex[:8]
+        self._image_numbers = itertools.count()
+        # images are handed to ShortCreator in memory, saving them to TMP_FOLDER is only for debugging
+        self.save_images = save_images
+        self.processes = processes
+        # workers only render, the cache is looked up and filled by this process
+        self._worker_kwargs = dict(font_path=font_path, font_size=font_size, dark_mode=dark_mode, cache=False)
+        self._pool = None
+        if cache is None:
+            cache = get_default_render_cache()
+        self.cache = cache or None
+        self.font_path = font_path
+        self.font_size = font_size
         self.font = ImageFont.truetype(font_path, font_size) if font_path else ImageFont.load_default()
         self.font_small = ImageFont.truetype(font_path, 18) if font_path else ImageFont.load_default()
         self.image_width = 576
         self.dark_mode = dark_mode
         self.font_color = (255, 255, 255) if dark_mode else (0, 0, 0)
         self.bg_color = ImageColor.getrgb("#0E1113") if dark_mode else ImageColor.getrgb("#FFFFFF")
+        self._layout_engines = {}
 
     def create_text_image(
         self,
@@ -35,180 +317,122 @@ class RedditImageCreator:
         :param side_margin: Margin on the left and right of the text (px).
         :param top_bottom_margin: Margin at the top and bottom of the text (px).
         """
-        # 1. Create a temporary image to measure text
-        temp_img = Image.new("RGB", (1, 1))
-        temp_draw = ImageDraw.Draw(temp_img)
+        return self.create_text_images([text], save_image, line_spacing, side_margin, top_bottom_margin)[0]
 
-        # 3. Word-wrap the text so each line fits within fixed_width - side margins
-        words = text.split()
-        lines = []
-        current_line = ""
+    def create_text_images(self, texts, save_image=False, line_spacing=2, side_margin=10, top_bottom_margin=8):
+        """
+        Same as create_text_image for a batch of texts, which share the cached word measurements.
+        Texts already in the render cache are not drawn again.
+        Returns a list of (image, filename) tuples.
+        """
+        style = (line_spacing, side_margin, top_bottom_margin)
+        keys = [self._render_key('text', text, style) for text in texts] if self.cache else [None] * len(texts)
+        images = [self.cache.get(key) for key in keys] if self.cache else [None] * len(texts)
 
-        max_line_width = self.image_width - 2 * side_margin
+        missing = [i for i, img in enumerate(images) if img is None]
+        for i, img in zip(missing, self._render_text_images([texts[i] for i in missing], style)):
+            images[i] = img
+            if self.cache:
+                self.cache.put(keys[i], img)
+        # images are saved here, in the order of 'texts', so they're numbered in that order too
+        return [(img, self._save_image(img) if save_image else None) for img in images]
 
-        for word in words:
-            test_line = word if not current_line else f"{current_line} {word}"
-            # Measure text
-            left, top, right, bottom = temp_draw.textbbox((0, 0), test_line, font=self.font)
-            test_line_width = right - left
+    def _render_key(self, kind, text, style):
+        return self.cache.make_key(
+            kind=kind, text=text, style=style, font_path=self.font_path, font_size=self.font_size,
+            dark_mode=self.dark_mode, width=self.image_width,
+        )
 
-            if test_line_width <= max_line_width:
-                current_line = test_line
-            else:
-                # Add the current_line to lines, then start a new line with the current word
-                lines.append(current_line)
-                current_line = word
+    def _render_text_images(self, texts, style):
+        if self.processes > 1 and len(texts) > 1:
+            # map keeps the order of 'texts'
+            return list(self._get_pool().map(_render_text_image, [(text, style) for text in texts]))
+        line_spacing, side_margin, top_bottom_margin = style
+        layouts = self.text_layout_engine(side_margin, line_spacing).layout_many(texts)
+        return [self._draw_text_layout(layout, top_bottom_margin) for layout in layouts]
 
-        # Don't forget the last line
-        if current_line:
-            lines.append(current_line)
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes, initializer=_init_render_worker, initargs=(self._worker_kwargs,)
+            )
+        return self._pool
 
-        # 4. Calculate total text height
-        line_heights = []
-        for line in lines:
-            left, top, right, bottom = temp_draw.textbbox((0, 0), line, font=self.font)
-            line_height = bottom - top
-            line_heights.append(line_height)
+    def close(self):
+        """
+        Stops the rendering worker processes, if any. They're started again when needed.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
 
-        # Sum all line heights + line spacing between them
-        total_text_height = sum(line_heights) + line_spacing * (len(lines) - 1)
+    def text_layout_engine(self, side_margin=10, line_spacing=2):
+        """
+        Returns the (cached) layout engine wrapping text between the side margins.
+        """
+        key = (side_margin, line_spacing)
+        if key not in self._layout_engines:
+            max_line_width = self.image_width - 2 * side_margin
+            self._layout_engines[key] = TextLayoutEngine(self.font, max_line_width, line_spacing=line_spacing)
+        return self._layout_engines[key]
 
+    def _draw_text_layout(self, layout, top_bottom_margin):
         # Final image height (with top/bottom margins)
-        #final_height = total_text_height + 2 * top_bottom_margin
-        final_height = total_text_height + 1 * top_bottom_margin
+        #final_height = layout.height + 2 * top_bottom_margin
+        final_height = layout.height + 1 * top_bottom_margin
 
-        # 5. Create the final image with the computed height
         img = Image.new("RGB", (self.image_width, final_height), color=self.bg_color)
         draw = ImageDraw.Draw(img)
 
-        # 6. Draw each line
         #y_offset = top_bottom_margin
         y_offset = 0
-        for line_height, line_text in zip(line_heights, lines):
-            left, top, right, bottom = draw.textbbox((0, 0), line_text, font=self.font)
-            text_width = right - left
-            # Center the text horizontally within (max_line_width)
+        for line_text, text_width, line_height in zip(layout.lines, layout.line_widths, layout.line_heights):
+            # Center the text horizontally
             x_pos = (self.image_width - text_width) // 2
             draw.text((x_pos, y_offset), line_text, font=self.font, fill=self.font_color)
-            y_offset += line_height + line_spacing
-
-        # 7. Save the final image
-        if save_image:
-            output_filename = self._save_image(img)
-            return img, output_filename
-        return img, None
+            y_offset += line_height + layout.line_spacing
+        return img
     
     def _save_image(self, image):
         """
         Save the image to a file.
         """
-        output_filename = f"{TMP_FOLDER}/image_{self.image_num}.png"
-        self.image_num += 1
+        output_filename = f"{TMP_FOLDER}/image_{self._image_prefix}_{next(self._image_numbers)}.png"
         image.save(output_filename)
         print(f"Saved text image: {output_filename}")
         return output_filename
 
-    def _create_post_gif(
-        self,
-        content_image,
-        output_gif_path="appended.gif"
-    ):
+    def _compose_post_frames(self, content_image):
         """
-        Appends an animated GIF on top of a static image vertically,
-        saving the final result as a new animated GIF.
-
-        Top portion: frames from 'animated_gif_path'
-        Bottom portion: 'content_image_path' (does NOT animate; it stays static).
-
-        :param animated_gif_path: Path to the source animated GIF.
-        :param content_image_path: Path to the static image (PNG/JPG).
-        :param output_gif_path: Name/path of the resulting animated GIF.
-        """
-        header_gif_path = "static/animated_header_dark.gif" if self.dark_mode else "static/animated_header_white.gif"
-        footer_path = "static/footer_dark.png" if self.dark_mode else "static/footer_white.png"
-        # Open the animated GIF
-        with Image.open(header_gif_path) as anim_gif:
-            # Convert first frame just to get size
-            first_frame = anim_gif.convert("RGBA")
-            gif_width, gif_height = first_frame.size
-            
-            # Open the static (text) image and ensure RGBA
-            #static_image = Image.open(content_image_path).convert("RGBA")
-            static_image = content_image.convert("RGBA")
-            text_width, text_height = static_image.size
-
-            footer_image = Image.open(footer_path).convert("RGBA")
-            footer_width, footer_height = footer_image.size
-            
-            # If widths differ, decide whether to resize one or the other
-            # Here, for simplicity, we'll make both match the max of the two widths
-            new_width = max(gif_width, text_width)
-            
-            # Optionally resize the GIF frames or the text image so widths match
-            # (If you want everything to have a uniform width.)
-            # For example, let's unify the width by scaling the text image:
-            if text_width != new_width:
-                scale_factor = new_width / text_width
-                new_height = int(text_height * scale_factor)
-                static_image = static_image.resize((new_width, new_height), Image.LANCZOS)
-                text_width, text_height = new_width, new_height
-            
-            # We'll do the same for GIF frames. This means resizing each frame.
-            frames = []
-            for frame in ImageSequence.Iterator(anim_gif):
-                frame_rgba = frame.convert("RGBA")
-                if gif_width != new_width:
-                    scale_factor_gif = new_width / gif_width
-                    new_height_gif = int(gif_height * scale_factor_gif)
-                    frame_rgba = frame_rgba.resize((new_width, new_height_gif), Image.LANCZOS)
-                    current_gif_width, current_gif_height = new_width, new_height_gif
-                else:
-                    current_gif_width, current_gif_height = gif_width, gif_height
-                
-                # Create a new image for each frame: total height = gif + text
-                total_height = current_gif_height + text_height + footer_height
-                new_frame = Image.new("RGBA", (new_width, total_height), (255, 255, 255, 0))
-                
-                # Paste the GIF frame on top
-                new_frame.paste(frame_rgba, (0, 0), frame_rgba)
-                # Paste the text image below
-                new_frame.paste(static_image, (0, current_gif_height), static_image)
-                # Paste the footer image at the bottom
-                #new_frame.paste(footer, (0, total_height - footer.size[1]), footer)
-                new_frame.paste(footer_image, (0, current_gif_height + text_height), footer_image)
-                
-                frames.append(new_frame)
-
-            # Retrieve GIF info (like duration) from the original
-            duration = anim_gif.info.get('duration', 100)  # default 100ms if missing
-            loop = anim_gif.info.get('loop', 0)  # 0 means infinite loop
-
-            # Save as a new animated GIF
-            frames[0].save(
-                output_gif_path,
-                save_all=True,
-                append_images=frames[1:],
-                duration=duration,
-                loop=loop,
-            )
+        Stacks the animated header on top of the static content image and the footer.
 
-        print(f"Saved appended GIF as: {output_gif_path}")
+        Top portion: the (cached) animated header frames
+        Bottom portion: 'content_image' and the footer (do NOT animate; they stay static).
 
-    def create_reddit_post_gif(self, text):
+        :param content_image: PIL image with the post text.
+        :return: AnimatedFrames of the title card.
         """
-        Create a Reddit-style post with an animated header and footer.
+        width = content_image.width
+        header_frames, frame_durations = load_post_header_frames(self.dark_mode, width, self.bg_color)
+        footer = load_post_footer(self.dark_mode, width, self.bg_color)
+        body = np.vstack([np.asarray(content_image.convert("RGB")), footer])
+        return AnimatedFrames(header_frames, frame_durations, body)
+
+    def create_reddit_post_frames(self, text):
         """
-        # 1) Create the dynamic height text image
-        text_image, _ = self.create_text_image(
-            text=text,
-        )
+        Create a Reddit-style post with an animated header and footer, as in-memory frames
+        that ShortCreator accepts in place of an image path.
+        """
+        text_image, _ = self.create_text_image(text=text)
+        return self._compose_post_frames(text_image)
 
-        # 2) Append the existing animated GIF on top of that text image:
-        output_gif_path=f"{TMP_FOLDER}/reddit_post.gif"
-        self._create_post_gif(
-            content_image=text_image,
-            output_gif_path=output_gif_path
-        )
+    def create_reddit_post_gif(self, text):
+        """
+        Create a Reddit-style post with an animated header and footer, saved as a GIF.
+        """
+        output_gif_path = f"{TMP_FOLDER}/reddit_post.gif"
+        self.create_reddit_post_frames(text).save_gif(output_gif_path)
+        print(f"Saved appended GIF as: {output_gif_path}")
         return output_gif_path
 
     def concatenate_images(self, img1, img2, orientation="vertical"):
@@ -243,6 +467,16 @@ class RedditImageCreator:
         """
         Creates a header image of size 576x20 that displays the commenter's name.
         """
+        if not self.cache:
+            return self._draw_comment_header(comment_author_name)
+        key = self._render_key('comment_header', comment_author_name, None)
+        header_img = self.cache.get(key)
+        if header_img is None:
+            header_img = self._draw_comment_header(comment_author_name)
+            self.cache.put(key, header_img)
+        return header_img
+
+    def _draw_comment_header(self, comment_author_name):
         width, height = 576, 20
         
         header_img = Image.new('RGB', (width, height), color=self.bg_color)
@@ -259,12 +493,35 @@ class RedditImageCreator:
     def create_comment_text_images_pairs(self, comment: Comment):
         """
         Create images for Reddit comments.
+        Returns the comment paragraphs and their images.
         """
         comment_text = replace_acronyms(comment.body)
         comment_author_name = comment.author.name if comment.author else "Unknown"
         comment_paragraphs = split_paragraphs_from_text(comment_text)
+        return comment_paragraphs, self.create_comment_images(comment_author_name, comment_paragraphs)
+
+    def create_comment_images(self, comment_author_name, comment_paragraphs):
+        """
+        Create one image per comment paragraph, the first one with the commenter's name on top.
+        Returns the PIL images, which are also saved to TMP_FOLDER if 'save_images' is set.
+        """
+        return self.create_comments_images([comment_author_name], [comment_paragraphs])[0]
+
+    def create_comments_images(self, comments_authors, comments_paragraphs):
+        """
+        Same as create_comment_images for several comments, whose paragraphs are all
+        rendered in a single batch (spread over the worker processes, if any).
+        Returns one list of images per comment, in order.
+        """
+        paragraph_images = iter(
+            img for img, _ in self.create_text_images([p for paragraphs in comments_paragraphs for p in paragraphs])
+        )
+        return [
+            self._add_comment_header(author, [next(paragraph_images) for _ in paragraphs])
+            for author, paragraphs in zip(comments_authors, comments_paragraphs)
+        ]
 
-        comment_images = [self.create_text_image(text=p, save_image=True)[0] for p in comment_paragraphs]
+    def _add_comment_header(self, comment_author_name, comment_images):
         # Create the header image
         comment_header_img = self.create_comment_header(comment_author_name)
         
@@ -274,9 +531,10 @@ class RedditImageCreator:
         # Replace the first image with the combined image.
         comment_images[0] = combined_img
 
-        # save images to files and get their paths
-        comment_images_paths = [self._save_image(img) for img in comment_images]
-        return comment_paragraphs, comment_images_paths
+        if self.save_images:
+            for img in comment_images:
+                self._save_image(img)
+        return comment_images
 
 # Example usage
 if __name__ == "__main__":
@@ -10,6 +10,7 @@ def main():
     # Additional required arguments for reddit_story
     parser.add_argument("--bg_video", required=False, help="Path to the background video file.")
     parser.add_argument("--bg_music", required=False, help="Path to the background music file.")
+    parser.add_argument("--save_images", action="store_true", help="Also save the rendered images to TMP_FOLDER (debugging).")
     #parser.add_argument("--voice_clone_file", required=False, help="Path to the voice clone file.")
 
     args = parser.parse_args()
@@ -39,7 +40,7 @@ def main():
             print("Error: --bg_video is required for 'reddit_thread'.")
             sys.exit(1)
 
-        reddit_thread = RedditThread(args.thread_link, args.bg_video, args.bg_music)
+        reddit_thread = RedditThread(args.thread_link, args.bg_video, args.bg_music, save_images=args.save_images)
         video_file_path, video_title, video_filename = reddit_thread.generate_short()
     else:
         print('invalid content type')
@@ -4,32 +4,295 @@ from zyphra import ZyphraClient
 from dotenv import load_dotenv
 load_dotenv()
 import base64
+import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ChunkedEncodingError
+import httpx
 from abc import ABC, abstractmethod
-from psola import from_file_to_file
+from audio_io import write_stream_to_file, encode_audio, decode_audio, split_audio_file, PCMStreamReader
+from time_stretch import TimeStretcher, time_stretch
+from util import FileCache
+import numpy as np
 import random
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 TMP_FOLDER = os.environ.get('TMP_FOLDER')
+TTS_CACHE_FOLDER = os.environ.get('TTS_CACHE_FOLDER') or 'tts_cache'
+TTS_CACHE_MAX_MB = float(os.environ.get('TTS_CACHE_MAX_MB') or 500)
+STREAM_CHUNK_SIZE = 16 * 1024
+OPENAI_PCM_SAMPLE_RATE = 24000  # OpenAI's 'pcm' response format is 24kHz 16-bit mono
 
 def get_wav_as_base64(wav_file_path):
     with open(wav_file_path, "rb") as wav_file:
         return base64.b64encode(wav_file.read()).decode('utf-8')
 
+@functools.lru_cache(maxsize=None)
+def _voice_clone_payload(wav_file_path, mtime):
+    return get_wav_as_base64(wav_file_path)
+
+def get_voice_clone_payload(wav_file_path):
+    """
+    Returns the base64 encoded voice clone sample, reading and encoding each file
+    only once per process (or again if the file changes on disk).
+    """
+    wav_file_path = os.path.abspath(wav_file_path)
+    return _voice_clone_payload(wav_file_path, os.path.getmtime(wav_file_path))
+
+def create_pooled_session(pool_size):
+    """
+    Creates a requests session whose connections are kept alive and reused between requests,
+    so that only the first request to a provider pays for the TCP and TLS handshakes.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def normalize_narration_text(text, terminal_punctuation=('.', '?')):
+    """
+    Collapses whitespace and makes sure the text ends with a punctuation mark,
+    so that the same sentence always produces the same TTS request.
+    """
+    text = ' '.join(text.split())
+    if text and text[-1] not in terminal_punctuation:
+        text += '.'
+    return text
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+    Allows bursts of up to 'capacity' requests and 'rate' requests per second on average.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available and consumes it.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider, requests_per_second):
+    """
+    Returns the token bucket shared by every narrator of the given provider,
+    so that several narrator instances don't exceed the provider's rate limit together.
+    """
+    with _rate_limiters_lock:
+        if provider not in _rate_limiters:
+            _rate_limiters[provider] = TokenBucket(requests_per_second)
+        return _rate_limiters[provider]
+
+class AudioCache(FileCache):
+    """
+    Content-addressed on-disk cache of synthesized audio files, stored as '<sha256 of the request parameters>.mp3'
+    (provider, model, voice, settings, text...). See FileCache.
+    """
+    def __init__(self, cache_dir=TTS_CACHE_FOLDER, max_bytes=int(TTS_CACHE_MAX_MB * 1024 * 1024), suffix='.mp3'):
+        super().__init__(cache_dir, max_bytes, suffix)
+
 class Narrator(ABC):
     """
     Abstract base class for text-to-speech narration.
+
+    Subclasses implement '_synthesize' (the actual provider request) and 'cache_params'
+    (everything besides the text that changes the resulting audio). 'create_audio_file'
+    takes care of text normalization, output file naming and the TTS cache.
+    Pass cache=False to disable caching.
+
+    'create_audio_files' narrates a batch of texts concurrently, with at most 'max_in_flight'
+    requests running at once and a token bucket limiting the request rate of each provider.
+    'create_grouped_audio_files' narrates each group of paragraphs with a single request
+    and splits the audio back into one file per paragraph.
     """
-    def __init__(self):
+    provider = None
+    terminal_punctuation = ('.', '?')
+    requests_per_second = 5
+    max_request_chars = 4000
+
+    def __init__(self, cache=None, max_in_flight=4, requests_per_second=None):
         self.audio_index = 0
+        self.audio_index_lock = threading.Lock()
+        if cache is None:
+            cache = AudioCache()
+        self.cache = cache or None
+        self.max_in_flight = max_in_flight
+        self.rate_limiter = get_rate_limiter(self.provider, requests_per_second or self.requests_per_second)
+
+    def default_voice(self):
+        """
+        Voice used when 'create_audio_file' is called without a voice actor.
+        """
+        return None
+
+    def serving_narrator(self, voice=None):
+        """
+        Returns the (narrator, provider voice) serving the requests made with 'voice': this narrator itself.
+        """
+        return self, voice
 
     @abstractmethod
-    def create_audio_file(self, text):
+    def cache_params(self, voice):
         """
-        Create an audio file from the given text and return the file path.
-        Subclasses must implement the TTS logic.
+        Returns a dict with the provider settings (model, voice, speed...) that affect the generated audio.
+        """
+        pass
+
+    @abstractmethod
+    def _synthesize(self, text, voice, output_path):
+        """
+        Performs the TTS request for 'text' and writes the resulting audio to 'output_path'.
         """
         pass
-    
+
+    def _reserve_output_path(self):
+        """
+        Returns a new unique audio file path. Safe to call from several threads.
+        """
+        with self.audio_index_lock:
+            audio_index = self.audio_index
+            self.audio_index += 1
+        return os.path.join(TMP_FOLDER, f'audio_{audio_index}.mp3')
+
+    def _render(self, text, voice, output_path):
+        """
+        Writes the narration of the (already normalized) text to 'output_path',
+        going through the cache and the provider's rate limiter.
+        """
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(provider=self.provider, text=text, **self.cache_params(voice))
+            if self.cache.fetch(key, output_path):
+                return output_path
+
+        self.rate_limiter.acquire()
+        self._synthesize(text, voice, output_path)
+        if key is not None:
+            self.cache.store(key, output_path)
+        return output_path
+
+    def create_audio_file(self, text, voice_actor=None):
+        """
+        Create an audio file from the given text and return the file path.
+        Audio previously generated with the same text and settings is served from the cache.
+        """
+        text = normalize_narration_text(text, self.terminal_punctuation)
+        voice = voice_actor or self.default_voice()
+        return self._render(text, voice, self._reserve_output_path())
+
+    def create_audio_files(self, texts, voices=None):
+        """
+        Narrates several texts concurrently and returns the audio file paths in the same order as 'texts'.
+
+        :param texts: List of texts to narrate.
+        :param voices: Either None (default voice), a single voice used for every text,
+                       or a list with one voice per text.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        if voices is None or isinstance(voices, str):
+            voices = [voices] * len(texts)
+        if len(voices) != len(texts):
+            raise ValueError("'voices' must have one voice per text.")
+
+        # reserve the output paths up front so that file names follow the input order
+        output_paths = [self._reserve_output_path() for _ in texts]
+        with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(texts))) as executor:
+            futures = [
+                executor.submit(
+                    self._render,
+                    normalize_narration_text(text, self.terminal_punctuation),
+                    voice or self.default_voice(),
+                    output_path,
+                )
+                for text, voice, output_path in zip(texts, voices, output_paths)
+            ]
+            return [future.result() for future in futures]
+
+    def _chunk_paragraphs(self, paragraphs):
+        """
+        Splits a group of paragraphs into runs that fit in a single provider request.
+        """
+        chunks = []
+        chunk_chars = 0
+        for paragraph in paragraphs:
+            if not chunks or chunk_chars + len(paragraph) > self.max_request_chars:
+                chunks.append([])
+                chunk_chars = 0
+            chunks[-1].append(paragraph)
+            chunk_chars += len(paragraph) + 2
+        return chunks
+
+    def _render_joined(self, paragraphs, voice, output_paths):
+        """
+        Narrates several paragraphs with one request and splits the result into 'output_paths'.
+        """
+        if len(paragraphs) == 1:
+            return [self._render(paragraphs[0], voice, output_paths[0])]
+
+        # paragraphs are separated by blank lines, so the narrator makes a clear pause between them
+        joined_path = os.path.splitext(output_paths[0])[0] + '_joined.mp3'
+        self._render('\n\n'.join(paragraphs), voice, joined_path)
+        split_audio_file(joined_path, [len(paragraph) for paragraph in paragraphs], output_paths)
+        os.remove(joined_path)
+        return output_paths
+
+    def create_grouped_audio_files(self, groups, voices=None):
+        """
+        Narrates groups of paragraphs (e.g. all paragraphs of a comment) with one request per group
+        instead of one per paragraph. Groups are narrated concurrently, and the result of each is
+        split at the pauses between paragraphs so there is still one audio file per paragraph.
+        Returns a list with the list of audio file paths of each group.
+
+        :param groups: List of lists of paragraphs.
+        :param voices: Either None (default voice), a single voice used for every group,
+                       or a list with one voice per group.
+        """
+        groups = [list(group) for group in groups]
+        if voices is None or isinstance(voices, str):
+            voices = [voices] * len(groups)
+        if len(voices) != len(groups):
+            raise ValueError("'voices' must have one voice per group.")
+
+        jobs = []
+        results = []
+        for group, voice in zip(groups, voices):
+            paragraphs = [normalize_narration_text(p, self.terminal_punctuation) for p in group]
+            output_paths = [self._reserve_output_path() for _ in paragraphs]
+            results.append(output_paths)
+            offset = 0
+            for chunk in self._chunk_paragraphs(paragraphs):
+                jobs.append((chunk, voice or self.default_voice(), output_paths[offset:offset + len(chunk)]))
+                offset += len(chunk)
+
+        if jobs:
+            with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(jobs))) as executor:
+                futures = [executor.submit(self._render_joined, *job) for job in jobs]
+                for future in futures:
+                    future.result()
+        return results
+
 
 class NarratorZyphra(Narrator):
     """
@@ -45,39 +308,58 @@ class NarratorZyphra(Narrator):
         "other": 0.5
     }
     """
-    def __init__(self, voice_clone_path_wav="./voice_samples/voice_zonos_gb_male.wav", zyphra_emotions=None):
-        super().__init__()
+    provider = 'zyphra'
+    requests_per_second = 1
+    max_request_chars = 2000
+
+    def __init__(self, voice_clone_path_wav="./voice_samples/voice_zonos_gb_male.wav", zyphra_emotions=None, cache=None, max_in_flight=2):
+        super().__init__(cache, max_in_flight)
         self.voice_clone_path_wav = voice_clone_path_wav
         self.emotions = zyphra_emotions or {}
+        self.speaking_rate = 20
+        self.model = "zonos-v0.1-transformer"
         
         # Validate Zyphra API key
         zyphra_key = os.environ.get('ZYPHRA_KEY')
         if not zyphra_key:
             raise Exception('Zyphra API key not set')
+        if not os.path.exists(voice_clone_path_wav):
+            raise Exception(f'Zyphra voice clone sample not found: {voice_clone_path_wav}')
 
         self.client = ZyphraClient(zyphra_key)
+        # the Zyphra client already holds a requests session, size its connection pool to our concurrency
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight, pool_block=True)
+        self.client._session.mount('https://', adapter)
 
-    def create_audio_file(self, text):
-        text = text.strip()
-        if text and text[-1] not in ('.', '?'):
-            text += '.'
-        output_path = os.path.join(TMP_FOLDER, f'audio_{self.audio_index}.mp3')
-        self.audio_index += 1
-        
+    def default_voice(self):
+        return self.voice_clone_path_wav
+
+    def cache_params(self, voice):
+        # the voice is identified by the voice clone file path, plus its modification time
+        # so that replacing the sample invalidates the cached audio
+        return {
+            'model': self.model,
+            'voice': voice,
+            'voice_mtime': os.path.getmtime(voice) if os.path.exists(voice) else None,
+            'speaking_rate': self.speaking_rate,
+            'emotions': self.emotions,
+        }
+
+    def _synthesize(self, text, voice, output_path):
         try:
-            # Convert the voice clone WAV to base64
-            base_64_voice_clone = get_wav_as_base64(self.voice_clone_path_wav)
+            # Convert the voice clone WAV to base64 (memoized per voice)
+            base_64_voice_clone = get_voice_clone_payload(voice)
             
-            # Perform Zyphra TTS
-            self.client.audio.speech.create(
+            # Perform Zyphra TTS, writing the audio to disk as it is received
+            audio_stream = self.client.audio.speech.create_stream(
                 text=text,
-                speaking_rate=20,
-                output_path=output_path,
+                speaking_rate=self.speaking_rate,
                 emotion=self.emotions,
                 speaker_audio=base_64_voice_clone,
                 mime_type="audio/mp3",
-                model="zonos-v0.1-transformer"
+                model=self.model
             )
+            write_stream_to_file(audio_stream, output_path)
             return output_path
         except ChunkedEncodingError:
             raise Exception('Zyphra API request failed')
@@ -86,29 +368,39 @@ class NarratorOpenAI(Narrator):
     """
     OpenAI-based narration with post-processing for speed adjustment.
     """
-    def __init__(self, voice_actor, speed=1.0):
-        super().__init__()
+    provider = 'openai'
+    requests_per_second = 8
+
+    def __init__(self, voice_actor, speed=1.0, cache=None, max_in_flight=8):
+        super().__init__(cache, max_in_flight)
         
         # Validate OpenAI API key
         openai_key = os.environ.get('OPENAI_KEY')
         if not openai_key:
             raise Exception('OpenAI API key not set')
 
-        self.client = OpenAI(api_key=openai_key)
+        # keep-alive connection pool sized to the number of concurrent requests.
+        # The endpoint can be pointed to a local stand-in server with OPENAI_BASE_URL.
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight),
+            timeout=httpx.Timeout(120.0, connect=10.0),
+        )
+        self.client = OpenAI(api_key=openai_key, http_client=self.http_client)
         self.voice_actor = voice_actor
         self.speed = speed
         self.model = 'gpt-4o-mini-tts'  # or 'tts-1'
 
-    def random_voiceactor(self):
+    def random_voiceactor(self, seed=None):
         """
-        Returns a random OpenAI voice actor from the available list.
+        Returns a random OpenAI voice actor from the available list,
+        always the same one for a given 'seed' (e.g. a comment id).
         """
         voice_actors = [
             'alloy', 'ash', 'ballad',
             'coral', 'echo', 'fable',
             'nova', 'sage', 'shimmer',
         ]
-        return random.choice(voice_actors)
+        return random.Random(seed).choice(voice_actors) if seed is not None else random.choice(voice_actors)
 
     def change_audio_speed(self, input_path, output_path, speed_factor):
         """
@@ -121,52 +413,69 @@ class NarratorOpenAI(Narrator):
         if not os.path.exists(input_path):
             raise FileNotFoundError(f"Input file not found: {input_path}")
         
-        from_file_to_file(input_path, output_path, constant_stretch=speed_factor)
+        samples, sample_rate = decode_audio(input_path)
+        encode_audio(time_stretch(samples, speed_factor, sample_rate), sample_rate, output_path)
 
-    def create_audio_file(self, text, voice_actor=None):
-        text = text.strip()
-        if text and text[-1] not in ('.', '?'):
-            text += '.'
-        
-        raw_output_path = os.path.join(TMP_FOLDER, f'audio_{self.audio_index}_raw.mp3')
-        final_output_path = os.path.join(TMP_FOLDER, f'audio_{self.audio_index}.mp3')
-        self.audio_index += 1
+    def default_voice(self):
+        return self.voice_actor
+
+    def cache_params(self, voice):
+        return {
+            'model': self.model,
+            'voice': voice,
+            'speed': self.speed,
+        }
 
-        voice = voice_actor or self.voice_actor
+    def _stream_speech(self, text, voice, response_format):
+        """
+        Yields the generated audio in chunks as they are received from OpenAI.
+        """
+        with self.client.audio.speech.with_streaming_response.create(
+            input=text,
+            model=self.model,
+            voice=voice,
+            response_format=response_format,
+            #instructions='You are a narrator who speaks clearly and at a fast pace',
+        ) as response:
+            yield from response.iter_bytes(STREAM_CHUNK_SIZE)
 
+    def _synthesize(self, text, voice, output_path):
         try:
-            # Generate OpenAI TTS audio
-            audio_data = self.client.audio.speech.create(
-                input=text,
-                model=self.model,
-                voice=voice,
-                response_format='mp3',
-                #instructions='You are a narrator who speaks clearly and at a fast pace',
-            )
-            audio_data.write_to_file(raw_output_path)
+            if self.speed == 1.0:
+                # No speed change needed, the mp3 goes straight to disk as it arrives
+                write_stream_to_file(self._stream_speech(text, voice, 'mp3'), output_path)
+                return output_path
 
-            # If speed is different from 1, apply speed adjustment
-            if self.speed != 1.0:
-                self.change_audio_speed(raw_output_path, final_output_path, self.speed)
-                os.remove(raw_output_path)  # Remove the raw file after processing
-            else:
-                final_output_path = raw_output_path  # No change needed
+            # Ask for raw pcm, which is decoded and time-stretched as it arrives (no mp3 encode
+            # on the server and decode here), then encode the final mp3 once
+            pcm_reader = PCMStreamReader(OPENAI_PCM_SAMPLE_RATE, keep_samples=False)
+            stretcher = TimeStretcher(self.speed, OPENAI_PCM_SAMPLE_RATE)
+            stretched_blocks = []
+            for chunk in self._stream_speech(text, voice, 'pcm'):
+                stretched_blocks.append(stretcher.feed(pcm_reader.feed(chunk)))
+            if pcm_reader.nsamples == 0:
+                raise Exception('Received empty audio response')
+            stretched_blocks.append(stretcher.flush())
 
-            return final_output_path
-        except ChunkedEncodingError:
+            encode_audio(np.concatenate(stretched_blocks), OPENAI_PCM_SAMPLE_RATE, output_path)
+            return output_path
+        except (ChunkedEncodingError, httpx.TransportError):
             raise Exception('OpenAI API request failed')
-        
 
-import requests
 
 class NarratorElevenLabs(Narrator):
     """
     ElevenLabs-based narration with voice selection capabilities.
     Uses direct API calls to avoid version compatibility issues.
     """
-    def __init__(self, voice_id='pNInz6obpgDQGcFmaJgB', stability=0.5, speed=1.2):
+    provider = 'elevenlabs'
+    terminal_punctuation = ('.', '?', '!')
+    requests_per_second = 3
+    max_request_chars = 5000
+
+    def __init__(self, voice_id='pNInz6obpgDQGcFmaJgB', stability=0.5, speed=1.2, cache=None, max_in_flight=4):
         # voice defaults to Adam with max speed
-        super().__init__()
+        super().__init__(cache, max_in_flight)
         
         # Validate ElevenLabs API key
         self.api_key = os.environ.get('ELEVENLABS_KEY')
@@ -176,7 +485,10 @@ class NarratorElevenLabs(Narrator):
         self.voice_id = voice_id  # If None, will use random voice
         self.stability = stability
         self.speed = speed
-        self.base_url = "https://api.elevenlabs.io/v1"
+        self.base_url = os.environ.get('ELEVENLABS_BASE_URL') or "https://api.elevenlabs.io/v1"
+        self.session = create_pooled_session(max_in_flight)
+        self.session.headers.update({"xi-api-key": self.api_key})
+        self.model_id = "eleven_multilingual_v2"
         self.available_voices = ['9BWtsMINqrJLrRacOk9x', 'CwhRBWXzGAHq8TQ4Fs17', 'EXAVITQu4vr4xnSDxMaL', 'FGY2WhTYpPnrIDTdsKH5', 'IKne3meq5aSn9XLyUdCD', 'JBFqnCBsd6RMkjVDRZzb', 'N2lVS1w4EtoT3dr4eOWO', 'SAz9YHcvj6GT2YYXdXww', 'TX3LPaxmHKxFdv7VOQHJ', 'XB0fDUnXU5powFXDhCwa', 'Xb7hH8MSUJpSbSDYk0k2', 'XrExE9yKIg1WjnnlVkGX', 'bIHbv24MWmeRgasZH58o', 'cgSgspJ2msm6clMCkdW9', 'cjVigY5qzO86Huf0OWal', 'iP95p4xoKVk53GoZ742B', 'nPczCjzI2devNBz1zQrb', 'onwK4e9ZLuTAKqWW03F9', 'pFZP5JQG7iQjIQuC4Bku', 'pqHfZKP75CvOlQylNhV4']
         
     def get_available_voices(self):
@@ -189,10 +501,9 @@ class NarratorElevenLabs(Narrator):
         url = f"{self.base_url}/voices"
         headers = {
             "Accept": "application/json",
-            "xi-api-key": self.api_key
         }
         
-        response = requests.get(url, headers=headers)
+        response = self.session.get(url, headers=headers)
         if response.status_code == 200:
             voices_data = response.json()
             self.available_voices = voices_data.get('voices', [])
@@ -200,37 +511,39 @@ class NarratorElevenLabs(Narrator):
         else:
             raise Exception(f"Failed to fetch voices: {response.status_code}, {response.text}")
 
-    def random_voiceactor(self):
+    def random_voiceactor(self, seed=None):
         """
-        Returns a random ElevenLabs voice ID from the available voices.
+        Returns a random ElevenLabs voice ID from the available voices,
+        always the same one for a given 'seed' (e.g. a comment id).
         """
+        if seed is not None:
+            return random.Random(seed).choice(sorted(self.available_voices))
         selected_voice_id = random.choice(self.available_voices)
         return selected_voice_id
 
-    def create_audio_file(self, text, voice_actor=None):
-        text = text.strip()
-        if text and text[-1] not in ('.', '?', '!'):
-            text += '.'
-        
-        output_path = os.path.join(TMP_FOLDER, f'audio_{self.audio_index}.mp3')
-        self.audio_index += 1
-        
+    def default_voice(self):
+        return self.voice_id
+
+    def cache_params(self, voice):
+        return {
+            'model': self.model_id,
+            'voice': voice,
+            'stability': self.stability,
+            'speed': self.speed,
+        }
+
+    def _synthesize(self, text, voice_id, output_path):
         try:
-            # Select voice ID (either specified or random)
-            #voice_id = self.voice_id if self.voice_id else self.random_voiceactor()
-            voice_id = voice_actor if voice_actor else self.voice_id
-            
-            # Set up the API request
-            url = f"{self.base_url}/text-to-speech/{voice_id}"
+            # Set up the API request (streaming endpoint, audio is sent as it is generated)
+            url = f"{self.base_url}/text-to-speech/{voice_id}/stream"
             headers = {
                 "Accept": "audio/mpeg",
                 "Content-Type": "application/json",
-                "xi-api-key": self.api_key
             }
             
             data = {
                 "text": text,
-                "model_id": "eleven_multilingual_v2",
+                "model_id": self.model_id,
                 "voice_settings": {
                     "stability": self.stability,
                     "speed": self.speed,
@@ -238,19 +551,293 @@ class NarratorElevenLabs(Narrator):
             }
             
             # Make the API request
-            response = requests.post(url, json=data, headers=headers)
-            
-            if response.status_code == 200:
-                # Save the audio to a file
-                with open(output_path, "wb") as file:
-                    file.write(response.content)
-                return output_path
-            else:
-                raise Exception(f"API request failed with status {response.status_code}: {response.text}")
+            with self.session.post(url, json=data, headers=headers, stream=True) as response:
+                if response.status_code == 200:
+                    # Write the audio to a file chunk by chunk as it arrives
+                    write_stream_to_file(response.iter_content(chunk_size=STREAM_CHUNK_SIZE), output_path)
+                    return output_path
+                else:
+                    raise Exception(f"API request failed with status {response.status_code}: {response.text}")
                 
         except Exception as e:
             raise Exception(f'ElevenLabs API request failed: {str(e)}')
-        
+
+
+class ProviderStats:
+    """
+    Rolling latency and error statistics of a narration provider, over its last 'window' requests.
+    """
+    def __init__(self, window=50):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.last_failure = None
+        self.last_used = None
+        self.lock = threading.Lock()
+
+    def record(self, latency, success):
+        with self.lock:
+            self.outcomes.append(success)
+            self.last_used = time.monotonic()
+            if success:
+                self.latencies.append(latency)
+            else:
+                self.last_failure = self.last_used
+
+    def claim_probe(self, interval):
+        """
+        Returns True (once) if the provider served requests before but none in the last 'interval' seconds.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.last_used is None or now - self.last_used < interval:
+                return False
+            self.last_used = now
+            return True
+
+    def percentile(self, q):
+        """
+        Returns the q-th percentile (0-100) of the successful request latencies, or None without data.
+        """
+        with self.lock:
+            if not self.latencies:
+                return None
+            return float(np.percentile(self.latencies, q))
+
+    @property
+    def p50(self):
+        return self.percentile(50)
+
+    @property
+    def p95(self):
+        return self.percentile(95)
+
+    @property
+    def error_rate(self):
+        with self.lock:
+            if not self.outcomes:
+                return 0.0
+            return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def is_healthy(self, max_error_rate, min_requests=3, cooldown=None):
+        """
+        A provider is unhealthy while its error rate is above 'max_error_rate', and healthy again
+        (on probation: its next failure demotes it again) once it hasn't failed for 'cooldown' seconds.
+        """
+        with self.lock:
+            if len(self.outcomes) < min_requests:
+                return True
+            if self.last_failure is None:
+                return True
+            if cooldown is not None and time.monotonic() - self.last_failure >= cooldown:
+                return True
+        return self.error_rate <= max_error_rate
+
+    def summary(self):
+        return {
+            'requests': len(self.outcomes),
+            'p50': self.p50,
+            'p95': self.p95,
+            'error_rate': self.error_rate,
+        }
+
+def _remove_attempt_file(future):
+    if future.exception() is None and os.path.exists(future.result()):
+        os.remove(future.result())
+
+class NarratorRouter(Narrator):
+    """
+    Routes narration requests between several narrators (e.g. OpenAI, ElevenLabs and Zyphra).
+
+    Every request goes to the healthy narrator with the lowest rolling p50 latency, narrators without
+    latency samples yet keeping their order in 'narrators' behind the measured ones. A narrator whose
+    recent error rate is above 'max_error_rate' is skipped, and a failed request is transparently
+    retried on the next narrator. With 'hedge' enabled, a duplicate of a request that takes longer
+    than its narrator's p95 latency is sent again, and the first response wins.
+
+    Demotions aren't final: a narrator skipped for its errors is tried again once it hasn't failed for
+    'cooldown' seconds, and a measured narrator that ranks behind the others gets a request whenever it
+    hasn't had one for 'cooldown' seconds, so its latency stays up to date. Texts are normalized with
+    the terminal punctuation of the narrator that serves them. Call 'close' when done.
+
+    Voices are provider specific, so 'random_voiceactor' returns a voice token instead. The first request
+    of a token picks the narrator (and one of its voices), and the following requests with the same token
+    stick to it, so a comment keeps the same voice unless its narrator fails. A seeded token maps to the
+    same voice of each narrator on every run.
+    """
+    provider = 'router'
+    # texts are normalized again by the narrator serving them, see _attempt
+    terminal_punctuation = ('.', '?', '!')
+
+    def __init__(self, narrators, hedge=True, max_error_rate=0.5, stats_window=50, max_in_flight=8, cooldown=60.0):
+        if not narrators:
+            raise ValueError('NarratorRouter needs at least one narrator.')
+        # the wrapped narrators do their own caching and rate limiting
+        super().__init__(cache=False, max_in_flight=max_in_flight)
+        self.narrators = list(narrators)
+        # a request may fail over to any narrator, so grouped requests have to fit in the smallest limit
+        self.max_request_chars = min(narrator.max_request_chars for narrator in self.narrators)
+        self.hedge = hedge
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.stats = {id(narrator): ProviderStats(stats_window) for narrator in self.narrators}
+        self.voice_tokens = 0
+        self.voice_assignments = {}  # voice token -> (narrator, provider voice)
+        self.assignments_lock = threading.Lock()
+        self.hedge_executor = ThreadPoolExecutor(max_workers=2 * max_in_flight * len(self.narrators))
+
+    @classmethod
+    def from_factories(cls, factories, **kwargs):
+        """
+        Builds a router from narrator factories, skipping the providers that can't be created
+        (e.g. because their API key is not set).
+        """
+        narrators = []
+        for factory in factories:
+            try:
+                narrators.append(factory())
+            except Exception as e:
+                print(f'Skipping narrator: {e}')
+        return cls(narrators, **kwargs)
+
+    def cache_params(self, voice):
+        return {}
+
+    def _synthesize(self, text, voice, output_path):
+        self._render(text, voice, output_path)
+
+    def random_voiceactor(self, seed=None):
+        """
+        Returns a new voice token, or the token of 'seed' (e.g. a comment id).
+        Each narrator maps it to one of its own random voices.
+        """
+        if seed is not None:
+            return f'seed-{seed}'
+        with self.assignments_lock:
+            self.voice_tokens += 1
+            return f'voice-{self.voice_tokens}'
+
+    def serving_narrator(self, voice=None):
+        """
+        Returns the (narrator, provider voice) that served the last request made with 'voice',
+        or the narrator next in line (and no particular voice) if there was none.
+        """
+        with self.assignments_lock:
+            assignment = self.voice_assignments.get(voice)
+            if assignment is not None:
+                return assignment
+            return self._ranked_narrators()[0], None
+
+    def provider_stats(self):
+        return {narrator.provider: self.stats[id(narrator)].summary() for narrator in self.narrators}
+
+    def close(self):
+        """
+        Shuts down the threads sending hedged requests, once the pending ones are done.
+        """
+        self.hedge_executor.shutdown(wait=True)
+
+    def _is_healthy(self, narrator):
+        return self.stats[id(narrator)].is_healthy(self.max_error_rate, cooldown=self.cooldown)
+
+    def _ranked_narrators(self, exclude=()):
+        """
+        Healthy narrators first, fastest (lowest p50) first. Narrators without data yet come after
+        the measured ones, in their given order, so the first one is preferred until another one is measured.
+        """
+        def rank(narrator):
+            p50 = self.stats[id(narrator)].p50
+            return (not self._is_healthy(narrator), p50 is None, p50 or 0.0)
+        candidates = [narrator for narrator in self.narrators if narrator not in exclude]
+        return sorted(candidates, key=rank)
+
+    def _provider_voice(self, narrator, voice):
+        if voice is None:
+            return narrator.default_voice()
+        random_voiceactor = getattr(narrator, 'random_voiceactor', None)
+        if random_voiceactor is None:
+            return narrator.default_voice()
+        return random_voiceactor(seed=voice) if voice.startswith('seed-') else random_voiceactor()
+
+    def _assign(self, voice, exclude=()):
+        """
+        Returns the (narrator, provider voice) serving 'voice', picking a new narrator if there is none yet
+        or if the current one is excluded or unhealthy.
+        """
+        with self.assignments_lock:
+            assignment = self.voice_assignments.get(voice)
+            if assignment is not None:
+                narrator = assignment[0]
+                if narrator not in exclude and self._is_healthy(narrator):
+                    return assignment
+            ranked = self._ranked_narrators(exclude)
+            if not ranked:
+                return None
+            # a healthy narrator behind the first one that hasn't served for a while is probed with this voice
+            narrator = next((
+                other for other in ranked[1:]
+                if self._is_healthy(other) and self.stats[id(other)].claim_probe(self.cooldown)
+            ), ranked[0])
+            assignment = (narrator, self._provider_voice(narrator, voice))
+            self.voice_assignments[voice] = assignment
+            return assignment
+
+    def _attempt(self, narrator, text, voice, output_path):
+        # the paragraphs of grouped requests are joined by blank lines, see _render_joined
+        text = '\n\n'.join(normalize_narration_text(paragraph, narrator.terminal_punctuation) for paragraph in text.split('\n\n'))
+        start = time.monotonic()
+        try:
+            narrator._render(text, voice, output_path)
+        except Exception:
+            self.stats[id(narrator)].record(time.monotonic() - start, False)
+            raise
+        self.stats[id(narrator)].record(time.monotonic() - start, True)
+        return output_path
+
+    def _hedged_attempt(self, narrator, text, voice, output_path):
+        """
+        Runs the request on 'narrator'. If it is still running after the narrator's p95 latency,
+        sends a duplicate request and keeps whichever finishes first.
+        """
+        p95 = self.stats[id(narrator)].p95
+        if not self.hedge or p95 is None:
+            return self._attempt(narrator, text, voice, output_path)
+
+        base_path = os.path.splitext(output_path)[0]
+        attempt_paths = [f'{base_path}_attempt0.mp3', f'{base_path}_attempt1.mp3']
+        futures = [self.hedge_executor.submit(self._attempt, narrator, text, voice, attempt_paths[0])]
+        done, _ = wait(futures, timeout=p95)
+        if not done:
+            futures.append(self.hedge_executor.submit(self._attempt, narrator, text, voice, attempt_paths[1]))
+
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    os.replace(future.result(), output_path)
+                    # the slower duplicate removes its file whenever it finishes
+                    for other in pending:
+                        other.add_done_callback(_remove_attempt_file)
+                    return output_path
+                error = future.exception()
+        raise error
+
+    def _render(self, text, voice, output_path):
+        failed = []
+        errors = []
+        while True:
+            assignment = self._assign(voice, exclude=failed)
+            if assignment is None:
+                raise Exception(f'All narration providers failed: {errors}')
+            narrator, provider_voice = assignment
+            try:
+                return self._hedged_attempt(narrator, text, provider_voice, output_path)
+            except Exception as e:
+                print(f'Narration with {narrator.provider} failed, failing over: {e}')
+                failed.append(narrator)
+                errors.append(str(e))
+
 if __name__ == "__main__":
     # Example usage
     narrator = NarratorElevenLabs()
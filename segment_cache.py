@@ -0,0 +1,26 @@
+import functools
+import os
+from util import FileCache
+
+SEGMENT_CACHE_FOLDER = os.environ.get('SEGMENT_CACHE_FOLDER') or 'segment_cache'
+SEGMENT_CACHE_MAX_MB = float(os.environ.get('SEGMENT_CACHE_MAX_MB') or 1000)
+# bump when the compositing code changes, so that segments rendered by older versions aren't reused
+SEGMENT_VERSION = 1
+
+class SegmentCache(FileCache):
+    """
+    Content-addressed on-disk cache of encoded video segments of shorts (see ShortCreator), stored as
+    '<sha256 of everything drawn in the segment and the encoding settings>.mp4'. See FileCache.
+    """
+    version = SEGMENT_VERSION
+
+    def __init__(self, cache_dir=SEGMENT_CACHE_FOLDER, max_bytes=int(SEGMENT_CACHE_MAX_MB * 1024 * 1024), suffix='.mp4'):
+        super().__init__(cache_dir, max_bytes, suffix)
+
+@functools.lru_cache(maxsize=None)
+def get_default_segment_cache():
+    """
+    Returns the segment cache shared by every ShortCreator of the process,
+    created on first use in SEGMENT_CACHE_FOLDER.
+    """
+    return SegmentCache()
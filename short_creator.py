@@ -1,69 +1,336 @@
-import cv2
 import numpy as np
-import moviepy.editor as mp
 from moviepy.video.io.VideoFileClip import VideoFileClip
-from moviepy.video.io.ImageSequenceClip import ImageSequenceClip
-from moviepy.audio.io.AudioFileClip import AudioFileClip
-from moviepy.audio.AudioClip import CompositeAudioClip
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
 from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
-from moviepy.video.VideoClip import ImageClip
-import moviepy.audio.fx.all as afx
+from moviepy.video.fx.crop import crop
+from moviepy.video.fx.resize import resize
+from moviepy.video.VideoClip import ImageClip, VideoClip
+import contextlib
+import functools
+import hashlib
+import math
 import os
+import shutil
+import tempfile
 import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageDraw
+from audio_io import probe_duration
+from audio_mixer import AudioMixer
+from image_creator import AnimatedFrames
+from captions import CaptionRenderer, CaptionTrack
+from compositor import Compositor, BackgroundReader, StaticOverlay, AnimatedOverlay, GifAnimation
+from background_library import center_crop, get_default_background_library
+from filtergraph import FiltergraphRenderer, OverlayInput
+from segment_cache import get_default_segment_cache
+from util import PeakMemoryMonitor, ReaderPool
 
 target_width, target_height = 576, 1024  # 9:16 aspect ratio
+fps = 30
+music_volume = 0.3
+
+TimelineItem = namedtuple('TimelineItem', ['media', 'audio', 'start', 'duration', 'caption'])
+
+class ShortTimeline(namedtuple('ShortTimeline', ['items', 'duration', 'background_start', 'music', 'mixer'])):
+    """
+    Layout of a short: the TimelineItem of every image-audio pair, the start of the background video window,
+    the (path, start) of the background music window and the AudioMixer holding the decoded narrations.
+    Its random choices are made once, so previews and the final render of a timeline show the same short.
+    """
+    __slots__ = ()
+
+    @property
+    def caption_segments(self):
+        return [(item.caption, item.start, item.duration) for item in self.items if item.caption]
+
+def _content_size(media_width, media_height, scale=1.0):
+    # content is 70% of the video width, keeping its aspect ratio
+    image_target_width = int(0.7 * target_width * scale)
+    return image_target_width, int(image_target_width * media_height / media_width)
+
+def _preview_size(scale):
+    # even dimensions, for yuv420p
+    return tuple(2 * max(1, int(round(dimension * scale / 2))) for dimension in (target_width, target_height))
+
+def _contact_sheet(frames, labels, columns, margin=8):
+    """
+    Tiles the frames (all the same size) into a grid image, with a label under each one.
+    """
+    height, width = frames[0].shape[:2]
+    label_height = 16
+    rows = -(-len(frames) // columns)
+    columns = min(columns, len(frames))
+    sheet = Image.new("RGB", (columns * (width + margin) + margin, rows * (height + label_height + margin) + margin), (24, 24, 24))
+    draw = ImageDraw.Draw(sheet)
+    for i, (frame, label) in enumerate(zip(frames, labels)):
+        x = margin + (i % columns) * (width + margin)
+        y = margin + (i // columns) * (height + label_height + margin)
+        sheet.paste(Image.fromarray(frame), (x, y))
+        draw.text((x, y + height + 2), label, fill=(230, 230, 230))
+    return sheet
+
+def _media_info(media):
+    """
+    Returns the (width, height), duration (None for still images) and transparency of the media of
+    an image-audio pair, reading only the headers of files.
+    """
+    if isinstance(media, AnimatedFrames):
+        return media.size, media.duration, False
+    if isinstance(media, Image.Image):
+        return media.size, None, media.mode == "RGBA"
+    if isinstance(media, np.ndarray):
+        return media.shape[1::-1], None, media.ndim == 3 and media.shape[2] == 4
+    if os.path.splitext(media)[1].lower() == ".gif":
+        infos = ffmpeg_parse_infos(media)
+        return tuple(infos['video_size']), infos['duration'], False
+    with Image.open(media) as image:
+        return image.size, None, "A" in image.getbands()
+
+def _prepare_overlay(media, scale=1.0):
+    """
+    Prepares the media of an image-audio pair for the Compositor, resized to its on-screen size
+    ('scale' times that size for a preview).
+    """
+    if isinstance(media, str):
+        if os.path.splitext(media)[1].lower() == ".gif":
+            media = GifAnimation(media)
+        else:
+            with Image.open(media) as image:
+                media = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    if isinstance(media, (AnimatedFrames, GifAnimation)):
+        width, height = media.size if isinstance(media, AnimatedFrames) else media.frames[0].shape[1::-1]
+        return AnimatedOverlay(media, _content_size(width, height, scale))
+    if isinstance(media, Image.Image):
+        media = media if media.mode in ("RGB", "RGBA") else media.convert("RGB")
+    media = np.asarray(media)
+    if media.ndim == 2:
+        media = np.repeat(media[..., None], 3, axis=2)
+    return StaticOverlay(media, _content_size(media.shape[1], media.shape[0], scale))
+
+def _open_overlay(media, scale=1.0):
+    """
+    Opens the overlay of an image-audio pair while rendering; media that can't be opened is left out (None).
+    """
+    try:
+        return _prepare_overlay(media, scale)
+    except Exception as e:
+        print(f"Error processing media {media}: {e}")
+        traceback.print_exc()
+        return None
+
+def _shown_in(item_start, item_end, first_frame, end_frame):
+    # whether something shown from 'item_start' to 'item_end' (seconds) is on any of the frames [first_frame, end_frame)
+    return math.ceil(item_start * fps - 1e-6) < end_frame and math.ceil(item_end * fps - 1e-6) > first_frame
+
+def _media_digest(media):
+    """
+    Returns a digest of the content of the media of an image-audio pair (of the file, for a path).
+    """
+    digest = hashlib.sha256()
+    if isinstance(media, str):
+        with open(media, 'rb') as media_file:
+            for chunk in iter(lambda: media_file.read(1 << 20), b''):
+                digest.update(chunk)
+        digest.update(os.path.splitext(media)[1].lower().encode())
+    elif isinstance(media, AnimatedFrames):
+        for array in list(media.frames) + [media.static_part, np.asarray(media.frame_durations, dtype=np.float64)]:
+            digest.update(repr(array.shape).encode())
+            digest.update(np.ascontiguousarray(array).tobytes())
+    elif isinstance(media, Image.Image):
+        digest.update(f"{media.mode}{media.size}".encode())
+        digest.update(media.tobytes())
+    else:
+        media = np.ascontiguousarray(media)
+        digest.update(f"{media.dtype}{media.shape}".encode())
+        digest.update(media.tobytes())
+    return digest.hexdigest()
+
+def _page_digest(page, start):
+    """
+    Returns a description of a caption page for a segment key, with times relative to the segment 'start'.
+    """
+    digest = hashlib.sha256()
+    for array in (page.fill, page.outline, page.color, page.highlight_color, page.stroke_color):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    words = [(word.text, round(word.start - start, 6), round(word.end - start, 6), word.x0, word.x1) for word in page.words]
+    return [digest.hexdigest(), list(page.position), words]
+
+def _render_segment(job, pool=None):
+    """
+    Renders and encodes one segment of a short (video only) in a worker process,
+    or in this one with the ReaderPool 'pool' of the render.
+    """
+    segment_path, start, duration, overlays, caption_track, background_args, max_open_readers, preset, threads = job
+    if pool is None:
+        pool = ReaderPool(max_open=max_open_readers)
+    background = BackgroundReader(**background_args)
+    try:
+        Compositor(size=(target_width, target_height), fps=fps, preset=preset, threads=threads).render(
+            segment_path, duration, background, overlays,
+            frame_filter=caption_track.draw if caption_track else None, start=start, open_overlay=_open_overlay, pool=pool,
+        )
+    finally:
+        background.close()
+    return segment_path
+
+def split_timeline(starts, duration, nsegments=None):
+    """
+    Splits a timeline of 'duration' seconds into at most 'nsegments' segments of similar length,
+    cutting only at the given pair 'starts' (on the first frame at or after each one, so that
+    the frames of a pair are never split). None cuts at every start.
+    Returns the (start, end) of every segment.
+    """
+    candidates = sorted({math.ceil(start * fps - 1e-6) / fps for start in starts if 0 < start < duration})
+    candidates = [candidate for candidate in candidates if candidate < duration]
+    cuts = set(candidates) if nsegments is None else set()
+    for k in range(1, nsegments or 0):
+        if candidates:
+            target = k * duration / nsegments
+            cuts.add(min(candidates, key=lambda candidate: abs(candidate - target)))
+    bounds = [0.0] + sorted(cuts) + [duration]
+    return list(zip(bounds[:-1], bounds[1:]))
 
 class ShortCreator:
 
-    def __init__(self):
-        self.background_video = None
-        self.background_music = None
-        self.image_audio_pairs = []  # List to store (image_path, audio_path) tuples
+    def __init__(
+        self,
+        captions=None,
+        backend="numpy",
+        preset="medium",
+        background_library=False,
+        render_processes=1,
+        max_open_readers=2,
+        segment_cache=False,
+    ):
+        """
+        :param captions: CaptionRenderer drawing word-by-word captions of the pairs added with a caption text.
+                         None uses the default caption style, False disables captions.
+        :param backend: "numpy" composes the frames with the Compositor and pipes them to ffmpeg,
+                        "ffmpeg" has ffmpeg compose the whole short from a filtergraph (no frame goes through Python),
+                        "moviepy" uses MoviePy's CompositeVideoClip.
+        :param preset: x264 preset, trading encoding speed for file size.
+        :param background_library: BackgroundLibrary the background videos are transcoded to the video size with,
+                                   True for the shared default library. A video that wasn't ingested yet is transcoded
+                                   by add_background_video, so ingest them ahead (python -m background_library videos...).
+                                   Disabled by default: the source video is cropped and resized at render time.
+        :param render_processes: Number of processes rendering and encoding segments of the short in parallel
+                                 (numpy backend only). The timeline is split between image-audio pairs.
+        :param max_open_readers: Number of image-audio pair media (decoded images, GIF readers...) kept open at once.
+                                 Each one is opened just before it's shown and closed after it ends, so memory use
+                                 doesn't grow with the number of pairs. 'render_stats' reports the peak of every render.
+        :param segment_cache: SegmentCache keeping the video of every image-audio pair encoded as a separate segment,
+                              so that re-rendering a short after changing a pair only encodes the segments that changed
+                              (see build_timeline's 'previous'). True uses the shared default cache. Disabled by default:
+                              the short is then cut in 'render_processes' segments, or rendered in one piece.
+        """
+        if backend not in ("numpy", "ffmpeg", "moviepy"):
+            raise ValueError("backend must be one of 'numpy', 'ffmpeg' or 'moviepy'.")
+        if render_processes > 1 and backend != "numpy":
+            raise ValueError("Parallel rendering requires the 'numpy' backend.")
+        if segment_cache and backend != "numpy":
+            raise ValueError("The segment cache requires the 'numpy' backend.")
+        if segment_cache is True:
+            segment_cache = get_default_segment_cache()
+        self.segment_cache = segment_cache or None
+        self.render_processes = render_processes
+        self.max_open_readers = max_open_readers
+        self.render_stats = None
+        self.backend = backend
+        self.preset = preset
+        if background_library is True:
+            background_library = get_default_background_library()
+        self.background_library = background_library or None
+        self.background_video_path = None
+        self.background_video_duration = None
+        self.background_video_fps = None
+        self.background_crop = None
+        self.background_index = None
+        self.background_music_path = None
+        self.background_music_duration = None
+        self.image_audio_pairs = []  # List to store (image, audio, caption) tuples
+        self.captions = captions
 
     def add_background_music(self, audio_path):
         """
-        Add background music to the video.
+        Add background music to the video, mixed at music_volume and ducked under the narrations (see AudioMixer).
         """
-        self.background_music = AudioFileClip(audio_path)
-        self.background_music = self.background_music.fx(afx.volumex, 0.3)  # Reduce volume
+        self.background_music_path = audio_path
+        self.background_music_duration = probe_duration(audio_path)
 
 
     def add_background_video(self, video_path):
         """
         Set the background video.
+        With a background library, the video is transcoded to the size of the short the first time it's used
+        and the short starts on one of its keyframes, otherwise every frame is cropped and resized while rendering.
         """
         #self.background_video = VideoFileClip(video_path).resize(height=1920, width=1080)
-        video = VideoFileClip(video_path, audio=False)
-        original_width, original_height = video.size
-
-        # Calculate the cropping region
-        video_aspect = original_width / original_height
-        target_aspect = target_width / target_height
-
-        if video_aspect > target_aspect:
-            # Video is wider than 9:16 -> Crop width
-            new_width = int(original_height * target_aspect)
-            new_height = original_height
+        # only the headers are read here, the video is opened when rendering
+        if self.background_library:
+            self.background_index = self.background_library.ingest(video_path)
+            self.background_video_path = self.background_index.path
+            self.background_video_duration = self.background_index.duration
+            self.background_video_fps = self.background_index.fps
+            self.background_crop = None
         else:
-            # Video is taller than 9:16 -> Crop height
-            new_width = original_width
-            new_height = int(original_width / target_aspect)
+            infos = ffmpeg_parse_infos(video_path)
+            self.background_index = None
+            self.background_video_path = video_path
+            self.background_video_duration = infos['duration']
+            self.background_video_fps = infos['video_fps']
+            # Crop to 9:16 (resized to the target resolution while rendering)
+            self.background_crop = center_crop(*infos['video_size'], (target_width, target_height))
 
-        x1 = (original_width - new_width) // 2
-        y1 = (original_height - new_height) // 2
-        x2 = x1 + new_width
-        y2 = y1 + new_height
+    def _open_background_clip(self):
+        """
+        Opens the background video as a MoviePy clip of the size of the short.
+        """
+        video = VideoFileClip(self.background_video_path, audio=False)
+        if self.background_crop:
+            x1, y1, x2, y2 = self.background_crop
+            video = video.fx(crop, x1=x1, y1=y1, x2=x2, y2=y2)
+        if tuple(video.size) != (target_width, target_height):
+            video = video.fx(resize, (target_width, target_height))
+        return video.set_position("center")
 
-        # Crop and resize to target resolution
-        video = video.crop(x1=x1, y1=y1, x2=x2, y2=y2).resize((target_width, target_height))
+    def add_image_audio_pair(self, image_path, audio_path, caption=None):
+        """
+        Add an image-audio pair to the sequence.
+        The image can be a file path, a PIL image, a NumPy array or in-memory AnimatedFrames (e.g. the post title card),
+        the audio can be a file path or an in-memory AudioBuffer (e.g. from time_stretch_many).
+        'caption' is the narrated text, shown as captions timed over the audio's duration.
+        """
+        self.image_audio_pairs.append((image_path, audio_path, caption))
 
-        self.background_video = video.set_position("center")
+    def _caption_track(self, caption_segments, video_size=(target_width, target_height)):
+        """
+        Lays out the captions of the (text, start, duration) segments, or returns None if there are none to draw.
+        Videos larger than the short (e.g. a 1080x1920 rendition) get proportionally larger captions.
+        """
+        if self.captions is False or not caption_segments:
+            return None
+        if self.captions is None:
+            self.captions = CaptionRenderer()
+        return self.captions.build_track(caption_segments, video_size, scale=video_size[0] / target_width)
 
-    def add_image_audio_pair(self, image_path, audio_path):
+    def _open_media_clip(self, media, duration):
         """
-        Add an image-audio pair to the sequence.
+        Opens the media of an image-audio pair: an image file, a GIF, a PIL image, a NumPy array
+        or in-memory AnimatedFrames. Animations are played once, and cut if they last longer than 'duration'.
         """
-        self.image_audio_pairs.append((image_path, audio_path))
+        if isinstance(media, AnimatedFrames):
+            return VideoClip(make_frame=media.get_frame, duration=min(media.duration, duration))
+        if isinstance(media, Image.Image):
+            # RGBA images keep their transparency as the clip's mask, like RGBA files do
+            media = np.asarray(media if media.mode in ("RGB", "RGBA") else media.convert("RGB"))
+        if isinstance(media, np.ndarray):
+            return ImageClip(media, duration=duration)
+        file_ext = os.path.splitext(media)[1].lower()
+        if file_ext in [".gif"]:
+            content_clip = VideoFileClip(media)
+            return content_clip.subclip(0, min(content_clip.duration, duration))
+        return ImageClip(media, duration=duration)
 
     #def create_video(self, output_path="output.mp4"):
     #    """
@@ -113,7 +380,7 @@ class ShortCreator:
     #    
     #    # randomly sample background video clip from the background video
     #    # we do it here because we know all the clips have been added, and thus we know the total duration of the video.
-    #    bg_video_max_start_time = max(0, self.background_video.duration - current_time)
+    #    bg_video_max_start_time = max(0, self.background_video_duration - current_time)
     #    bg_video_start_time = np.random.uniform(0, bg_video_max_start_time)
     #    self.background_video = self.background_video.subclip(bg_video_start_time, bg_video_start_time + current_time)
     #    clips.insert(0, self.background_video)
@@ -139,100 +406,496 @@ class ShortCreator:
     #    final_video.write_videofile(output_path, codec="libx264", fps=30, audio_codec="aac")
     #    print("Video creation completed!")
 
-    def create_video(self, output_path="output.mp4"):
+    def build_timeline(self, previous=None):
+        """
+        Lays out the image-audio pairs, decoding every narration once onto the audio timeline, and picks
+        the background video and music windows. Rendering the returned ShortTimeline with create_preview,
+        create_contact_sheet and create_video gives the same short.
+
+        :param previous: ShortTimeline whose background and music windows are kept, to re-render a short
+                         after editing some of its pairs: with the segment cache, only the segments of the pairs
+                         that changed (and of the following ones, if their start moved) are encoded again.
+        """
+        if self.background_video_path is None:
+            raise ValueError("Background video not set.")
+        items = []
+        mixer = AudioMixer(sample_rate=44100, music_volume=music_volume)
+        current_time = 0  # Track timing
+        decoded = mixer.decode_many([audio for _, audio, _ in self.image_audio_pairs])
+        for (media, audio, caption), samples in zip(self.image_audio_pairs, decoded):
+            if samples is None:
+                continue  # reported by decode_many
+            try:
+                audio_duration = mixer.add(samples, current_time)
+                items.append(TimelineItem(media, audio, current_time, audio_duration, caption))
+                current_time += audio_duration
+            except Exception as e:
+                print(f"Error processing audio {audio}: {e}")
+                traceback.print_exc()
+        if previous is not None:
+            background_start, music = previous.background_start, previous.music
+        else:
+            background_start, music = self._pick_windows(current_time)
+        return ShortTimeline(items, current_time, background_start, music, mixer)
+
+    def _pick_windows(self, duration):
+        """
+        Returns the random start of the background video window and the (path, start) of the background music window.
+        """
+        # Sample background video
+        if self.background_index:
+            bg_video_start_time = self.background_index.pick_window(duration)
+        else:
+            bg_video_max_start_time = max(0, self.background_video_duration - duration)
+            bg_video_start_time = np.random.uniform(0, bg_video_max_start_time)
+
+        # Background music, ducked under the narrations
+        music = None
+        if self.background_music_path:
+            bg_music_max_start_time = max(0, self.background_music_duration - duration)
+            music = (self.background_music_path, np.random.uniform(0, bg_music_max_start_time))
+        return bg_video_start_time, music
+
+    def create_video(self, output_path="output.mp4", timeline=None):
         """
         Generate the final short video with all the added components.
+        'timeline' is the ShortTimeline to render (e.g. the one of a reviewed preview), by default a new one.
+        The peak memory of the render is stored in 'render_stats' with the number of media readers
+        opened in this process (segments rendered in parallel open theirs in their own process).
         """
-        if self.background_video is None:
+        if self.background_video_path is None:
             raise ValueError("Background video not set.")
+        pool = ReaderPool(max_open=self.max_open_readers)
+        with PeakMemoryMonitor() as memory:
+            if self.backend == "ffmpeg":
+                self._write_with_filtergraph(output_path, timeline)
+            else:
+                self._write_timeline(output_path, pool, timeline or self.build_timeline())
+        self.render_stats = {
+            'peak_memory_mb': memory.peak_mb,
+            'peak_open_readers': pool.peak_open,
+            'readers_opened': pool.opened,
+        }
+        if memory.peak_mb is not None:
+            print(f"Peak memory: {memory.peak_mb:.0f} MB, at most {pool.peak_open} of {pool.opened} media readers open at once")
 
-        clips = []
-        audio_clips = []  # Store all audio clips separately
-        current_time = 0  # Track timing
+    def create_preview(self, output_path="preview.mp4", timeline=None, scale=0.5, preview_fps=15):
+        """
+        Renders a draft of the short to review it quickly: the frames are composed with the Compositor
+        at 'scale' times the size of the short and 'preview_fps' frames per second, encoded with x264's
+        'ultrafast' preset, with the same audio mix at a lower bitrate.
+        Returns the ShortTimeline rendered (a new one if not given), to render the final short from.
+        """
+        if timeline is None:
+            timeline = self.build_timeline()
+        size = _preview_size(scale)
+        caption_track = self._caption_track(timeline.caption_segments)
+        overlays = [(item.media, item.start, item.start + item.duration) for item in timeline.items]
+        with self._mixed_audio(timeline) as audio_path:
+            background = BackgroundReader(
+                self.background_video_path, size, preview_fps, start=timeline.background_start, crop=self.background_crop,
+                source_fps=max(preview_fps, self.background_video_fps or preview_fps),
+                keyframe=self._on_keyframe(self.background_video_path, timeline.background_start),
+            )
+            try:
+                Compositor(size=size, fps=preview_fps, preset="ultrafast", audio_bitrate="64k").render(
+                    output_path, timeline.duration, background, overlays, audio_path=audio_path,
+                    frame_filter=caption_track.scaled(scale).draw if caption_track else None,
+                    open_overlay=functools.partial(_open_overlay, scale=scale),
+                    pool=ReaderPool(max_open=self.max_open_readers),
+                )
+            finally:
+                background.close()
+        print("Preview created!")
+        return timeline
+
+    def create_renditions(self, renditions, timeline=None):
+        """
+        Renders the short into several Renditions (e.g. 1080x1920 at a high bitrate, 720x1280 and 576x1024,
+        each with its own codec settings) in a single pass: the background is decoded and the frames are composed
+        once, with the Compositor, at the size of the largest rendition, and ffmpeg scales them down and encodes
+        every other rendition from the same frames. Renditions without a size get the size of the short.
+        Returns the ShortTimeline rendered (a new one if not given), like create_preview.
+        """
+        if not renditions:
+            raise ValueError("No rendition to render.")
+        renditions = [rendition if rendition.size else rendition._replace(size=(target_width, target_height)) for rendition in renditions]
+        for rendition in renditions:
+            width, height = rendition.size
+            if width % 2 or height % 2 or abs(width * target_height - height * target_width) > target_height:
+                raise ValueError(f"Renditions must have even dimensions and a 9:16 aspect ratio, not {width}x{height}.")
+        if timeline is None:
+            timeline = self.build_timeline()
+        size = tuple(max((rendition.size for rendition in renditions), key=lambda size: size[0] * size[1]))
+        scale = size[0] / target_width
+        caption_track = self._caption_track(timeline.caption_segments, size)
+        overlays = [(item.media, item.start, item.start + item.duration) for item in timeline.items]
+        with self._mixed_audio(timeline) as audio_path:
+            source = self._background_source(size)
+            background = BackgroundReader(
+                size=size, fps=fps, start=timeline.background_start,
+                keyframe=self._on_keyframe(source['path'], timeline.background_start), **source,
+            )
+            try:
+                Compositor(size=size, fps=fps).render(
+                    renditions, timeline.duration, background, overlays, audio_path=audio_path,
+                    frame_filter=caption_track.draw if caption_track else None,
+                    open_overlay=functools.partial(_open_overlay, scale=scale),
+                    pool=ReaderPool(max_open=self.max_open_readers),
+                )
+            finally:
+                background.close()
+        print(f"Renditions created: {', '.join(rendition.path for rendition in renditions)}")
+        return timeline
+
+    def _background_source(self, size):
+        """
+        Returns the path, crop and resample arguments of a BackgroundReader composing frames of 'size':
+        the background library's transcode, unless it's smaller than 'size' and its source video is still there.
+        """
+        index = self.background_index
+        if index is None:
+            return dict(path=self.background_video_path, crop=self.background_crop, resample=True)
+        if size[0] > index.size[0] and os.path.exists(index.source):
+            width, height = ffmpeg_parse_infos(index.source)['video_size']
+            return dict(path=index.source, crop=center_crop(width, height, size), resample=True)
+        return dict(path=index.path, crop=None, resample=tuple(size) != tuple(index.size))
+
+    def _on_keyframe(self, path, start):
+        """
+        Returns True if 'start' is the time of a keyframe of the background video 'path', per the background library's index.
+        """
+        index = self.background_index
+        return index is not None and path == index.path and start in index.keyframes
+
+    def create_contact_sheet(self, output_path="contact_sheet.png", timeline=None, scale=0.25, columns=4):
+        """
+        Saves one frame per image-audio pair, in the middle of its narration and at 'scale' times the size
+        of the short, tiled into a single image labeled with the pair numbers and times.
+        Returns the ShortTimeline rendered (a new one if not given), to render the final short from.
+        """
+        if timeline is None:
+            timeline = self.build_timeline()
+        if not timeline.items:
+            raise ValueError("No image-audio pair to show.")
+        size = _preview_size(scale)
+        compositor = Compositor(size=size, fps=fps)
+        caption_track = self._caption_track(timeline.caption_segments)
+        caption_track = caption_track.scaled(scale) if caption_track else None
+        frames, labels = [], []
+        for i, item in enumerate(timeline.items):
+            t = round((item.start + item.duration / 2) * fps) / fps
+            background = BackgroundReader(
+                self.background_video_path, size, fps, start=timeline.background_start + t, crop=self.background_crop,
+                keyframe=self._on_keyframe(self.background_video_path, timeline.background_start + t),
+            )
+            try:
+                frame = background.read().copy()
+            finally:
+                background.close()
+            compositor.compose(frame, t, _open_overlay(item.media, scale), item.start, caption_track.draw if caption_track else None)
+            frames.append(frame)
+            labels.append(f"#{i + 1}  {t:.1f} s")
+        _contact_sheet(frames, labels, columns).save(output_path)
+        print("Contact sheet created!")
+        return timeline
 
-        # Process all image-audio pairs
-        for media_path, audio_path in self.image_audio_pairs:
-            audio_clip = None
+    @contextlib.contextmanager
+    def _mixed_audio(self, timeline):
+        """
+        Mixes the audio track of 'timeline' into a temporary wav file, removed on exit.
+        """
+        fd, audio_path = tempfile.mkstemp(suffix=".wav", dir=os.environ.get("TMP_FOLDER"))
+        os.close(fd)
+        try:
             try:
-                audio_clip = AudioFileClip(audio_path)
-                audio_clip = audio_clip.set_start(current_time)
-                audio_clips.append(audio_clip)
+                timeline.mixer.write(audio_path, timeline.duration, timeline.music)
+            except Exception as e:
+                print(f"Error processing background music: {e}")
+                traceback.print_exc()
+                timeline.mixer.write(audio_path, timeline.duration)
+            yield audio_path
+        finally:
+            os.remove(audio_path)
+
+    def _write_timeline(self, output_path, pool, timeline):
+        """
+        Mixes the audio track of 'timeline' and renders the short with the numpy or moviepy backend.
+        """
+        media_timeline = [(item.media, item.start, item.duration) for item in timeline.items]
+        # Captions are blended on top of the composited frames, from overlays laid out once
+        caption_track = self._caption_track(timeline.caption_segments)
+        try:
+            with self._mixed_audio(timeline) as audio_path:
+                if self.backend == "moviepy":
+                    self._write_with_moviepy(
+                        output_path, media_timeline, timeline.background_start, audio_path, caption_track, timeline.duration, pool,
+                    )
+                else:
+                    self._write_with_compositor(
+                        output_path, media_timeline, timeline.background_start, audio_path, caption_track, timeline.duration, pool,
+                    )
+        except Exception as e:
+            print(f"Error writing video file: {e}")
+            traceback.print_exc()
+
+    def _write_with_compositor(self, output_path, timeline, bg_video_start_time, audio_path, caption_track, duration, pool):
+        """
+        Composes the frames with NumPy and pipes them to ffmpeg (see compositor.py).
+        Every overlay is opened (decoded and resized) just before it's shown and released after it ends.
+        """
+        overlays = [(media, start, start + media_duration) for media, start, media_duration in timeline]
+
+        background_args = dict(
+            path=self.background_video_path, size=(target_width, target_height), fps=fps,
+            start=bg_video_start_time, crop=self.background_crop,
+            resample=self.background_index is None or self.background_index.size != (target_width, target_height),
+            keyframe=self._on_keyframe(self.background_video_path, bg_video_start_time),
+        )
+        starts = [start for _, start, _ in timeline]
+        segments = split_timeline(starts, duration, None if self.segment_cache else self.render_processes)
+        background = None
+        try:
+            if len(segments) > 1 or self.segment_cache:
+                self._write_segments(output_path, segments, overlays, caption_track, background_args, audio_path, duration, pool)
+            else:
+                background = BackgroundReader(**background_args)
+                Compositor(size=(target_width, target_height), fps=fps, preset=self.preset, audio_bitrate="192k").render(
+                    output_path, duration, background, overlays, audio_path=audio_path,
+                    frame_filter=caption_track.draw if caption_track else None,
+                    open_overlay=_open_overlay, pool=pool,
+                )
+            print("Video creation completed!")
+        finally:
+            if background:
+                background.close()
+
+    def _segment_key(self, start, nframes, overlays, pages, background_args):
+        """
+        Returns the segment cache key of a segment starting at 'start': a hash of its background window, of the content
+        and relative times of its overlays and captions, and of the encoding settings. None if a media can't be read.
+        """
+        try:
+            overlay_digests = [
+                [_media_digest(media), round(overlay_start - start, 6), round(overlay_end - start, 6)]
+                for media, overlay_start, overlay_end in overlays
+            ]
+            stat = os.stat(background_args['path'])
+        except Exception as e:
+            print(f"Not caching the segment at {start:.2f} s: {e}")
+            return None
+        return self.segment_cache.make_key(
+            background=[
+                os.path.abspath(background_args['path']), stat.st_size, stat.st_mtime,
+                round(background_args['start'] + start, 6), background_args['crop'], background_args['resample'],
+            ],
+            nframes=nframes,
+            overlays=overlay_digests,
+            captions=[_page_digest(page, start) for page in pages],
+            size=[target_width, target_height],
+            fps=fps,
+            preset=self.preset,
+        )
+
+    def _write_segments(self, output_path, segments, overlays, caption_track, background_args, audio_path, duration, pool):
+        """
+        Renders the (start, end) segments of the short in parallel, each one in its own process and encoded
+        on its own (so starting on a keyframe), then joins them without re-encoding and muxes the audio once.
+        With the segment cache, segments already encoded with the same content are reused instead of rendered.
+        Segments rendered in this process open their media in 'pool'.
+        """
+        segment_dir = tempfile.mkdtemp(dir=os.environ.get("TMP_FOLDER"))
+        jobs, keys, segment_paths = [], [], []
+        for i, (start, end) in enumerate(segments):
+            segment_path = os.path.join(segment_dir, f"segment_{i:03d}.mp4")
+            segment_paths.append(segment_path)
+            # like Compositor.render
+            first_frame = int(round(start * fps))
+            end_frame = first_frame + int(round((end - start) * fps))
+            segment_overlays = [item for item in overlays if _shown_in(item[1], item[2], first_frame, end_frame)]
+            segment_pages = [page for page in caption_track.pages if _shown_in(page.start, page.end, first_frame, end_frame)] if caption_track else []
+            key = None
+            if self.segment_cache:
+                key = self._segment_key(start, end_frame - first_frame, segment_overlays, segment_pages, background_args)
+                if key and self.segment_cache.fetch(key, segment_path):
+                    continue
+            keys.append(key)
+            jobs.append([
+                segment_path,
+                start,
+                end - start,
+                segment_overlays,
+                CaptionTrack(segment_pages) if segment_pages else None,
+                dict(
+                    background_args, start=background_args['start'] + start,
+                    keyframe=self._on_keyframe(background_args['path'], background_args['start'] + start),
+                ),
+                self.max_open_readers,
+                self.preset,
+                None,
+            ])
+        if self.segment_cache:
+            print(f"{len(segments) - len(jobs)} of {len(segments)} segments reused from the segment cache")
+        try:
+            workers = min(self.render_processes, len(jobs))
+            for job in jobs:
+                job[-1] = max(1, (os.cpu_count() or 1) // workers)  # encoder threads
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    list(executor.map(_render_segment, jobs))
+            else:
+                for job in jobs:
+                    _render_segment(job, pool)
+            for key, job in zip(keys, jobs):
+                if key:
+                    self.segment_cache.store(key, job[0])
+            Compositor(size=(target_width, target_height), fps=fps, audio_bitrate="192k").concat(
+                segment_paths, output_path, duration, audio_path=audio_path,
+            )
+        finally:
+            shutil.rmtree(segment_dir, ignore_errors=True)
+
+    def _overlay_file(self, media, work_dir, name):
+        """
+        Returns the file of the media of an image-audio pair for the filtergraph (in-memory media
+        is written to 'work_dir'), its size and whether it's animated.
+        """
+        if isinstance(media, str):
+            with Image.open(media) as image:
+                return media, image.size, os.path.splitext(media)[1].lower() == ".gif"
+        if isinstance(media, AnimatedFrames):
+            return media.save_apng(os.path.join(work_dir, f"{name}.png")), media.size, True
+        if isinstance(media, np.ndarray):
+            media = Image.fromarray(media)
+        if media.mode not in ("RGB", "RGBA"):
+            media = media.convert("RGB")
+        path = os.path.join(work_dir, f"{name}.png")
+        media.save(path, compress_level=1)
+        return path, media.size, False
 
-                file_ext = os.path.splitext(media_path)[1].lower()
-                content_clip = None
+    def _write_with_filtergraph(self, output_path, timeline=None):
+        """
+        Compiles the short into a single ffmpeg command (see filtergraph.py): Python only lays out the timeline
+        and writes the in-memory images, the mixed audio track and the captions to files.
+        The clips are timed with the decoded narration durations, and the audio is mixed by the timeline's
+        AudioMixer, like the other backends: header durations (e.g. of MP3 files) can be off by a tenth of
+        a second per clip.
+        """
+        work_dir = tempfile.mkdtemp(dir=os.environ.get("TMP_FOLDER"))
+        try:
+            if timeline is None:
+                timeline = self.build_timeline()
+            overlays = []
+            for i, item in enumerate(timeline.items):
                 try:
-                    if file_ext in [".gif"]:
-                        content_clip = VideoFileClip(media_path)
-                        gif_duration = min(content_clip.duration, audio_clip.duration)
-                        content_clip = content_clip.subclip(0, gif_duration)
-                    else:
-                        content_clip = ImageClip(media_path, duration=audio_clip.duration)
-
-                    aspect_ratio = content_clip.h / content_clip.w
-                    image_target_width = int(0.7 * target_width)
-                    image_target_height = int(image_target_width * aspect_ratio)
-                    content_clip = content_clip.resize((image_target_width, image_target_height))
-                    content_clip = content_clip.set_position("center")
-                    content_clip = content_clip.set_start(current_time)
-                    clips.append(content_clip)
+                    media_path, size, animated = self._overlay_file(item.media, work_dir, f"media_{i}")
+                    overlays.append(OverlayInput(media_path, item.start, item.start + item.duration, _content_size(*size), animated))
                 except Exception as e:
-                    print(f"Error processing media {media_path}: {e}")
+                    print(f"Error processing media {item.media}: {e}")
                     traceback.print_exc()
 
-                current_time += audio_clip.duration
+            background = (
+                self.background_video_path, timeline.background_start, self.background_crop,
+                self.background_index is None or self.background_index.size != (target_width, target_height),
+                self._on_keyframe(self.background_video_path, timeline.background_start),
+            )
+            subtitles = None
+            caption_track = self._caption_track(timeline.caption_segments)
+            if caption_track:
+                ass_path = os.path.join(work_dir, "captions.ass")
+                subtitles = (ass_path, self.captions.write_ass(caption_track, ass_path, (target_width, target_height)))
+
+            with self._mixed_audio(timeline) as audio_path:
+                FiltergraphRenderer(size=(target_width, target_height), fps=fps, preset=self.preset, audio_bitrate="192k").render(
+                    output_path, timeline.duration, background, overlays, audio_path=audio_path, subtitles=subtitles,
+                )
+            print("Video creation completed!")
+        except Exception as e:
+            print(f"Error writing video file: {e}")
+            traceback.print_exc()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _lazy_media_clip(self, pool, key, media, duration):
+        """
+        Returns a clip of the media of an image-audio pair at its on-screen size, built from its headers only.
+        Its frames come from the clip opened by _open_media_clip the first time one is needed, kept in 'pool' as 'key'.
+        """
+        size, media_duration, transparent = _media_info(media)
+        content_size = _content_size(*size)
+        if media_duration is not None:
+            duration = min(media_duration, duration)
+
+        def reader():
+            return pool.get(key, lambda: self._open_media_clip(media, duration).fx(resize, content_size))
+
+        def make_mask_frame(t):
+            mask = reader().mask
+            return mask.get_frame(t) if mask is not None else np.ones(content_size[::-1])
+
+        # VideoClip(make_frame) would read a first frame to get its size, so the clips are set up by hand
+        clip = VideoClip(duration=duration)
+        clip.make_frame = lambda t: reader().get_frame(t)
+        clip.size = content_size
+        if transparent:
+            mask = VideoClip(ismask=True, duration=duration)
+            mask.make_frame = make_mask_frame
+            mask.size = content_size
+            clip = clip.set_mask(mask)
+        return clip
+
+    def _write_with_moviepy(self, output_path, timeline, bg_video_start_time, audio_path, caption_track, duration, pool):
+        """
+        Composes the frames with MoviePy's CompositeVideoClip.
+        Every media clip is opened the first time it's shown and closed after it ends.
+        """
+        clips = []
+        ends = []  # (end, key) of every media clip
+        for index, (media_path, start, media_duration) in enumerate(timeline):
+            try:
+                content_clip = self._lazy_media_clip(pool, index, media_path, media_duration)
+                content_clip = content_clip.set_position("center")
+                content_clip = content_clip.set_start(start)
+                clips.append(content_clip)
+                ends.append((start + media_duration, index))
             except Exception as e:
-                print(f"Error processing audio {audio_path}: {e}")
+                print(f"Error processing media {media_path}: {e}")
                 traceback.print_exc()
 
-        # Sample background video
-        bg_video_clip = None
+        background_video = None
         try:
-            bg_video_max_start_time = max(0, self.background_video.duration - current_time)
-            bg_video_start_time = np.random.uniform(0, bg_video_max_start_time)
-            bg_video_clip = self.background_video.subclip(bg_video_start_time, bg_video_start_time + current_time)
+            background_video = self._open_background_clip()
+            bg_video_clip = background_video.subclip(bg_video_start_time, bg_video_start_time + duration)
             clips.insert(0, bg_video_clip)
         except Exception as e:
             print(f"Error processing background video: {e}")
             traceback.print_exc()
 
-        # Create the composite video without audio first
-        final_video = CompositeVideoClip(clips, size=(target_width, target_height))
-
-        # Now create a single composite audio track
-        combined_audio = CompositeAudioClip(audio_clips)
+        def release_finished(get_frame, t):
+            while ends and t >= ends[0][0]:
+                pool.release(ends.pop(0)[1])
+            return get_frame(t)
 
-        # Add background music if available
-        final_audio = combined_audio
-        if self.background_music:
-            bg_music = None
-            try:
-                bg_music_max_start_time = max(0, self.background_music.duration - current_time)
-                bg_music_start_time = np.random.uniform(0, bg_music_max_start_time)
-                bg_music = self.background_music.subclip(bg_music_start_time, bg_music_start_time + current_time)
-                final_audio = CompositeAudioClip([combined_audio, bg_music])
-            except Exception as e:
-                print(f"Error processing background music: {e}")
-                traceback.print_exc()
+        # Create the composite video without audio first
+        final_video = CompositeVideoClip(clips, size=(target_width, target_height)).fl(release_finished)
+        if caption_track:
+            final_video = final_video.fl(caption_track.apply)
 
-        # Set the final audio to the video
-        final_video = final_video.set_audio(final_audio)
-        final_video = final_video.set_duration(current_time)
+        final_video = final_video.set_duration(duration)
 
-        # Write output video with higher audio bitrate
+        # Write output video with higher audio bitrate, muxing the mixed track as it is
         try:
             final_video.write_videofile(
                 output_path,
                 codec="libx264",
-                fps=30,
+                fps=fps,
+                preset=self.preset,
+                audio=audio_path,
                 audio_codec="aac",
                 audio_bitrate="192k"
             )
-        except Exception as e:
-            print(f"Error writing video file: {e}")
-            traceback.print_exc()
         finally:
+            pool.close()
             final_video.close()
-            if combined_audio:
-                combined_audio.close()
-            if final_audio != combined_audio and final_audio:
-                final_audio.close()
\ No newline at end of file
+            if background_video:
+                background_video.close()
@@ -20,14 +20,13 @@ class RedditScaryStory(ContentTemplate):
         driver = setup_driver_reddit(self.thread_link, dark_mode=True)
         title_text, content_texts, header_image_path, content_images_paths = scrape_reddit_post(driver, dark_mode=True, character_threshold=150)
         driver.quit()
-        title_narration_path = narrator.create_audio_file(title_text)
-        content_narrations_paths = [narrator.create_audio_file(text) for text in content_texts]
+        title_narration_path, *content_narrations_paths = narrator.create_audio_files([title_text] + content_texts)
         
         # add image audio pair of header to short creator object
-        short_creator.add_image_audio_pair(header_image_path, title_narration_path)
-        for content_image_path, content_narration_path in zip(content_images_paths, content_narrations_paths):
+        short_creator.add_image_audio_pair(header_image_path, title_narration_path, caption=title_text)
+        for content_text, content_image_path, content_narration_path in zip(content_texts, content_images_paths, content_narrations_paths):
             # add image audio pair of paragraph group to short creator object
-            short_creator.add_image_audio_pair(content_image_path, content_narration_path)
+            short_creator.add_image_audio_pair(content_image_path, content_narration_path, caption=content_text)
 
         short_creator.add_background_video(self.bg_video)
         short_creator.add_background_music(self.bg_music)
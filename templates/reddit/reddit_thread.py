@@ -1,20 +1,31 @@
 from templates.content_template import ContentTemplate
 from short_creator import ShortCreator
 import os
-from narration import NarratorElevenLabs, NarratorOpenAI
-from util import sanitize_filename, split_paragraphs_from_text, replace_acronyms
+from narration import NarratorElevenLabs, NarratorOpenAI, NarratorZyphra, NarratorRouter
+from util import sanitize_filename, iter_segments, segment_texts, TextNormalizer
 from image_creator import RedditImageCreator
+from duration_budget import DurationEstimator, plan_timeline
+from audio_io import probe_duration
 import re
 
 output_dir = 'TiktokAutoUploader/VideosDirPath'
 
 class RedditThread(ContentTemplate):
-    def __init__(self, bg_video, thread_object=None, bg_music=None, ncomments=5):
+    def __init__(self, bg_video, thread_object=None, bg_music=None, ncomments=5, grouped_narration=True, target_duration=60, save_images=False, render_processes=None):
         self.thread_object = thread_object
         self.bg_video = bg_video
         self.bg_music = bg_music
-        self.reddit_image_creator = RedditImageCreator()
+        # images go to ShortCreator in memory, set save_images to also write them to TMP_FOLDER for debugging
+        self.save_images = save_images
+        # paragraph images are rendered by a pool of processes, one per core by default
+        self.reddit_image_creator = RedditImageCreator(save_images=save_images, processes=render_processes or os.cpu_count() or 1)
         self.ncomments = ncomments
+        # narrate the post body and each comment with a single TTS request, split back into paragraphs
+        self.grouped_narration = grouped_narration
+        # maximum length of the short in seconds (None to keep everything). Content that doesn't fit
+        # is dropped before it is narrated or rendered
+        self.target_duration = target_duration
+        self.duration_estimator = DurationEstimator()
 
     def extract_comments(self):
         """
@@ -43,56 +54,125 @@ class RedditThread(ContentTemplate):
                 
         return filtered_comments
 
-    def _scrape_from_praw(self):
+    def _scrape_from_praw(self, chars_per_second):
+        normalizer = TextNormalizer.for_subreddit(self.thread_object.subreddit.display_name)
         # get title of post
-        post_title_text = replace_acronyms(self.thread_object.title)
+        post_title_text = normalizer.normalize(self.thread_object.title)
         # get text of the post
-        content_text = replace_acronyms(self.thread_object.selftext)
-        # split content of post into paragraphs
-        post_content_texts = split_paragraphs_from_text(content_text) if content_text.strip() != "" else []
+        content_text = normalizer.normalize(self.thread_object.selftext)
+        # split content of post into paragraphs of balanced narration durations
+        post_content_texts = list(iter_segments(content_text, chars_per_second=chars_per_second))
         filtered_comments = self.extract_comments()
-        #comments_content_paragraphs = [split_paragraphs_from_text(replace_acronyms(comment.body)) for comment in filtered_comments]
-        comments_content_paragraphs = []
-        comments_content_image_paths = []
-        post_content_images_paths = [self.reddit_image_creator.create_text_image(t, save_image=True)[1] for t in post_content_texts]
-        for comment in filtered_comments:
-            # get list of paragraphs from comment body, and create image for each paragraph
-            comment_paragraphs, comment_images_paths = self.reddit_image_creator.create_comment_text_images_pairs(comment)
-            comments_content_paragraphs.append(comment_paragraphs)
-            comments_content_image_paths.append(comment_images_paths)
-        return post_title_text, post_content_texts, post_content_images_paths, comments_content_paragraphs, comments_content_image_paths
+        comments_ids = [comment.id for comment in filtered_comments]
+        comments_authors = [comment.author.name if comment.author else "Unknown" for comment in filtered_comments]
+        comments_content_paragraphs = segment_texts(
+            normalizer.normalize_many([comment.body for comment in filtered_comments]),
+            chars_per_second=chars_per_second,
+        )
+        return post_title_text, post_content_texts, comments_ids, comments_authors, comments_content_paragraphs
+
+    def _plan_content(self, narrator, post_title_text, post_content_texts, comments_ids, comments_authors, comments_content_paragraphs):
+        """
+        Trims the post and comments to fit in 'target_duration', using the estimated narration durations.
+        """
+        if self.target_duration is None:
+            return post_content_texts, comments_ids, comments_authors, comments_content_paragraphs
+
+        profile = self.duration_estimator.profile(narrator)
+        post_content_texts, planned_comments_paragraphs, estimated_duration = plan_timeline(
+            post_title_text,
+            post_content_texts,
+            comments_content_paragraphs,
+            self.target_duration,
+            lambda text: self.duration_estimator.estimate(text, profile),
+        )
+        # drop the comments that didn't fit at all
+        kept_comments = [
+            (comment_id, author, paragraphs)
+            for comment_id, author, paragraphs in zip(comments_ids, comments_authors, planned_comments_paragraphs) if paragraphs
+        ]
+        comments_ids = [comment_id for comment_id, _, _ in kept_comments]
+        comments_authors = [author for _, author, _ in kept_comments]
+        comments_content_paragraphs = [paragraphs for _, _, paragraphs in kept_comments]
+        print(f'Planned short of ~{estimated_duration:.1f}s with {len(post_content_texts)} post paragraphs and {len(kept_comments)} comments')
+        return post_content_texts, comments_ids, comments_authors, comments_content_paragraphs
+
+    def _calibrate_duration_estimator(self, narrator, texts, voices, narrations_paths):
+        """
+        Feeds the real narration durations back into the estimator, to improve the next plans.
+        Each one calibrates the profile of the provider and voice that narrated it.
+        """
+        for text, voice, narration_path in zip(texts, voices, narrations_paths):
+            try:
+                profile = self.duration_estimator.profile(narrator, voice)
+                self.duration_estimator.observe(text, probe_duration(narration_path), profile)
+            except Exception as e:
+                print(f'Could not calibrate with {narration_path}: {e}')
+        self.duration_estimator.save()
 
     def generate_short(self):
         print('Generating short story for Reddit thread:', self.thread_object.title)
         short_creator = ShortCreator()
-        narrator = NarratorOpenAI('ash', speed=1.25)
-        #narrator = NarratorElevenLabs()
+        # OpenAI is tried first, the other providers (if configured) take over when it's failing,
+        # and keep the requests if they turn out faster
+        narrator = NarratorRouter.from_factories([
+            lambda: NarratorOpenAI('ash', speed=1.25),
+            lambda: NarratorElevenLabs(),
+            lambda: NarratorZyphra(),
+        ])
+
+        chars_per_second = self.duration_estimator.chars_per_second(self.duration_estimator.profile(narrator))
+        post_title_text, post_content_texts, comments_ids, comments_authors, comments_content_paragraphs = self._scrape_from_praw(chars_per_second)
+        post_content_texts, comments_ids, comments_authors, comments_content_paragraphs = self._plan_content(
+            narrator, post_title_text, post_content_texts, comments_ids, comments_authors, comments_content_paragraphs
+        )
+
+        # only render the images of the content that made it into the short
+        post_content_images = [
+            image for image, _ in self.reddit_image_creator.create_text_images(post_content_texts, save_image=self.save_images)
+        ]
+        comments_content_images = self.reddit_image_creator.create_comments_images(comments_authors, comments_content_paragraphs)
+        post_header_frames = self.reddit_image_creator.create_reddit_post_frames(post_title_text)
+        self.reddit_image_creator.close()
 
-        post_title_text, post_content_texts, post_content_images_paths, comments_content_paragraphs, comments_content_image_paths = self._scrape_from_praw()
-        post_header_image_path = self.reddit_image_creator.create_reddit_post_gif(post_title_text)
+        # narrate the title, the post and every comment in a single concurrent batch
+        groups = [[post_title_text], post_content_texts] + comments_content_paragraphs
+        # every comment gets a voice of its own, the same one on every run so that its cached narrations are reused
+        voices = [None, None] + [narrator.random_voiceactor(seed=comment_id) for comment_id in comments_ids]
+        try:
+            if self.grouped_narration:
+                narrations_paths = narrator.create_grouped_audio_files(groups, voices)
+            else:
+                texts = [text for group in groups for text in group]
+                text_voices = [voice for group, voice in zip(groups, voices) for _ in group]
+                flat_paths = iter(narrator.create_audio_files(texts, text_voices))
+                narrations_paths = [[next(flat_paths) for _ in group] for group in groups]
+        finally:
+            narrator.close()
 
-        title_narration_path = narrator.create_audio_file(post_title_text)
-        content_narrations_paths = [narrator.create_audio_file(text) for text in post_content_texts]
-        #comments_narrations_paths = [[narrator.create_audio_file(text) for text in comment] for comment in comments_content_paragraphs]
-        comments_narrations_paths = []
-        for comment in comments_content_paragraphs:
-            random_voiceactor = narrator.random_voiceactor()
-            narrations = [narrator.create_audio_file(text, random_voiceactor) for text in comment]
-            comments_narrations_paths.append(narrations)
+        title_narration_path = narrations_paths[0][0]
+        content_narrations_paths = narrations_paths[1]
+        comments_narrations_paths = narrations_paths[2:]
+        self._calibrate_duration_estimator(
+            narrator,
+            [text for group in groups for text in group],
+            [voice for group, voice in zip(groups, voices) for _ in group],
+            [path for group_paths in narrations_paths for path in group_paths],
+        )
         
         # add image audio pair of header to short creator object
-        short_creator.add_image_audio_pair(post_header_image_path, title_narration_path)
-        for content_image_path, content_narration_path in zip(post_content_images_paths, content_narrations_paths):
+        short_creator.add_image_audio_pair(post_header_frames, title_narration_path, caption=post_title_text)
+        for content_text, content_image, content_narration_path in zip(post_content_texts, post_content_images, content_narrations_paths):
             # add image audio pair of paragraph group to short creator object
-            print('Adding image audio pair:', content_image_path, content_narration_path)
-            short_creator.add_image_audio_pair(content_image_path, content_narration_path)
-        for comment_images_paths, comment_narrations_paths in zip(comments_content_image_paths, comments_narrations_paths):
-            # comment_images_paths contains images of the current comment
+            print('Adding image audio pair:', content_image, content_narration_path)
+            short_creator.add_image_audio_pair(content_image, content_narration_path, caption=content_text)
+        for comment_paragraphs, comment_images, comment_narrations_paths in zip(comments_content_paragraphs, comments_content_images, comments_narrations_paths):
+            # comment_images contains images of the current comment
             # comment_narrations_paths contains narrations of the current comment
-            for content_image_path, content_narration_path in zip(comment_images_paths, comment_narrations_paths):
+            for content_text, content_image, content_narration_path in zip(comment_paragraphs, comment_images, comment_narrations_paths):
                 # add image audio pair of paragraph group of comment to short creator object
-                print('Adding image audio pair:', content_image_path, content_narration_path)
-                short_creator.add_image_audio_pair(content_image_path, content_narration_path)
+                print('Adding image audio pair:', content_image, content_narration_path)
+                short_creator.add_image_audio_pair(content_image, content_narration_path, caption=content_text)
 
         short_creator.add_background_video(self.bg_video)
         if self.bg_music:
@@ -101,5 +181,11 @@ class RedditThread(ContentTemplate):
         video_filename = f'{title_text_sanitized}.mp4'
         output_path = os.path.join(output_dir, video_filename)
         short_creator.create_video(output_path)
+        if self.reddit_image_creator.cache:
+            print('Render cache stats:', self.reddit_image_creator.cache.stats())
+        print('Narration provider stats:', narrator.provider_stats())
+        for provider_narrator in narrator.narrators:
+            if provider_narrator.cache:
+                print(f'{provider_narrator.provider} narration cache stats:', provider_narrator.cache.stats())
         print(f'Short story generated for Reddit thread "{self.thread_object.title}" in path {output_path}')
         return output_path, post_title_text, video_filename
\ No newline at end of file
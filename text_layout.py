@@ -0,0 +1,133 @@
+from collections import namedtuple
+from PIL import Image, ImageDraw, ImageFont
+
+class TextLayout(namedtuple('TextLayout', ['lines', 'line_widths', 'line_heights', 'line_spacing'])):
+    """
+    Word-wrapped lines of a paragraph and their ink extents, measured once.
+    """
+    __slots__ = ()
+
+    @property
+    def height(self):
+        """
+        Height of the text block: all the lines plus the spacing between them.
+        """
+        return sum(self.line_heights) + self.line_spacing * (len(self.lines) - 1)
+
+class TextLayoutEngine:
+    """
+    Greedy word-wrap of paragraphs into lines no wider than 'max_width' pixels.
+
+    Instead of measuring every growing prefix of a line, the advance and bounding box of every
+    word are measured once per font and cached, and the width of a candidate line is updated
+    incrementally from them. With Pillow's basic layout glyph positions simply add up, so the
+    line metrics computed this way are exact. With raqm, shaping across words can move them
+    by a pixel or two: candidates within 'tolerance' pixels of the limit, and the final lines,
+    are then measured with ImageDraw.textbbox. Either way the result is the same as measuring
+    every prefix.
+
+    :param font: PIL font used for measuring (and later drawing) the text.
+    :param max_width: Maximum width of a line (px).
+    :param line_spacing: Extra vertical space between lines (px).
+    :param tolerance: Margin (px) around 'max_width' inside which shaped lines are measured exactly.
+    """
+    def __init__(self, font, max_width, line_spacing=2, tolerance=2):
+        self.font = font
+        self.max_width = max_width
+        self.line_spacing = line_spacing
+        self.tolerance = tolerance
+        self.additive = getattr(font, 'layout_engine', None) == ImageFont.Layout.BASIC
+        self.space_advance = font.getlength(' ')
+        self._word_metrics = {}
+        self._space_kerning = {}
+        self._draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+
+    def _metrics(self, word):
+        """
+        Returns (advance, advance followed by a space, left, top, right, bottom) of 'word', measured once per engine.
+        """
+        metrics = self._word_metrics.get(word)
+        if metrics is None:
+            metrics = (self.font.getlength(word), self.font.getlength(word + ' ')) + tuple(self.font.getbbox(word))
+            self._word_metrics[word] = metrics
+        return metrics
+
+    def _kerning_after_space(self, char):
+        kerning = self._space_kerning.get(char)
+        if kerning is None:
+            kerning = self.font.getlength(' ' + char) - self.space_advance - self.font.getlength(char)
+            self._space_kerning[char] = kerning
+        return kerning
+
+    def measure(self, line):
+        """
+        Exact (width, height) of the bounding box of 'line'.
+        """
+        left, top, right, bottom = self._draw.textbbox((0, 0), line, font=self.font)
+        return right - left, bottom - top
+
+    def _fits(self, estimated_width, line_words):
+        if self.additive or estimated_width <= self.max_width - self.tolerance:
+            return estimated_width <= self.max_width
+        if estimated_width > self.max_width + self.tolerance:
+            return False
+        return self.measure(' '.join(line_words))[0] <= self.max_width
+
+    def _wrap(self, text):
+        """
+        Returns the lines of 'text' and their estimated (width, height).
+        Like the prefix-measuring wrap this replaces, a first word too wide
+        for a line on its own is preceded by an empty line.
+        """
+        lines, sizes = [], []
+        # words of the current line, its bounding box and the pen position after its last word
+        line_words = []
+        line_left = line_top = line_right = line_bottom = pen = 0
+        for word in text.split():
+            advance, spaced_advance, left, top, right, bottom = self._metrics(word)
+            if line_words:
+                # pen position of 'word' if it's appended to the line
+                position = pen + self._kerning_after_space(word[0])
+                if self._fits(position + right - line_left, line_words + [word]):
+                    line_words.append(word)
+                    line_top, line_bottom = min(line_top, top), max(line_bottom, bottom)
+                    pen, line_right = position + spaced_advance, position + right
+                    continue
+                lines.append(' '.join(line_words))
+                sizes.append((int(line_right - line_left), line_bottom - line_top))
+            elif not self._fits(right - left, [word]):
+                lines.append('')
+                sizes.append((0, 0))
+            line_words = [word]
+            line_left, line_top, line_right, line_bottom = left, top, right, bottom
+            pen = spaced_advance
+        if line_words:
+            lines.append(' '.join(line_words))
+            sizes.append((int(line_right - line_left), line_bottom - line_top))
+        return lines, sizes
+
+    def wrap(self, text):
+        """
+        Splits 'text' into lines no wider than 'max_width'.
+        """
+        return self._wrap(text)[0]
+
+    def layout(self, text):
+        """
+        Wraps 'text' and measures every resulting line once.
+        """
+        lines, sizes = self._wrap(text)
+        if not self.additive:
+            sizes = [self.measure(line) for line in lines]
+        return TextLayout(
+            lines=lines,
+            line_widths=[width for width, _ in sizes],
+            line_heights=[height for _, height in sizes],
+            line_spacing=self.line_spacing,
+        )
+
+    def layout_many(self, texts):
+        """
+        Lays out a batch of paragraphs, sharing the word measurements between them.
+        """
+        return [self.layout(text) for text in texts]
@@ -1,4 +1,11 @@
+import hashlib
+import json
+import os
 import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
 
 def sanitize_filename(filename, max_length=100):
     print(f"Sanitizing filename: {filename}")
@@ -9,51 +16,456 @@ def sanitize_filename(filename, max_length=100):
         sanitized_base = sanitized_base[:max_length]
     return sanitized_base
 
+def evict_least_recently_used(directory, max_bytes, suffix):
+    """
+    Removes the least recently used files ending in 'suffix' from 'directory' (by modification time,
+    which caches refresh on every hit) until the remaining ones fit in 'max_bytes'.
+    """
+    entries = []
+    total_size = 0
+    for entry in os.scandir(directory):
+        if not entry.is_file() or not entry.name.endswith(suffix):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue  # evicted by another thread in the meantime
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total_size <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total_size -= size
+        except FileNotFoundError:
+            pass
+
+class FileCache:
+    """
+    Content-addressed on-disk cache of files.
+
+    Files are stored as '<sha256 of the parameters they were made from><suffix>' inside 'cache_dir',
+    which should not be the TMP_FOLDER (that one is wiped between runs).
+    The cache is bounded by 'max_bytes': when it grows past it, the least recently
+    used files (by modification time, refreshed on every hit) are evicted.
+    Subclasses set 'version' and bump it when the code making the files changes, so that older files aren't reused.
+    """
+    version = None
+
+    def __init__(self, cache_dir, max_bytes, suffix):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, **params):
+        """
+        Hashes the parameters the cached file is made from into a cache key.
+        """
+        if self.version is not None:
+            params = dict(params, version=self.version)
+        payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def read(self, key, load):
+        """
+        Returns load(path) of the cached file for 'key', or None on a miss
+        (missing file, or evicted/corrupted while being read).
+        """
+        cached_path = self._path(key)
+        try:
+            value = load(cached_path)
+            os.utime(cached_path)  # mark as recently used
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return value
+
+    def fetch(self, key, output_path):
+        """
+        Copies the cached file for 'key' to 'output_path'.
+        Returns True on a hit and False on a miss.
+        """
+        return self.read(key, lambda cached_path: shutil.copyfile(cached_path, output_path)) is not None
+
+    def write(self, key, write_file):
+        """
+        Atomically stores what write_file(file) writes under 'key', then evicts old entries if needed.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                write_file(tmp_file)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def store(self, key, path):
+        """
+        Atomically copies the file at 'path' into the cache under 'key', then evicts old entries if needed.
+        """
+        def copy(tmp_file):
+            with open(path, 'rb') as source_file:
+                shutil.copyfileobj(source_file, tmp_file)
+        self.write(key, copy)
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in 'max_bytes'.
+        """
+        evict_least_recently_used(self.cache_dir, self.max_bytes, self.suffix)
+
+    def stats(self):
+        """
+        Returns the hit/miss counters of this cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+class ReaderPool:
+    """
+    Readers (clips, decoded images, ffmpeg processes...) opened on first use and closed again
+    as soon as they're released, or when more than 'max_open' are open (least recently used first).
+    'peak_open' is the largest number of readers that were open at once.
+    """
+    def __init__(self, max_open=2):
+        if max_open < 1:
+            raise ValueError("max_open must be at least 1.")
+        self.max_open = max_open
+        self.peak_open = 0
+        self.opened = 0
+        self._readers = OrderedDict()  # key -> (reader, close)
+
+    def get(self, key, open_reader, close_reader=None):
+        """
+        Returns the reader of 'key', opened with open_reader() if it isn't open.
+        'close_reader(reader)' is called when it's closed, readers with a 'close' method are closed by default.
+        """
+        entry = self._readers.get(key)
+        if entry is not None:
+            self._readers.move_to_end(key)
+            return entry[0]
+        while len(self._readers) >= self.max_open:
+            self._close(*self._readers.popitem(last=False)[1])
+        reader = open_reader()
+        self._readers[key] = (reader, close_reader)
+        self.opened += 1
+        self.peak_open = max(self.peak_open, len(self._readers))
+        return reader
+
+    @staticmethod
+    def _close(reader, close_reader):
+        if close_reader:
+            close_reader(reader)
+        elif hasattr(reader, 'close'):
+            reader.close()
+
+    def release(self, key):
+        """
+        Closes the reader of 'key' if it's open.
+        """
+        entry = self._readers.pop(key, None)
+        if entry is not None:
+            self._close(*entry)
+
+    def close(self):
+        while self._readers:
+            self._close(*self._readers.popitem(last=False)[1])
+
+class PeakMemoryMonitor:
+    """
+    Samples the resident memory of the process every 'interval' seconds while it's used as a context
+    manager, and keeps the highest value in 'peak_mb' (memory of child processes such as ffmpeg isn't included).
+    Memory is read from /proc, so 'peak_mb' stays None on systems without it.
+    """
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def resident_mb():
+        try:
+            with open('/proc/self/statm') as statm:
+                resident_pages = int(statm.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+    def _sample(self):
+        resident = self.resident_mb()
+        if resident is not None:
+            self.peak_mb = resident if self.peak_mb is None else max(self.peak_mb, resident)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+# Words ending in a period that don't end a sentence
+_ABBREVIATIONS = {
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'vs', 'etc', 'approx', 'apt', 'dept',
+    'e.g', 'i.e', 'u.s', 'u.k', 'a.m', 'p.m',
+}
+# also ordinary words ('no', 'sun', 'max'...), so only abbreviations when a number follows ('No. 5', 'Mar. 3')
+_NUMBER_ABBREVIATIONS = {
+    'no', 'est', 'min', 'max', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept',
+    'oct', 'nov', 'dec', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun',
+}
+# Candidate sentence ends: punctuation (plus closing quotes/brackets) followed by whitespace, or line breaks
+_SENTENCE_END = re.compile(r'[.!?]+["\'”’)\]]*\s+|\n\s*')
+_CLAUSE_END = re.compile(r'(?<=[,;:])\s+|\s+(?=[-–—]\s)')
+
+DEFAULT_CHARS_PER_SECOND = 15.0
+
+def iter_sentences(text):
+    """
+    Yields the sentences of 'text' one at a time.
+    Sentences end at '.', '!', '?' (or runs of them, like '?!' and '...') followed by whitespace,
+    and at line breaks. Periods of abbreviations ('Mr.', 'e.g.', 'No. 5'), initials ('J. R. R.') and
+    numbers ('3.5') don't end a sentence.
+
+    >>> list(iter_sentences("My husband said no. I was shocked. He was late and so was I. We missed it."))
+    ['My husband said no.', 'I was shocked.', 'He was late and so was I.', 'We missed it.']
+    >>> list(iter_sentences("I got an A. Mom was happy. She hated the sun. That was the max. Nothing more."))
+    ['I got an A.', 'Mom was happy.', 'She hated the sun.', 'That was the max.', 'Nothing more.']
+    >>> list(iter_sentences("Mr. Smith lives at No. 5 since Mar. 3 and J. R. R. Tolkien came. It rained."))
+    ['Mr. Smith lives at No. 5 since Mar. 3 and J. R. R. Tolkien came.', 'It rained.']
+    """
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        candidate = text[start:match.end()].strip()
+        if match.group().startswith('.') and '\n' not in match.group():
+            last_word = candidate.rsplit(None, 1)[-1].rstrip('.').lstrip('("\'').lower()
+            before_number = text[match.end():match.end() + 1].isdigit()
+            if (
+                last_word in _ABBREVIATIONS
+                or (last_word in _NUMBER_ABBREVIATIONS and before_number)
+                # initials, but not the words 'I' and 'a'
+                or (len(last_word) == 1 and last_word.isalpha() and last_word not in ('i', 'a'))
+            ):
+                continue
+        if candidate:
+            # lines without final punctuation still end a sentence for the narrator
+            if not re.search(r'[.!?]["\'”’)\]]*$', candidate):
+                candidate += '.'
+            yield candidate
+        start = match.end()
+    candidate = text[start:].strip()
+    if candidate:
+        yield candidate
+
+def _split_long_sentence(sentence, max_chars):
+    """
+    Splits a sentence longer than 'max_chars' at clause boundaries (commas, semicolons, dashes),
+    or between words if a clause is still too long.
+    """
+    pieces = []
+    for clause in _CLAUSE_END.split(sentence):
+        while len(clause) > max_chars:
+            cut = clause.rfind(' ', 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(clause[:cut].strip())
+            clause = clause[cut:].strip()
+        if clause:
+            pieces.append(clause)
+
+    # merge the pieces back while they fit, so we don't end up with tiny fragments
+    merged = []
+    for piece in pieces:
+        if merged and len(merged[-1]) + 1 + len(piece) <= max_chars:
+            merged[-1] = f"{merged[-1]} {piece}"
+        else:
+            merged.append(piece)
+    return merged
+
+def _pack_sentences(sentences, min_chars, max_chars):
+    """
+    Groups consecutive sentences into segments of at most 'max_chars' characters, preferring
+    to keep filling a segment while it is shorter than 'min_chars'.
+    """
+    previous = None  # held back, so a too short last segment can be merged into it
+    current = ""
+    for sentence in sentences:
+        pieces = _split_long_sentence(sentence, max_chars) if len(sentence) > max_chars else [sentence]
+        for piece in pieces:
+            if not current:
+                current = piece
+            elif len(current) + 1 + len(piece) <= max_chars or len(current) < min_chars and len(piece) < min_chars:
+                current = f"{current} {piece}"
+            else:
+                if previous is not None:
+                    yield previous
+                previous, current = current, piece
+
+    if previous is not None and current and len(current) < min_chars and len(previous) + 1 + len(current) <= 1.25 * max_chars:
+        previous, current = f"{previous} {current}", ""
+    if previous is not None:
+        yield previous
+    if current:
+        yield current
+
+def iter_segments(text, min_seconds=5.0, max_seconds=15.0, chars_per_second=DEFAULT_CHARS_PER_SECOND):
+    """
+    Yields the segments (one image and one narration each) of 'text', lazily.
+    Whole sentences are grouped so that each segment takes between 'min_seconds' and 'max_seconds'
+    to narrate at 'chars_per_second' (see duration_budget.DurationEstimator for calibrated rates).
+    Sentences that are too long on their own are split at clause boundaries.
+    """
+    yield from _pack_sentences(
+        iter_sentences(text),
+        int(min_seconds * chars_per_second),
+        max(1, int(max_seconds * chars_per_second)),
+    )
+
+def segment_texts(texts, min_seconds=5.0, max_seconds=15.0, chars_per_second=DEFAULT_CHARS_PER_SECOND):
+    """
+    Batch version of 'iter_segments': returns the list of segments of every text (e.g. all the comments of a thread).
+    """
+    return [list(iter_segments(text, min_seconds, max_seconds, chars_per_second)) for text in texts]
+
 def split_paragraphs_from_text(text, character_threshold=300):
     """
     Split 'text' into chunks (paragraphs), each no more than 'character_threshold' characters long.
-    Splits at every period ('.'), then accumulates sentences until adding another would exceed the threshold.
+    Splits at sentence boundaries, then accumulates sentences until adding another would exceed the threshold.
+    """
+    return list(_pack_sentences(iter_sentences(text), 0, character_threshold))
+
+# Reddit acronyms spelled out for the narration
+DEFAULT_REPLACEMENTS = {
+    'AITAH': 'Am I The Asshole',
+    'AITA': 'Am I The Asshole',
+    'WIBTA': 'Would I be the asshole',
+    'TIFU': 'Today I Fucked Up',
+    'TLDR': 'Too Long Didn\'t Read',
+    'TL;DR': 'Too Long Didn\'t Read',
+    'YTA': 'You\'re The Asshole',
+    'NTA': 'Not The Asshole',
+    'ESH': 'Everyone Sucks Here',
+    'NAH': 'No Assholes Here',
+    'INFO': 'Information',
+}
+
+# Extra replacements for specific subreddits (lowercase names)
+SUBREDDIT_REPLACEMENTS = {
+    'amitheasshole': {
+        'WIBTAH': 'Would I be the asshole',
+        'YWBTA': 'You Would Be The Asshole',
+        'YWNBTA': 'You Would Not Be The Asshole',
+    },
+    'relationship_advice': {
+        'BF': 'boyfriend',
+        'GF': 'girlfriend',
+        'LDR': 'long distance relationship',
+    },
+}
+
+def _trie_regex(words):
     """
+    Compiles a list of words into a regex trie, e.g. ['AITA', 'AITAH', 'NAH', 'NTA'] -> 'AITA(?:H)?|N(?:AH|TA)',
+    so the regex engine checks one character per branch instead of trying every word in turn.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # greedy optional suffix: the longest word wins ('AITAH' over 'AITA')
+        return f'(?:{body})?' if '' in node else body
 
-    # First, split on "." to get individual sentences/phrases
-    # (strip to remove leading/trailing whitespace)
-    phrases = [phrase.strip() for phrase in text.split('.') if phrase.strip()]
+    return build(trie)
 
-    split_paragraphs = []
-    current_paragraph = ""
+class TextNormalizer:
+    """
+    Replaces whole words (acronyms) of a text according to a dictionary, in a single pass.
 
-    for phrase in phrases:
-        # We'll re-add the period (".") and a space after each phrase
-        # so that the final text looks like sentences.
-        # e.g. "This is sentence one." -> "This is sentence one. "
-        to_add = phrase + ". "
+    The dictionary is compiled once into a single regex trie delimited by word boundaries.
+    This way 'AITAH' is not partially replaced as 'AITA', and 'NAH' inside 'NAHUM' or
+    'ESH' inside 'FRESH' are left alone. Unlike sequential replaces, the cost of a pass
+    barely grows with the size of the dictionary.
+    """
+    _subreddit_normalizers = {}
 
-        # Check if adding this sentence to our current paragraph
-        # would exceed the character threshold.
-        if len(current_paragraph) + len(to_add) <= character_threshold:
-            current_paragraph += to_add
+    def __init__(self, replacements=None):
+        self.replacements = dict(DEFAULT_REPLACEMENTS if replacements is None else replacements)
+        if self.replacements:
+            # the lookahead lets the regex engine skip quickly to the characters that can start a word
+            first_chars = ''.join(sorted({re.escape(word[0]) for word in self.replacements}))
+            self.pattern = re.compile(rf'(?=[{first_chars}])(?<!\w){_trie_regex(self.replacements)}(?!\w)')
         else:
-            # If current_paragraph isn't empty, store it
-            if current_paragraph.strip():
-                split_paragraphs.append(current_paragraph.strip())
-            # Start a new paragraph
-            current_paragraph = to_add
+            self.pattern = None
+
+    def extend(self, replacements):
+        """
+        Returns a new normalizer with the replacements of this one plus (or overridden by) 'replacements'.
+        """
+        return TextNormalizer({**self.replacements, **replacements})
+
+    @classmethod
+    def for_subreddit(cls, subreddit_name):
+        """
+        Returns the (cached) normalizer with the default replacements plus the ones of the subreddit.
+        """
+        key = (subreddit_name or '').lower()
+        if key not in cls._subreddit_normalizers:
+            cls._subreddit_normalizers[key] = TextNormalizer({**DEFAULT_REPLACEMENTS, **SUBREDDIT_REPLACEMENTS.get(key, {})})
+        return cls._subreddit_normalizers[key]
+
+    def _replace(self, match):
+        return self.replacements[match.group()]
+
+    def normalize(self, text):
+        if self.pattern is None:
+            return text
+        return self.pattern.sub(self._replace, text)
 
-    # After the loop, if there's anything left in current_paragraph, append it
-    if current_paragraph.strip():
-        split_paragraphs.append(current_paragraph.strip())
+    def normalize_many(self, texts):
+        """
+        Normalizes a batch of texts (e.g. all the comments of a thread).
+        """
+        return [self.normalize(text) for text in texts]
 
-    return split_paragraphs
+_default_normalizer = TextNormalizer()
 
 def replace_acronyms(title):
-    title = title.replace('AITAH', 'Am I The Asshole')
-    title = title.replace('AITA', 'Am I The Asshole')
-    title = title.replace('WIBTA', 'Would I be the asshole')
-    title = title.replace('TIFU', 'Today I Fucked Up')
-    title = title.replace('TLDR', 'Too Long Didn\'t Read')
-    title = title.replace('YTA', 'You\'re The Asshole')
-    title = title.replace('NTA', 'Not The Asshole')
-    title = title.replace('ESH', 'Everyone Sucks Here')
-    title = title.replace('NAH', 'No Assholes Here')
-    title = title.replace('INFO', 'Information')
-    return title
\ No newline at end of file
+    return _default_normalizer.normalize(title)